@@ -1,21 +1,18 @@
-from utils.llm import call_llm
-from utils.search import get_search_summary
+from utils.llm import call_llm, acall_llm
+from utils.search import gather_search_data, agather_search_data
 
-def run(business_idea, industry):
-    print(f"--- Competitor Analysis Agent Running ---")
-    
-    queries = [
+def get_queries(business_idea, industry):
+    """
+    Queries for rivals, their pricing and alternatives.
+    """
+    return [
         f"top competitors for {business_idea}",
         f"{industry} companies pricing models",
         f"alternatives to {business_idea}"
     ]
-    
-    search_data = ""
-    for q in queries:
-        print(f"Searching: {q}...")
-        search_data += get_search_summary(q)
-        
-    prompt = f"""
+
+def build_prompt(business_idea, search_data):
+    return f"""
     You are a Competitor Analysis Expert.
     Identify competitors for this business idea: {business_idea}
     
@@ -32,5 +29,19 @@ def run(business_idea, industry):
     
     Output strictly in Markdown format.
     """
+
+def run(business_idea, industry, search=None, on_delta=None):
+    print(f"--- Competitor Analysis Agent Running ---")
     
-    return call_llm(prompt)
+    search_data = gather_search_data(get_queries(business_idea, industry), search, focus=f"{business_idea} {industry}")
+        
+    prompt = build_prompt(business_idea, search_data)
+    return call_llm(prompt, on_delta=on_delta)
+
+async def arun(business_idea, industry, search=None, on_delta=None):
+    print(f"--- Competitor Analysis Agent Running ---")
+    
+    search_data = await agather_search_data(get_queries(business_idea, industry), search, focus=f"{business_idea} {industry}")
+        
+    prompt = build_prompt(business_idea, search_data)
+    return await acall_llm(prompt, on_delta=on_delta)
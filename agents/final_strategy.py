@@ -1,9 +1,7 @@
-from utils.llm import call_llm
+from utils.llm import call_llm, acall_llm
 
-def run(business_idea, market_res, comp_analysis, cust_insights, swot_analysis, financial_est, risk_assess):
-    print(f"--- FInal Strategy Agent Running ---")
-    
-    prompt = f"""
+def build_prompt(business_idea, market_res, comp_analysis, cust_insights, swot_analysis, financial_est, risk_assess):
+    return f"""
     You are the Chief Strategy Officer.
     Synthesize all the following reports into a Final Strategy Report for the business idea: {business_idea}
     
@@ -34,5 +32,19 @@ def run(business_idea, market_res, comp_analysis, cust_insights, swot_analysis,
     
     Output strictly in Markdown format.
     """
+
+def run(business_idea, market_res, comp_analysis, cust_insights, swot_analysis, financial_est, risk_assess, on_delta=None):
+    print(f"--- FInal Strategy Agent Running ---")
+    
+    prompt = build_prompt(
+        business_idea, market_res, comp_analysis, cust_insights, swot_analysis, financial_est, risk_assess
+    )
+    return call_llm(prompt, on_delta=on_delta)
+
+async def arun(business_idea, market_res, comp_analysis, cust_insights, swot_analysis, financial_est, risk_assess, on_delta=None):
+    print(f"--- FInal Strategy Agent Running ---")
     
-    return call_llm(prompt)
+    prompt = build_prompt(
+        business_idea, market_res, comp_analysis, cust_insights, swot_analysis, financial_est, risk_assess
+    )
+    return await acall_llm(prompt, on_delta=on_delta)
@@ -1,21 +1,18 @@
-from utils.llm import call_llm
-from utils.search import get_search_summary
+from utils.llm import call_llm, acall_llm
+from utils.search import gather_search_data, agather_search_data
 
-def run(business_idea, industry, region):
-    print(f"--- Financial Estimation Agent Running ---")
-    
-    queries = [
+def get_queries(business_idea, industry, region):
+    """
+    Queries for startup costs, pricing and margins.
+    """
+    return [
         f"startup costs for {industry} business in {region}",
         f"average pricing {industry} services products",
         f"operating margins {industry}"
     ]
-    
-    search_data = ""
-    for q in queries:
-        print(f"Searching: {q}...")
-        search_data += get_search_summary(q)
-        
-    prompt = f"""
+
+def build_prompt(business_idea, search_data):
+    return f"""
     You are a Financial Analyst for Startups.
     Estimate the financials for: {business_idea}
     
@@ -31,5 +28,19 @@ def run(business_idea, industry, region):
     
     Output strictly in Markdown format.
     """
+
+def run(business_idea, industry, region, search=None, on_delta=None):
+    print(f"--- Financial Estimation Agent Running ---")
     
-    return call_llm(prompt)
+    search_data = gather_search_data(get_queries(business_idea, industry, region), search, focus=f"{business_idea} {industry}")
+        
+    prompt = build_prompt(business_idea, search_data)
+    return call_llm(prompt, on_delta=on_delta)
+
+async def arun(business_idea, industry, region, search=None, on_delta=None):
+    print(f"--- Financial Estimation Agent Running ---")
+    
+    search_data = await agather_search_data(get_queries(business_idea, industry, region), search, focus=f"{business_idea} {industry}")
+        
+    prompt = build_prompt(business_idea, search_data)
+    return await acall_llm(prompt, on_delta=on_delta)
@@ -1,24 +1,19 @@
-from utils.llm import call_llm
-from utils.search import get_search_summary
+from utils.llm import call_llm, acall_llm
+from utils.search import gather_search_data, agather_search_data
 
-def run(business_idea, industry, region="Global"):
-    print(f"--- Market Research Agent Running for {business_idea} ---")
-    
-    # 1. Gather Data
-    queries = [
+def get_queries(business_idea, industry, region="Global"):
+    """
+    Queries for market size, trends and growth data.
+    """
+    return [
         f"market size {industry} {region} 2024 2025",
         f"{industry} trends {region}",
         f"TAM SAM SOM {business_idea} {industry}",
         f"growth rate {industry} {region}"
     ]
-    
-    search_data = ""
-    for q in queries:
-        print(f"Searching: {q}...")
-        search_data += get_search_summary(q)
-    
-    # 2. Analyze
-    prompt = f"""
+
+def build_prompt(business_idea, industry, region, search_data):
+    return f"""
     You are a Market Research Expert.
     Analyze the market for the following business idea:
     Idea: {business_idea}
@@ -36,5 +31,23 @@ def run(business_idea, industry, region="Global"):
     
     Output strictly in Markdown format.
     """
+
+def run(business_idea, industry, region="Global", search=None, on_delta=None):
+    print(f"--- Market Research Agent Running for {business_idea} ---")
+    
+    # 1. Gather Data
+    search_data = gather_search_data(get_queries(business_idea, industry, region), search, focus=f"{business_idea} {industry}")
+    
+    # 2. Analyze
+    prompt = build_prompt(business_idea, industry, region, search_data)
+    return call_llm(prompt, on_delta=on_delta)
+
+async def arun(business_idea, industry, region="Global", search=None, on_delta=None):
+    print(f"--- Market Research Agent Running for {business_idea} ---")
     
-    return call_llm(prompt)
+    # 1. Gather Data
+    search_data = await agather_search_data(get_queries(business_idea, industry, region), search, focus=f"{business_idea} {industry}")
+    
+    # 2. Analyze
+    prompt = build_prompt(business_idea, industry, region, search_data)
+    return await acall_llm(prompt, on_delta=on_delta)
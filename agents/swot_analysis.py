@@ -1,9 +1,7 @@
-from utils.llm import call_llm
+from utils.llm import call_llm, acall_llm
 
-def run(business_idea, market_report, competitor_report, customer_report):
-    print(f"--- SWOT Analysis Agent Running ---")
-    
-    prompt = f"""
+def build_prompt(business_idea, market_report, competitor_report, customer_report):
+    return f"""
     You are a Strategic Analyst.
     Perform a SWOT analysis for the business idea: {business_idea}
     
@@ -23,5 +21,15 @@ def run(business_idea, market_report, competitor_report, customer_report):
     
     Output strictly in Markdown format.
     """
+
+def run(business_idea, market_report, competitor_report, customer_report, on_delta=None):
+    print(f"--- SWOT Analysis Agent Running ---")
+    
+    prompt = build_prompt(business_idea, market_report, competitor_report, customer_report)
+    return call_llm(prompt, on_delta=on_delta)
+
+async def arun(business_idea, market_report, competitor_report, customer_report, on_delta=None):
+    print(f"--- SWOT Analysis Agent Running ---")
     
-    return call_llm(prompt)
+    prompt = build_prompt(business_idea, market_report, competitor_report, customer_report)
+    return await acall_llm(prompt, on_delta=on_delta)
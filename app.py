@@ -1,19 +1,7 @@
 import streamlit as st
-import time
 import os
-from agents import (
-    market_research,
-    competitor_analysis,
-    customer_insight,
-    swot_analysis,
-    financial_estimation,
-    risk_feasibility,
-    final_strategy
-)
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import textwrap
-from pptx import Presentation
+from utils.pipeline import run_pipeline
+from utils import export
 
 # Set page config
 st.set_page_config(
@@ -54,57 +42,6 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-def generate_pdf(filename, content):
-    try:
-        pdf_file = filename.replace(".md", ".pdf")
-        c = canvas.Canvas(pdf_file, pagesize=letter)
-        width, height = letter
-        text = c.beginText(40, height - 40)
-        text.setFont("Helvetica", 10)
-        
-        for line in content.split('\n'):
-            wrapped_lines = textwrap.wrap(line, width=90)
-            for w_line in wrapped_lines:
-                if text.getY() < 40:
-                    c.drawText(text)
-                    c.showPage()
-                    text = c.beginText(40, height - 40)
-                    text.setFont("Helvetica", 10)
-                text.textLine(w_line)
-        c.drawText(text)
-        c.save()
-        return pdf_file
-    except Exception as e:
-        return None
-
-def generate_ppt(filename, business_idea, content_dict):
-    try:
-        ppt_file = filename.replace(".md", ".pptx")
-        prs = Presentation()
-        
-        # Title Slide
-        slide_layout = prs.slide_layouts[0]
-        slide = prs.slides.add_slide(slide_layout)
-        title = slide.shapes.title
-        subtitle = slide.placeholders[1]
-        title.text = "Business Strategy Report"
-        subtitle.text = business_idea
-
-        def add_slide(title_text, content_text):
-            layout = prs.slide_layouts[1] 
-            slide = prs.slides.add_slide(layout)
-            slide.shapes.title.text = title_text
-            tf = slide.placeholders[1].text_frame
-            tf.text = content_text[:1000] + "..." if len(content_text) > 1000 else content_text
-
-        for section, text in content_dict.items():
-            add_slide(section, text)
-
-        prs.save(ppt_file)
-        return ppt_file
-    except Exception as e:
-        return None
-
 # Sidebar
 with st.sidebar:
     st.image("https://cdn-icons-png.flaticon.com/512/2083/2083256.png", width=50)
@@ -140,84 +77,36 @@ if run_btn:
             "📊 Market", "⚔️ Competitors", "👥 Customers", "🛡️ SWOT", "💰 Financials", "⚠️ Risks", "🏁 Final Strategy"
         ])
 
-        # 1. Market Research
-        status_text.markdown("### 🔍 Agent 1/7: Analyzing Market...")
-        market_res = market_research.run(business_idea, industry, region)
-        results["Market Research"] = market_res
-        with tab1:
-            st.markdown(market_res)
-        progress_bar.progress(15)
-        time.sleep(2)
-
-        # 2. Competitor Analysis
-        status_text.markdown("### 🕵️ Agent 2/7: Scouting Competitors...")
-        comp_analysis = competitor_analysis.run(business_idea, industry)
-        results["Competitor Analysis"] = comp_analysis
-        with tab2:
-            st.markdown(comp_analysis)
-        progress_bar.progress(30)
-        time.sleep(2)
-
-        # 3. Customer Insight
-        status_text.markdown("### 🧠 Agent 3/7: Understanding Customers...")
-        cust_insights = customer_insight.run(business_idea, industry)
-        results["Customer Insights"] = cust_insights
-        with tab3:
-            st.markdown(cust_insights)
-        progress_bar.progress(45)
-        time.sleep(2)
-
-        # 4. SWOT
-        status_text.markdown("### ⚖️ Agent 4/7: Developing SWOT...")
-        swot_out = swot_analysis.run(business_idea, market_res, comp_analysis, cust_insights)
-        results["SWOT Analysis"] = swot_out
-        with tab4:
-            st.markdown(swot_out)
-        progress_bar.progress(60)
-        time.sleep(2)
-
-        # 5. Financial
-        status_text.markdown("### 💸 Agent 5/7: Estimating Financials...")
-        fin_est = financial_estimation.run(business_idea, industry, region)
-        results["Financial Estimation"] = fin_est
-        with tab5:
-            st.markdown(fin_est)
-        progress_bar.progress(75)
-        time.sleep(2)
-
-        # 6. Risk
-        status_text.markdown("### 🚧 Agent 6/7: Assessing Risks...")
-        risk_out = risk_feasibility.run(business_idea, industry, region)
-        results["Risk Assessment"] = risk_out
-        with tab6:
-            st.markdown(risk_out)
-        progress_bar.progress(90)
-        time.sleep(2)
-
-        # 7. Final Strategy
-        status_text.markdown("### 🎯 Agent 7/7: Formulating Final Strategy...")
-        final_strat = final_strategy.run(
-            business_idea, market_res, comp_analysis, cust_insights, swot_out, fin_est, risk_out
-        )
-        results["Final Strategy"] = final_strat
-        with tab7:
-            st.markdown(final_strat)
-        progress_bar.progress(100)
+        tab_for = {
+            "Market Research": tab1,
+            "Competitor Analysis": tab2,
+            "Customer Insights": tab3,
+            "SWOT Analysis": tab4,
+            "Financial Estimation": tab5,
+            "Risk Assessment": tab6,
+            "Final Strategy": tab7,
+        }
+
+        # Independent agents run in parallel; tabs fill in as each one finishes
+        done_count = 0
+        for event in run_pipeline(business_idea, industry, region, results=results):
+            if event["step"] == 0:
+                status_text.markdown(f"### 🔍 {event['name']} ({event['status']})...")
+            elif event["status"] == "running":
+                status_text.markdown(f"### ⏳ Agent {event['step']}/7: {event['name']}...")
+            elif event["status"] == "done":
+                done_count += 1
+                with tab_for[event["name"]]:
+                    st.markdown(event["content"])
+                progress_bar.progress(int(done_count / 7 * 100))
         status_text.success("✅ Analysis Complete!")
 
-        # Compile Full Report
-        full_report_text = f"# Business Strategy Report: {business_idea}\n\n"
-        for key, val in results.items():
-            full_report_text += f"## {key}\n{val}\n\n"
-
         # Generate Files
         filename = f"Strategy_Report_{business_idea.replace(' ', '_')}.md"
-        with open(filename, "w") as f:
-            f.write(full_report_text)
-            
-        pdf_path = generate_pdf(filename, full_report_text)
-        ppt_path = generate_ppt(filename, business_idea, results)
-        
+        paths = export.write_all(business_idea, results, filename, formats=("pdf", "pptx"))
+        full_report_text = export.render_markdown(business_idea, results)
+        pdf_path, ppt_path = paths["pdf"], paths["pptx"]
+
         st.markdown("---")
         st.subheader("📥 Download Report")
         col1, col2, col3 = st.columns(3)
@@ -0,0 +1,215 @@
+import asyncio
+import contextlib
+import json
+
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+# The Flask app owns the DB models and export helpers; its blocking parts run on threads here
+from server import (app as flask_app, save_analysis, history_page, input_error, submit_job, get_job, job_details,
+                    resume_job, job_events_after, last_event_id, load_artifact, search_reports, reuse_plan,
+                    served_events, plan_match, complete_event, seeded_stages, artifact_response_parts, analysis_timings,
+                    workers_available, JOB_POLL_INTERVAL, JOB_INPROCESS_WORKERS, HISTORY_PAGE_SIZE)
+from utils.pipeline import arun_pipeline
+from utils import metrics
+
+# ASGI entry point: one event loop holds many long-lived SSE analyses.
+# Run with: uvicorn asgi:app --port 3000
+
+
+def sse(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+
+def in_app_context(fn, *args):
+    with flask_app.app_context():
+        res = fn(*args)
+        # Rows can't leave the context they were loaded in; hand back plain dicts
+        return res.to_dict() if hasattr(res, "to_dict") else res
+
+
+async def home(request):
+    return FileResponse("templates/index.html")
+
+
+async def get_history(request):
+    try:
+        payload, etag = await asyncio.to_thread(in_app_context, history_page, dict(request.query_params))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if f'"{etag}"' in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+async def search(request):
+    q = request.query_params.get('q', '').strip()
+    if not q:
+        return JSONResponse({'error': 'Missing q'}, status_code=400)
+    try:
+        limit = int(request.query_params.get('limit') or HISTORY_PAGE_SIZE)
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    hits = await asyncio.to_thread(in_app_context, search_reports, q, limit, request.query_params.get('industry'),
+                                   request.query_params.get('region'))
+    return JSONResponse({'query': q, 'hits': hits})
+
+
+async def download_report(request):
+    artifact = await asyncio.to_thread(in_app_context, load_artifact, request.path_params['analysis_id'],
+                                       request.path_params['fmt'])
+    if artifact is None:
+        return JSONResponse({'error': 'Not found'}, status_code=404)
+    status, headers, body = artifact_response_parts(artifact, request.headers)
+    return Response(body, status_code=status, headers=headers)
+
+
+async def report_timings(request):
+    timings = await asyncio.to_thread(in_app_context, analysis_timings, request.path_params['analysis_id'])
+    if timings is None:
+        return JSONResponse({'error': 'Not found'}, status_code=404)
+    return JSONResponse(timings)
+
+
+async def metrics_endpoint(request):
+    return Response(metrics.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+async def stream_analysis(request):
+    idea = request.query_params.get('idea')
+    industry = request.query_params.get('industry')
+    region = request.query_params.get('region')
+    formats = request.query_params.get('formats')
+    reuse = request.query_params.get('reuse')
+
+    # Validation
+    if not idea or not industry or not region:
+        return StreamingResponse(iter([sse({'name': 'Error', 'status': 'Error: Missing fields'})]),
+                                 media_type='text/event-stream')
+
+    from utils.llm import GROQ_API_KEY, GEMINI_API_KEY
+    if not GROQ_API_KEY and not GEMINI_API_KEY:
+        return StreamingResponse(iter([sse({'name': 'Error', 'status': 'Error: Server Missing API Keys. Please configure Vercel Envs.'})]),
+                                 media_type='text/event-stream')
+
+    async def generate():
+        try:
+            plan = await asyncio.to_thread(in_app_context, reuse_plan, idea, industry, region, reuse)
+            if plan and plan["mode"] == "serve":
+                for event in served_events(plan):
+                    yield sse(event)
+                return
+            seed = plan["sections"] if plan else None
+            results, seeded = {}, []
+            timings = metrics.RunTimings()
+            async for event in arun_pipeline(idea, industry, region, results=results, stream=True, seed=seed,
+                                             timings=timings):
+                yield sse(seeded_stages(event, seeded))
+
+            yield sse({'step': 8, 'name': 'Generating Files', 'status': 'running'})
+            # DB and file writes block: keep them off the event loop (PDF/PPTX render in the export pool)
+            analysis = await asyncio.to_thread(in_app_context, save_analysis, idea, industry, region, results, formats,
+                                               timings.to_dict())
+            yield sse(complete_event(analysis['files'], plan and plan_match(plan), seeded))
+
+        except Exception as e:
+            yield sse({'step': 0, 'name': 'Error', 'status': f'Critical Error: {str(e)}'})
+
+    return StreamingResponse(generate(), media_type='text/event-stream')
+
+
+async def create_job(request):
+    if request.headers.get('content-type', '').startswith('application/json'):
+        params = await request.json()
+    else:
+        params = await request.form()
+    idea, industry, region = params.get('idea'), params.get('industry'), params.get('region')
+
+    error = input_error(idea, industry, region)
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+    if not await asyncio.to_thread(in_app_context, workers_available):
+        return JSONResponse({'error': 'No job workers are running', 'fallback': '/stream_analysis'}, status_code=503)
+
+    job = await asyncio.to_thread(in_app_context, submit_job, idea, industry, region, params.get('formats'),
+                                  params.get('reuse'))
+    return JSONResponse(dict(job, events=f"/api/jobs/{job['id']}/events"), status_code=202)
+
+
+async def job_status(request):
+    job = await asyncio.to_thread(in_app_context, job_details, request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({'error': 'Unknown job'}, status_code=404)
+    return JSONResponse(job)
+
+
+async def job_resume(request):
+    job = await asyncio.to_thread(in_app_context, resume_job, request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({'error': 'Job is unknown or has not failed'}, status_code=409)
+    return JSONResponse(dict(job, events=f"/api/jobs/{job['id']}/events"), status_code=202)
+
+
+async def job_events(request):
+    job_id = request.path_params['job_id']
+    if await asyncio.to_thread(in_app_context, get_job, job_id) is None:
+        return JSONResponse({'error': 'Unknown job'}, status_code=404)
+    last_id = last_event_id(request.headers, request.query_params)
+    status, events = await asyncio.to_thread(in_app_context, job_events_after, job_id, last_id)
+    if status in ('done', 'failed') and not events:
+        # Nothing left to send: 204 tells EventSource to stop reconnecting
+        return Response(status_code=204)
+
+    async def generate():
+        nonlocal last_id
+        yield "retry: 2000\n\n"
+        idle = 0.0
+        while True:
+            status, events = await asyncio.to_thread(in_app_context, job_events_after, job_id, last_id)
+            for event_id, data in events:
+                last_id = event_id
+                yield f"id: {event_id}\ndata: {data}\n\n"
+            if status in ('done', 'failed', None):
+                return
+            if events:
+                idle = 0.0
+            else:
+                idle += JOB_POLL_INTERVAL
+                if idle >= 15:
+                    yield ": keep-alive\n\n"
+                    idle = 0.0
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return StreamingResponse(generate(), media_type='text/event-stream')
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    stop = None
+    if JOB_INPROCESS_WORKERS:
+        from worker import start_workers
+        stop = start_workers(JOB_INPROCESS_WORKERS)
+    yield
+    if stop:
+        from worker import release_active
+        stop.set()
+        await asyncio.to_thread(release_active)
+
+
+app = Starlette(routes=[
+    Route('/', home),
+    Route('/api/history', get_history),
+    Route('/api/search', search),
+    Route('/api/reports/{analysis_id:int}/timings', report_timings),
+    Route('/api/reports/{analysis_id:int}/{fmt}', download_report),
+    Route('/stream_analysis', stream_analysis),
+    Route('/metrics', metrics_endpoint),
+    Route('/api/jobs', create_job, methods=['POST']),
+    Route('/api/jobs/{job_id}', job_status),
+    Route('/api/jobs/{job_id}/resume', job_resume, methods=['POST']),
+    Route('/api/jobs/{job_id}/events', job_events),
+    Mount('/static', StaticFiles(directory='static'), name='static'),
+], lifespan=lifespan)
@@ -0,0 +1,198 @@
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Add current directory to path so imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.llm import SYSTEM_ERROR
+from utils.pipeline import run_pipeline
+
+# Bulk screening: runs every (idea, industry, region) row of a CSV/JSONL file.
+#   python batch.py ideas.csv --output results.jsonl --concurrency 4
+# All ideas share this process's search cache, LLM cache, stage memo and rate limits.
+# Re-running with the same --output skips rows that already succeeded.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+
+def read_rows(path):
+    """
+    Rows of a .csv (header with idea, industry, region) or .jsonl file.
+    Region defaults to Global; rows without an idea or industry are skipped.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            raw = [json.loads(line) for line in f if line.strip()]
+        else:
+            raw = list(csv.DictReader(f))
+
+    rows, seen = [], set()
+    for r in raw:
+        idea = (r.get("idea") or "").strip()
+        industry = (r.get("industry") or "").strip()
+        region = (r.get("region") or "").strip() or "Global"
+        if not idea or not industry:
+            print(f"Skipping incomplete row: {r}")
+            continue
+        key = row_key(idea, industry, region)
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append({"key": key, "idea": idea, "industry": industry, "region": region})
+    return rows
+
+
+def row_key(idea, industry, region):
+    return "|".join(v.strip().lower() for v in (idea, industry, region))
+
+
+class JsonlOutput:
+    """
+    Appends one JSON line per finished idea; flushed immediately so a killed batch keeps its results.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def done_keys(self):
+        done = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off by a crash
+                    if row.get("status") == "ok":
+                        done.add(row["key"])
+        return done
+
+    def write(self, row):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row) + "\n")
+            f.flush()
+
+    def close(self):
+        pass
+
+
+class SqliteOutput:
+    """
+    One row per idea in a `results` table (latest attempt wins).
+    """
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, idea TEXT, industry TEXT, region TEXT, status TEXT, "
+            "seconds REAL, error TEXT, results TEXT, finished REAL)"
+        )
+        self._conn.commit()
+
+    def done_keys(self):
+        with self._lock:
+            return {r[0] for r in self._conn.execute("SELECT key FROM results WHERE status = 'ok'")}
+
+    def write(self, row):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (row["key"], row["idea"], row["industry"], row["region"], row["status"], row["seconds"],
+                 row.get("error"), json.dumps(row.get("results")), row["finished"]),
+            )
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def open_output(path):
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteOutput(path)
+    return JsonlOutput(path)
+
+
+def analyze(row, stage_workers=None):
+    """
+    Runs the full pipeline for one row. Returns the output record.
+    """
+    start = time.time()
+    results, error = {}, None
+    try:
+        for _ in run_pipeline(row["idea"], row["industry"], row["region"], results=results, max_workers=stage_workers):
+            pass
+        failed = [name for name, content in results.items() if content == SYSTEM_ERROR]
+        if failed:
+            # Not recorded as done, so a resumed batch retries it
+            error = f"LLM failed for: {', '.join(failed)}"
+    except Exception as e:
+        error = str(e)
+    return dict(row, status="error" if error else "ok", error=error, results=results,
+                seconds=round(time.time() - start, 2), finished=time.time())
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def print_summary(latencies, failures, skipped, wall):
+    print("\n---------------------------------------------------------------------")
+    print(f"Finished {len(latencies)} ideas ({failures} failed, {skipped} skipped as already done) in {wall:.1f}s")
+    if not latencies:
+        return
+    print(f"Throughput: {len(latencies) / wall * 3600:.1f} ideas/hour")
+    print("Latency per idea: " + ", ".join(
+        f"p{p}={percentile(latencies, p):.1f}s" for p in (50, 90, 95, 99)
+    ) + f", max={max(latencies):.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the strategy pipeline over a CSV/JSONL list of ideas.")
+    parser.add_argument("input", help="CSV (idea,industry,region header) or JSONL file")
+    parser.add_argument("--output", default="batch_results.jsonl", help=".jsonl or .db (SQLite) results file")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="ideas analysed at the same time")
+    parser.add_argument("--stage-workers", type=int, default=None, help="concurrent stages within one idea")
+    parser.add_argument("--no-resume", action="store_true", help="re-run rows already marked ok in --output")
+    args = parser.parse_args()
+
+    rows = read_rows(args.input)
+    output = open_output(args.output)
+    done = set() if args.no_resume else output.done_keys()
+    todo = [r for r in rows if r["key"] not in done]
+    skipped = len(rows) - len(todo)
+    print(f"{len(rows)} ideas, {skipped} already done, running {len(todo)} with concurrency {args.concurrency}")
+
+    latencies, failures = [], 0
+    start = time.time()
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        futures = [pool.submit(analyze, r, args.stage_workers) for r in todo]
+        for i, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            output.write(record)
+            latencies.append(record["seconds"])
+            if record["status"] != "ok":
+                failures += 1
+            mark = "✅" if record["status"] == "ok" else f"❌ {record['error']}"
+            print(f"[{i}/{len(todo)}] {record['idea']} ({record['seconds']:.1f}s) {mark}")
+    except KeyboardInterrupt:
+        # Every finished idea is already written; don't wait for the ones in flight
+        print("\nInterrupted; re-run the same command to resume.")
+        output.close()
+        os._exit(1)
+    pool.shutdown()
+    output.close()
+
+    print_summary(latencies, failures, skipped, time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+# Run from anywhere: python benchmarks/export_bench.py --sizes 10 100 1000
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import export
+
+# Export time and peak memory for synthetic reports of growing size.
+# Sizes are paragraphs per section (7 sections, like a real report).
+SECTIONS = ["Market Research", "Competitor Analysis", "Customer Insights", "SWOT Analysis",
+            "Financial Estimation", "Risk Assessment", "Final Strategy"]
+PARAGRAPH = ("The **addressable market** grows steadily as adoption spreads from early pilots to "
+             "mid-sized operators, with pricing pressure from [incumbents](https://example.com) "
+             "offset by lower acquisition costs in secondary cities.")
+
+
+def synthetic_sections(paragraphs):
+    """
+    Report sections mixing the blocks agents produce: headings, prose, nested lists and tables.
+    """
+    sections = {}
+    for name in SECTIONS:
+        parts = []
+        for i in range(paragraphs):
+            if i % 10 == 0:
+                parts.append(f"### Part {i // 10 + 1}")
+            if i % 5 == 4:
+                parts.append(f"- Point {i}: {PARAGRAPH[:80]}\n  - Detail for *point {i}*")
+            elif i % 17 == 16:
+                parts.append("| Year | Revenue | Margin |\n|---|---|---|\n| 1 | $120k | 12% |\n| 2 | $480k | 21% |")
+            else:
+                parts.append(PARAGRAPH)
+        sections[name] = "\n\n".join(parts)
+    return sections
+
+
+def measure(fmt, idea, sections, out_dir):
+    path = os.path.join(out_dir, f"bench.{fmt}")
+    tracemalloc.start()
+    start = time.perf_counter()
+    export.write(idea, sections, fmt, path)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = os.path.getsize(path)
+    os.remove(path)
+    return {"seconds": round(seconds, 3), "peak_mb": round(peak / 2**20, 2), "file_kb": round(size / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark report export time and memory by report size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="paragraphs per section")
+    parser.add_argument("--formats", nargs="+", default=list(export.FORMATS), help="formats to render")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    formats = export.parse_formats(args.formats)
+    # Warm-up: imports, font metrics and the PPTX template load aren't part of the measurement
+    with tempfile.TemporaryDirectory() as out_dir:
+        for fmt in formats:
+            measure(fmt, "warm-up", synthetic_sections(1), out_dir)
+
+        rows = []
+        print(f"{'paragraphs':>10} {'report KB':>10} {'format':>6} {'seconds':>8} {'peak MB':>8} {'file KB':>8}")
+        for size in args.sizes:
+            sections = synthetic_sections(size)
+            report_kb = round(len(export.render_markdown("Benchmark", sections)) / 1024, 1)
+            for fmt in formats:
+                row = dict(measure(fmt, "Benchmark", sections, out_dir), paragraphs=size, report_kb=report_kb, format=fmt)
+                rows.append(row)
+                print(f"{size:>10} {report_kb:>10} {fmt:>6} {row['seconds']:>8} {row['peak_mb']:>8} {row['file_kb']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Guards cold-start time: imports the web entry point in a fresh interpreter with
+# `python -X importtime` and fails (exit 1) if it takes longer than the budget or
+# pulls in a module that should only load on first use.
+#   python benchmarks/import_budget.py --budget-ms 1200
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1200"))
+# Heavy SDKs and exporters that the page and /api/history never need
+LAZY_MODULES = ["utils.pipeline", "utils.llm", "utils.search", "google.generativeai", "groq", "ddgs",
+                "reportlab", "pptx"]
+
+
+def import_times(module):
+    """
+    {module: (self_us, cumulative_us)} for one fresh import of `module`.
+    Schema setup is deferred so the measurement doesn't touch the database.
+    """
+    env = dict(os.environ, SCHEMA_SETUP="deferred", JOB_INPROCESS_WORKERS="0")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            times[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+        except ValueError:
+            continue  # the header line
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if importing the app exceeds its cold-start budget.")
+    parser.add_argument("--module", default="server", help="module to import (default: server)")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="cumulative import time allowed")
+    parser.add_argument("--runs", type=int, default=3, help="imports to measure; the fastest counts")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda t: t[args.module][1])
+    total_ms = best[args.module][1] / 1000
+    eager = [m for m in LAZY_MODULES if m in best]
+
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+    slowest = sorted(best.items(), key=lambda kv: kv[1][0], reverse=True)[:args.top]
+    for name, (self_us, _) in slowest:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if eager:
+        failures.append(f"imported at startup but should load on first use: {', '.join(eager)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"module": args.module, "import_ms": round(total_ms, 1), "budget_ms": args.budget_ms,
+                       "eager_lazy_modules": eager, "ok": not failures}, f, indent=2)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import resource
+import tempfile
+import subprocess
+import statistics
+import tracemalloc
+
+# Offline benchmark of the analysis pipeline: the LLM providers and the web search are
+# replaced by the deterministic stand-ins in utils/offline.py, so the numbers are
+# reproducible and cost no quota. Measures end-to-end latency, per-stage overhead
+# (stage wall time minus its LLM time), prompt building, export time and memory.
+#   python benchmarks/pipeline_bench.py --runs 5 --json after.json --compare before.json
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+IDEAS = [
+    ("AI tutoring app for kids", "EdTech", "India"),
+    ("Cloud kitchen for office lunches", "Food & Beverage", "USA"),
+    ("Subscription bike repair", "Mobility", "Germany"),
+    ("B2B invoice financing marketplace", "Fintech", "Brazil"),
+    ("Solar panel cleaning robots", "CleanTech", "UAE"),
+]
+
+
+def configure(args, workdir):
+    """
+    Environment for the stand-ins, set before any utils module is imported. Caches,
+    the stage memo and rate limits are off so every run does the full work.
+    """
+    os.environ.update({
+        "LLM_BACKEND": "offline",
+        "WEB_SEARCH_BACKEND": "offline",
+        "OFFLINE_LLM_LATENCY": args.llm_latency,
+        "OFFLINE_SEARCH_LATENCY": args.search_latency,
+        "OFFLINE_LLM_FAILURE_RATE": args.llm_failure_rate,
+        "OFFLINE_SEARCH_FAILURE_RATE": str(args.search_failure_rate),
+        "OFFLINE_SEED": str(args.seed),
+        "LLM_CACHE": "0",
+        "SEARCH_CACHE": "0",
+        "STAGE_MEMO": "0",
+        "SEARCH_CACHE_PATH": os.path.join(workdir, "search.db"),
+        "STAGE_MEMO_PATH": os.path.join(workdir, "stages.db"),
+        "GROQ_RPM": "0", "GROQ_TPM": "0", "GEMINI_RPM": "0", "GEMINI_TPM": "0",
+    })
+    if args.fixtures:
+        os.environ["OFFLINE_FIXTURES"] = os.path.abspath(args.fixtures)
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """
+    Silences the agents' console logging (from every thread) while measuring.
+    """
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def summarize(values):
+    ordered = sorted(values)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return {"mean": round(statistics.mean(ordered), 4), "p50": round(pick(50), 4), "p95": round(pick(95), 4),
+            "max": round(ordered[-1], 4)}
+
+
+def run_once(idea, industry, region):
+    from utils.pipeline import run_pipeline
+    from utils.metrics import RunTimings
+    from utils.router import ProviderHealth
+    from utils.llm import router
+    # Closed circuits at the start of every run: injected failures in one run don't reroute the next
+    for provider in router.health:
+        router.health[provider] = ProviderHealth(provider)
+    results, timings = {}, RunTimings()
+    for _ in run_pipeline(idea, industry, region, results=results, timings=timings):
+        pass
+    return results, timings.to_dict()
+
+
+def bench_end_to_end(runs):
+    """
+    Latency of full analyses, and per stage the wall time, LLM time and the overhead between them.
+    """
+    from utils import metrics
+    counters = {"llm_attempts": metrics.LLM_ATTEMPTS, "llm_retries": metrics.LLM_RETRIES,
+                "llm_fallbacks": metrics.LLM_FALLBACKS}
+    before = {name: counter.total() for name, counter in counters.items()}
+    totals, stages, search = [], {}, []
+    results = None
+    for i in range(runs):
+        idea, industry, region = IDEAS[i % len(IDEAS)]
+        # A run number keeps ideas distinct, so nothing is reused between runs
+        results, timings = run_once(f"{idea} #{i}", industry, region)
+        totals.append(timings["total_seconds"])
+        search.append(timings["search"]["seconds"])
+        for name, stage in timings["stages"].items():
+            entry = stages.setdefault(name, {"seconds": [], "llm_seconds": [], "overhead": [], "prompt_tokens": []})
+            entry["seconds"].append(stage["seconds"])
+            entry["llm_seconds"].append(stage["llm_seconds"])
+            entry["overhead"].append(max(0.0, stage["seconds"] - stage["llm_seconds"]))
+            entry["prompt_tokens"].append(stage["prompt_tokens"])
+
+    return results, dict({
+        "runs": runs,
+        "total_seconds": summarize(totals),
+        "search_seconds": summarize(search),
+        "stages": {name: {k: summarize(v) for k, v in entry.items()} for name, entry in stages.items()},
+    }, **{name: counter.total() - before[name] for name, counter in counters.items()})
+
+
+def bench_prompts(results, repeat):
+    """
+    Time to build each stage's prompt (search context, compaction and the template)
+    without the LLM call, using the outputs of a finished run as upstream reports.
+    """
+    from utils.pipeline import STAGES
+    from utils.search import prefetch
+    from utils.compaction import compact
+    from utils.tokens import estimate_tokens
+
+    idea, industry, region = IDEAS[0]
+    ctx = dict(results, idea=idea, industry=industry, region=region, on_delta=None)
+    ctx["search"] = prefetch([q for s in STAGES for q in s.queries(ctx)])
+    timings = {}
+    for stage in STAGES:
+        prompts = []
+        agent_call = stage.agent.call_llm
+        stage.agent.call_llm = lambda prompt, **kwargs: prompts.append(prompt) or ""
+        try:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                stage_ctx = dict(ctx)
+                for d in stage.deps if stage.compact_budget else ():
+                    stage_ctx[d] = compact(stage_ctx[d], stage.compact_budget)
+                stage.fn(stage_ctx)
+            seconds = (time.perf_counter() - start) / repeat
+        finally:
+            stage.agent.call_llm = agent_call
+        timings[stage.name] = {"ms": round(seconds * 1000, 3), "prompt_tokens": estimate_tokens(prompts[-1])}
+    return timings
+
+
+def bench_export(results):
+    from export_bench import measure
+    from utils import export
+    with tempfile.TemporaryDirectory() as out_dir:
+        return {fmt: measure(fmt, IDEAS[0][0], results, out_dir) for fmt in export.FORMATS}
+
+
+def bench_memory():
+    """
+    Peak Python heap of one analysis (tracemalloc) and the process's peak RSS so far.
+    """
+    tracemalloc.start()
+    run_once(*IDEAS[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    rss_mb = rss / 2**20 if sys.platform == "darwin" else rss / 1024
+    return {"pipeline_peak_mb": round(peak / 2**20, 2), "max_rss_mb": round(rss_mb, 1)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    """
+    Prints every numeric result that differs from the baseline file, with the relative change.
+    """
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name in sorted(set(old) & set(new)):
+        if old[name] == new[name]:
+            continue
+        change = f"{(new[name] - old[name]) / old[name] * 100:+.1f}%" if old[name] else "new"
+        print(f"  {name:60} {old[name]:>10} -> {new[name]:<10} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the analysis pipeline.")
+    parser.add_argument("--runs", type=int, default=5, help="analyses to run")
+    parser.add_argument("--suites", nargs="+", default=["end_to_end", "prompts", "export", "memory"],
+                        help="end_to_end, prompts, export, memory")
+    parser.add_argument("--llm-latency", default="lognormal:0.2,0.25", help="stand-in LLM latency distribution")
+    parser.add_argument("--search-latency", default="fixed:0.02", help="stand-in search latency distribution")
+    parser.add_argument("--llm-failure-rate", default="0", help='e.g. "0.1" or "groq=0.2,gemini=0"')
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0, help="seeds latencies and injected failures")
+    parser.add_argument("--fixtures", help="JSONL recorded with OFFLINE_RECORD, replayed instead of generated answers")
+    parser.add_argument("--prompt-repeat", type=int, default=20, help="repetitions per prompt measurement")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own logging")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    configure(args, workdir)
+    os.chdir(ROOT)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+        "results": {},
+    }
+    # Warm-up: imports and first-call setup aren't part of any measurement
+    with quiet(not args.verbose):
+        results, _ = run_once("warm-up", "Benchmarks", "Global")
+    if "end_to_end" in args.suites:
+        with quiet(not args.verbose):
+            results, report["results"]["end_to_end"] = bench_end_to_end(args.runs)
+        e2e = report["results"]["end_to_end"]
+        print(f"End-to-end ({args.runs} runs): p50 {e2e['total_seconds']['p50']}s, p95 {e2e['total_seconds']['p95']}s; "
+              f"{e2e['llm_attempts']} LLM attempts, {e2e['llm_retries']} retries, {e2e['llm_fallbacks']} fallbacks")
+        print(f"{'stage':24} {'wall p50':>9} {'LLM p50':>9} {'overhead p50':>13}")
+        for name, stage in e2e["stages"].items():
+            print(f"{name:24} {stage['seconds']['p50']:>9} {stage['llm_seconds']['p50']:>9} {stage['overhead']['p50']:>13}")
+    if "prompts" in args.suites:
+        with quiet(not args.verbose):
+            report["results"]["prompts"] = bench_prompts(results, args.prompt_repeat)
+        print("Prompt building: " + ", ".join(f"{k} {v['ms']}ms" for k, v in report["results"]["prompts"].items()))
+    if "export" in args.suites:
+        report["results"]["export"] = bench_export(results)
+        print("Export: " + ", ".join(f"{k} {v['seconds']}s/{v['peak_mb']}MB" for k, v in report["results"]["export"].items()))
+    if "memory" in args.suites:
+        with quiet(not args.verbose):
+            report["results"]["memory"] = bench_memory()
+        print(f"Memory: {report['results']['memory']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+try:
+    import psutil
+except ImportError:  # optional: pip install psutil (otherwise /proc is read, Linux only)
+    psutil = None
+
+from pipeline_bench import summarize, git_commit
+
+# Load test of the streaming path: opens N concurrent /stream_analysis SSE sessions
+# (the way EventSource clients would) against a local server whose LLM and search
+# providers are the offline stand-ins, with /api/history requests alongside, for
+# each concurrency level in turn. Reports time to first byte and first event,
+# gaps between events, completion and error rates, and the server's RSS and CPU.
+#   python benchmarks/sse_load.py --levels 1 10 25 50 --json sse_load.json
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How each --server kind is started; {port} is filled in
+SERVER_COMMANDS = {
+    # The Flask app as `python server.py` serves it, minus the debug reloader's extra process
+    "flask": [sys.executable, "-c", "import server; server.app.run(port={port}, threaded=True)"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app", "--port", "{port}", "--log-level", "warning"],
+}
+
+
+def server_env(args, workdir):
+    """
+    Stand-in providers, a throwaway database and store, and nothing cached or reused,
+    so every session runs the whole pipeline.
+    """
+    return dict(os.environ, **{
+        "LLM_BACKEND": "offline",
+        "WEB_SEARCH_BACKEND": "offline",
+        "OFFLINE_LLM_LATENCY": args.llm_latency,
+        "OFFLINE_SEARCH_LATENCY": args.search_latency,
+        "OFFLINE_LLM_FAILURE_RATE": args.llm_failure_rate,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        "ARTIFACT_DIR": os.path.join(workdir, "artifacts"),
+        "SEARCH_CACHE_PATH": os.path.join(workdir, "search.db"),
+        "STAGE_MEMO_PATH": os.path.join(workdir, "stages.db"),
+        "LLM_CACHE": "0", "SEARCH_CACHE": "0", "STAGE_MEMO": "0", "IDEA_MATCH": "off",
+        "GROQ_RPM": "0", "GROQ_TPM": "0", "GEMINI_RPM": "0", "GEMINI_TPM": "0",
+        "SCHEMA_SETUP": "startup", "JOB_INPROCESS_WORKERS": "0",
+    })
+
+
+def start_server(args, workdir):
+    command = [part.format(port=args.port) for part in SERVER_COMMANDS[args.server]]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    proc = subprocess.Popen(command, cwd=ROOT, env=server_env(args, workdir), stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{args.port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with {proc.returncode}, see {log.name}")
+        try:
+            if httpx.get(f"{base}/api/history?limit=1", timeout=2).status_code == 200:
+                return proc, base
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError(f"Server didn't come up on {base}, see {log.name}")
+
+
+def _proc_tree(pid):
+    """
+    `pid` and its descendants, from /proc.
+    """
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree, frontier = [pid], [pid]
+    while frontier:
+        children = [p for p, parent in parents.items() if parent in frontier]
+        tree.extend(children)
+        frontier = children
+    return tree
+
+
+def _proc_usage(pid):
+    """
+    (rss_bytes, cpu_seconds) of `pid` and its descendants.
+    """
+    if psutil is not None:
+        proc = psutil.Process(pid)
+        procs = [proc] + proc.children(recursive=True)
+        rss = sum(p.memory_info().rss for p in procs)
+        cpu = sum(p.cpu_times().user + p.cpu_times().system for p in procs)
+        return rss, cpu
+    rss, ticks = 0, 0
+    for p in _proc_tree(pid):
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])
+            rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss, ticks / os.sysconf("SC_CLK_TCK")
+
+
+class ServerSampler(threading.Thread):
+    """
+    Samples the server's RSS and CPU every `interval` seconds until stopped.
+    """
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.samples.append((time.perf_counter(), *_proc_usage(self.pid)))
+            except Exception:
+                return  # unsupported platform or the server is gone
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        if len(self.samples) < 2:
+            return None
+        cpu = [(b[2] - a[2]) / (b[0] - a[0]) * 100 for a, b in zip(self.samples, self.samples[1:])]
+        return {"peak_rss_mb": round(max(s[1] for s in self.samples) / 2**20, 1),
+                "mean_cpu_pct": round(sum(cpu) / len(cpu), 1), "max_cpu_pct": round(max(cpu), 1)}
+
+
+def sse_session(client, base, idea, timeout):
+    """
+    One /stream_analysis session read to the end, the way an EventSource consumes it.
+    """
+    params = {"idea": idea, "industry": "Load Testing", "region": "Global", "reuse": "off"}
+    result = {"ttfb": None, "first_event": None, "event_gaps": [], "step_gaps": [], "events": 0,
+              "completed": False, "error": None}
+    start = time.perf_counter()
+    last_event = last_step = None
+    try:
+        with client.stream("GET", f"{base}/stream_analysis", params=params, timeout=timeout) as response:
+            result["ttfb"] = time.perf_counter() - start
+            if response.status_code != 200:
+                result["error"] = f"HTTP {response.status_code}"
+                return result
+            for line in response.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                now = time.perf_counter()
+                event = json.loads(line[6:])
+                result["events"] += 1
+                if last_event is None:
+                    result["first_event"] = now - start
+                else:
+                    result["event_gaps"].append(now - last_event)
+                last_event = now
+                if event.get("status") not in ("delta", "reset"):
+                    if last_step is not None:
+                        result["step_gaps"].append(now - last_step)
+                    last_step = now
+                status = str(event.get("status", ""))
+                if status == "complete":
+                    result["completed"] = True
+                elif status.startswith(("Error", "Critical Error")):
+                    result["error"] = status
+            if not result["completed"] and result["error"] is None:
+                result["error"] = "stream ended early"
+    except (httpx.HTTPError, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        result["duration"] = time.perf_counter() - start
+    return result
+
+
+def history_traffic(client, base, rps, stop, out):
+    """
+    GET /api/history at `rps` requests per second until `stop` is set; latencies go to `out`.
+    """
+    pool = ThreadPoolExecutor(max_workers=8)
+
+    def fetch():
+        start = time.perf_counter()
+        try:
+            ok = client.get(f"{base}/api/history", timeout=30).status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        out.append((time.perf_counter() - start, ok))
+
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        pool.submit(fetch)
+        next_at += 1 / rps
+        stop.wait(max(0.0, next_at - time.perf_counter()))
+    pool.shutdown(wait=True)
+
+
+def run_level(base, concurrency, args, pid):
+    """
+    `concurrency` simultaneous sessions (started `--stagger` seconds apart) plus history traffic.
+    """
+    client = httpx.Client(limits=httpx.Limits(max_connections=None, max_keepalive_connections=concurrency + 8))
+    sampler = ServerSampler(pid) if pid else None
+    if sampler: sampler.start()
+    stop, history = threading.Event(), []
+    history_thread = None
+    if args.history_rps > 0:
+        history_thread = threading.Thread(target=history_traffic, args=(client, base, args.history_rps, stop, history),
+                                          daemon=True)
+        history_thread.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for i in range(concurrency):
+            # A unique idea per session, so no session is served from another's results
+            idea = f"Load test idea {uuid.uuid4().hex[:8]}"
+            futures.append(pool.submit(sse_session, client, base, idea, args.timeout))
+            if args.stagger:
+                time.sleep(args.stagger)
+        sessions = [f.result() for f in futures]
+    wall = time.perf_counter() - started
+
+    stop.set()
+    if history_thread: history_thread.join()
+    server = sampler.stop() if sampler else None
+    client.close()
+
+    def stat(key, values=None):
+        values = values if values is not None else [s[key] for s in sessions if s[key] is not None]
+        return summarize(values) if values else None
+
+    completed = sum(1 for s in sessions if s["completed"])
+    errors = [s["error"] for s in sessions if s["error"]]
+    return {
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 2),
+        "completed": completed,
+        "completion_rate": round(completed / concurrency, 3),
+        "error_rate": round(len(errors) / concurrency, 3),
+        "errors": sorted(set(errors))[:5],
+        "ttfb": stat("ttfb"),
+        "first_event": stat("first_event"),
+        "event_gap": stat(None, [g for s in sessions for g in s["event_gaps"]]),
+        "step_gap": stat(None, [g for s in sessions for g in s["step_gaps"]]),
+        "duration": stat("duration"),
+        "history": {"requests": len(history), "errors": sum(1 for _, ok in history if not ok),
+                    "latency": summarize([t for t, _ in history]) if history else None},
+        "server": server,
+    }
+
+
+def print_level(level):
+    fmt = lambda s, k="p50": f"{s[k] * 1000:.0f}" if s else "-"
+    server = level["server"] or {}
+    print(f"{level['concurrency']:>5} {level['completion_rate'] * 100:>6.1f}% {level['error_rate'] * 100:>6.1f}% "
+          f"{fmt(level['ttfb']):>9} {fmt(level['ttfb'], 'p95'):>9} {fmt(level['first_event'], 'p95'):>10} "
+          f"{fmt(level['event_gap'], 'p95'):>9} {fmt(level['step_gap'], 'p95'):>9} "
+          f"{fmt(level['history']['latency'], 'p95'):>10} {server.get('peak_rss_mb', '-'):>8} {server.get('mean_cpu_pct', '-'):>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent SSE load test of /stream_analysis with /api/history traffic.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 5, 10, 25], help="concurrent sessions per level")
+    parser.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="flask", help="app to start")
+    parser.add_argument("--url", help="test an already running server instead (start it with LLM_BACKEND=offline)")
+    parser.add_argument("--server-pid", type=int, help="with --url: process to sample for RSS/CPU")
+    parser.add_argument("--port", type=int, default=3100)
+    parser.add_argument("--llm-latency", default="lognormal:0.5,0.3", help="stand-in LLM latency distribution")
+    parser.add_argument("--search-latency", default="fixed:0.05", help="stand-in search latency distribution")
+    parser.add_argument("--llm-failure-rate", default="0", help='e.g. "0.1" or "groq=0.2,gemini=0"')
+    parser.add_argument("--history-rps", type=float, default=2.0, help="/api/history requests per second (0 = none)")
+    parser.add_argument("--stagger", type=float, default=0.0, help="seconds between session starts within a level")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-session timeout")
+    parser.add_argument("--max-error-rate", type=float, help="exit 1 if any level's error rate is higher")
+    parser.add_argument("--max-ttfb-p95", type=float, help="exit 1 if any level's p95 first-event time is higher (seconds)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    proc = None
+    workdir = tempfile.mkdtemp(prefix="sse-load-")
+    if args.url:
+        base, pid = args.url.rstrip("/"), args.server_pid
+    else:
+        proc, base = start_server(args, workdir)
+        pid = proc.pid
+        print(f"Started {args.server} server on {base} (pid {pid}, logs in {workdir})")
+
+    # Warm-up: the first analysis pays for the server's lazy imports of the pipeline
+    with httpx.Client() as client:
+        warmup = sse_session(client, base, "Load test warm-up", args.timeout)
+    if not warmup["completed"]:
+        print(f"⚠️ Warm-up session failed: {warmup['error']}")
+
+    levels = []
+    print(f"{'conc':>5} {'done':>7} {'errors':>7} {'ttfb p50':>9} {'ttfb p95':>9} {'1st ev p95':>10} "
+          f"{'gap p95':>9} {'step p95':>9} {'hist p95':>10} {'RSS MB':>8} {'CPU%':>6}   (times in ms)")
+    try:
+        for concurrency in args.levels:
+            level = run_level(base, concurrency, args, pid)
+            levels.append(level)
+            print_level(level)
+    finally:
+        if proc is not None:
+            proc.send_signal(signal.SIGINT)
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    failures = []
+    for level in levels:
+        if args.max_error_rate is not None and level["error_rate"] > args.max_error_rate:
+            failures.append(f"{level['concurrency']} sessions: error rate {level['error_rate']:.1%}")
+        if args.max_ttfb_p95 is not None and level["first_event"] and level["first_event"]["p95"] > args.max_ttfb_p95:
+            failures.append(f"{level['concurrency']} sessions: first event p95 {level['first_event']['p95']:.2f}s")
+
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k != "json"}
+        with open(args.json, "w") as f:
+            json.dump({"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": config,
+                       "levels": levels, "ok": not failures}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
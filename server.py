@@ -1,23 +1,23 @@
-from flask import Flask, render_template, request, Response, jsonify, stream_with_context
+from flask import Flask, render_template, request, Response, jsonify, stream_with_context, abort
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import time
 import os
+import sys
 import shutil
-from agents import (
-    market_research,
-    competitor_analysis,
-    customer_insight,
-    swot_analysis,
-    financial_estimation,
-    risk_feasibility,
-    final_strategy
-)
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import textwrap
-from pptx import Presentation
+import uuid
+import re
+import html
+import base64
+import hashlib
+from dotenv import load_dotenv
+# Loaded here rather than via utils.llm, which isn't imported at startup
+load_dotenv()
+# utils.pipeline (agents, LLM and search SDKs) is imported where it's used, so cold
+# starts that only serve the page or the history don't pay for it
+from utils import export, artifacts, metrics
+from utils.similarity import IdeaIndex, IDEA_MATCH, IDEA_MATCH_MODES, IDEA_MATCH_MAX_AGE
 
 app = Flask(__name__)
 
@@ -29,18 +29,44 @@ if database_url.startswith("postgres://"):
 
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if database_url.startswith("sqlite"):
+    # Job workers in other processes write to the same file; wait for locks instead of failing
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"connect_args": {"timeout": 30}}
 db = SQLAlchemy(app)
 
+# Background jobs: how often an SSE subscriber polls for new events, and how many
+# worker threads `python server.py` runs itself (0 = only external `python worker.py`)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+JOB_INPROCESS_WORKERS = int(os.getenv("JOB_INPROCESS_WORKERS", "1"))
+# A job or worker process whose heartbeat is older than this is considered gone: its
+# running jobs are requeued, and without any live worker /api/jobs refuses new jobs
+# so the dashboard runs the analysis on /stream_analysis instead
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "120"))
+# Schema creation/upgrade: "startup" runs it on import; "deferred" (default on Vercel)
+# leaves it to `python server.py --init-db`, run once per deploy, so cold starts skip it
+SCHEMA_SETUP = os.getenv("SCHEMA_SETUP", "deferred" if os.getenv("VERCEL") else "startup")
+# /api/history page size (?limit= can ask for up to HISTORY_MAX_PAGE)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE = int(os.getenv("HISTORY_MAX_PAGE", "100"))
+# Browser cache lifetime of report downloads: the markdown of a report never changes,
+# renders are revalidated (ETag) after ARTIFACT_RENDER_MAX_AGE
+ARTIFACT_MAX_AGE = int(os.getenv("ARTIFACT_MAX_AGE", str(365 * 24 * 3600)))
+ARTIFACT_RENDER_MAX_AGE = int(os.getenv("ARTIFACT_RENDER_MAX_AGE", str(24 * 3600)))
+
 # --- Database Model ---
 class Analysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     idea = db.Column(db.String(200), nullable=False)
-    industry = db.Column(db.String(100), nullable=False)
-    region = db.Column(db.String(100), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    industry = db.Column(db.String(100), nullable=False, index=True)
+    region = db.Column(db.String(100), nullable=False, index=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Reports saved before the artifact store have files here instead of the keys below
     md_path = db.Column(db.String(200))
     pdf_path = db.Column(db.String(200))
     ppt_path = db.Column(db.String(200))
+    report_key = db.Column(db.String(64))  # artifact store key of the markdown
+    sections_key = db.Column(db.String(64))  # ... and of the sections (JSON) the other formats render from
+    timings = db.Column(db.Text)  # JSON timing breakdown of the run (utils.metrics.RunTimings)
 
     def to_dict(self):
         return {
@@ -49,54 +75,626 @@ class Analysis(db.Model):
             "industry": self.industry,
             "region": self.region,
             "date": self.timestamp.strftime("%Y-%m-%d %H:%M"),
+            # All served by the download route, which renders PDF/PPTX/HTML on first request
             "files": {
-                "md": self.md_path,
-                "pdf": self.pdf_path,
-                "ppt": self.ppt_path
+                "md": f"api/reports/{self.id}/md",
+                "pdf": f"api/reports/{self.id}/pdf",
+                "ppt": f"api/reports/{self.id}/pptx",
+                "html": f"api/reports/{self.id}/html"
             }
         }
 
-# Create DB Tables
-with app.app_context():
-    db.create_all()
+class Job(db.Model):
+    """
+    One queued analysis. Workers claim rows from this table, so they can run in
+    other processes or on other nodes sharing DATABASE_URL.
+    """
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    idea = db.Column(db.String(200), nullable=False)
+    industry = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100), nullable=False)
+    formats = db.Column(db.String(50))  # artifacts rendered eagerly, e.g. "pdf,pptx"
+    seed_from = db.Column(db.Integer, db.ForeignKey('analysis.id'))  # near-duplicate run whose research is reused
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analysis.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "idea": self.idea,
+            "industry": self.industry,
+            "region": self.region,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "analysis_id": self.analysis_id,
+            "seed_from": self.seed_from,
+            "created": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+class JobWorker(db.Model):
+    """
+    A process running job workers, kept alive by its heartbeat thread (see worker.py).
+    """
+    id = db.Column(db.String(100), primary_key=True)  # host:pid
+    threads = db.Column(db.Integer, nullable=False)
+    heartbeat = db.Column(db.DateTime, nullable=False, index=True)
+
+class JobEvent(db.Model):
+    # The autoincrement id doubles as the SSE event id used for Last-Event-ID replay
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('job.id'), nullable=False, index=True)
+    data = db.Column(db.Text, nullable=False)
+
+class StageCheckpoint(db.Model):
+    """
+    One pipeline stage's output for a job, saved as soon as the stage finishes so a
+    failed or interrupted job resumes from here instead of starting over.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('job.id'), nullable=False, index=True)
+    stage = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # done, failed
+    input_hash = db.Column(db.String(64), nullable=False)
+    provider = db.Column(db.String(20))
+    content = db.Column(db.Text)
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    duration = db.Column(db.Float)
+    __table_args__ = (db.UniqueConstraint('job_id', 'stage'),)
+
+    def to_dict(self):
+        return {
+            "stage": self.stage,
+            "status": self.status,
+            "provider": self.provider,
+            "duration": round(self.duration, 2) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+class ReportSection(db.Model):
+    """
+    One section of a finished report, stored for full-text search
+    (FTS5 on SQLite, a tsvector index on Postgres; see setup_search).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analysis.id'), nullable=False, index=True)
+    stage = db.Column(db.String(100), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+
+# Snippet highlight markers; swapped for <mark> tags after the snippet is HTML-escaped
+MARK_START, MARK_END = "\x02", "\x03"
+# "fts5", "postgres" or "like"; set by init_db(), or detected on the first search
+SEARCH_BACKEND = None
 
-# --- Helper Functions for File Generation ---
-def create_pdf(filename, content):
+def setup_search():
+    """
+    Creates the full-text index for ReportSection if missing. Returns the search
+    backend in use: "fts5", "postgres", or "like" (plain substring match) elsewhere.
+    """
+    dialect = db.engine.dialect.name
     try:
-        c = canvas.Canvas(filename, pagesize=letter)
-        width, height = letter
-        text = c.beginText(40, height - 40)
-        text.setFont("Helvetica", 10)
-        for line in content.split('\n'):
-            wrapped = textwrap.wrap(line, width=90)
-            for w in wrapped:
-                if text.getY() < 40:
-                    c.drawText(text)
-                    c.showPage()
-                    text = c.beginText(40, height - 40)
-                    text.setFont("Helvetica", 10)
-                text.textLine(w)
-        c.drawText(text)
-        c.save()
-        return filename
-    except: return None
-
-def create_ppt(filename, idea, data):
+        with db.engine.begin() as conn:
+            if dialect == "sqlite":
+                # External-content table: the text lives once, in report_section; triggers keep the index in sync
+                conn.execute(db.text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS report_section_fts USING fts5("
+                    "content, content='report_section', content_rowid='id', tokenize='porter unicode61')"))
+                conn.execute(db.text(
+                    "CREATE TRIGGER IF NOT EXISTS report_section_ai AFTER INSERT ON report_section BEGIN "
+                    "INSERT INTO report_section_fts(rowid, content) VALUES (new.id, new.content); END"))
+                conn.execute(db.text(
+                    "CREATE TRIGGER IF NOT EXISTS report_section_ad AFTER DELETE ON report_section BEGIN "
+                    "INSERT INTO report_section_fts(report_section_fts, rowid, content) "
+                    "VALUES ('delete', old.id, old.content); END"))
+                conn.execute(db.text(
+                    "CREATE TRIGGER IF NOT EXISTS report_section_au AFTER UPDATE ON report_section BEGIN "
+                    "INSERT INTO report_section_fts(report_section_fts, rowid, content) "
+                    "VALUES ('delete', old.id, old.content); "
+                    "INSERT INTO report_section_fts(rowid, content) VALUES (new.id, new.content); END"))
+                return "fts5"
+            if dialect == "postgresql":
+                conn.execute(db.text(
+                    "CREATE INDEX IF NOT EXISTS ix_report_section_tsv ON report_section "
+                    "USING GIN (to_tsvector('english', content))"))
+                return "postgres"
+    except Exception as e:
+        print(f"⚠️ Full-text index unavailable ({e}); report search falls back to substring matching")
+    return "like"
+
+def index_past_reports():
+    """
+    Stores the sections of reports saved before search existed (read back from their files).
+    """
+    indexed = db.session.query(ReportSection.analysis_id)
+    missing = Analysis.query.filter(Analysis.id.notin_(indexed)).all()
+    count = 0
+    for analysis in missing:
+        if not analysis.md_path or not os.path.exists(analysis.md_path):
+            continue
+        sections = export.load_sections(analysis.md_path)
+        db.session.add_all(ReportSection(analysis_id=analysis.id, stage=k, content=v) for k, v in sections.items())
+        count += 1
+    db.session.commit()
+    if count:
+        print(f"🔎 Indexed {count} past reports for search")
+
+def upgrade_schema():
+    """
+    create_all skips tables that already exist; add the columns and indexes introduced since.
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                         f"{column.type.compile(db.engine.dialect)}"))
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def init_db():
+    """
+    Creates and upgrades the schema and search index, and indexes past reports. Safe to re-run.
+    """
+    global SEARCH_BACKEND
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        SEARCH_BACKEND = setup_search()
+        index_past_reports()
+
+def search_backend():
+    """
+    The search backend, detected without any DDL when init_db() didn't run in this process.
+    """
+    global SEARCH_BACKEND
+    if SEARCH_BACKEND is None:
+        dialect = db.engine.dialect.name
+        if dialect == "postgresql":
+            SEARCH_BACKEND = "postgres"
+        elif dialect == "sqlite" and db.session.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'report_section_fts'")).first():
+            SEARCH_BACKEND = "fts5"
+        else:
+            SEARCH_BACKEND = "like"
+    return SEARCH_BACKEND
+
+if SCHEMA_SETUP == "startup":
+    init_db()
+
+def save_analysis(idea, industry, region, results, formats=None, timings=None):
+    """
+    Stores the markdown report for a finished run and records it in the DB,
+    with the run's `timings` breakdown (RunTimings.to_dict()) if given.
+    PDF/PPTX/HTML are rendered in the export process pool: right away (without waiting)
+    for the requested `formats`, otherwise on their first download.
+    Needs an app context (request or `with app.app_context()`).
+    """
+    store = artifacts.get_store()
+    report_key = store.put(export.render_markdown(idea, results).encode("utf-8"))
+    # Sections as-is for the other formats (the markdown's own headings are ambiguous)
+    sections_key = store.put(json.dumps(results).encode("utf-8"))
+
+    # Save to Database
+    new_analysis = Analysis(
+        idea=idea,
+        industry=industry,
+        region=region,
+        report_key=report_key,
+        sections_key=sections_key,
+        timings=json.dumps(timings) if timings else None
+    )
+    db.session.add(new_analysis)
+    db.session.flush()
+    # Searchable copy of the report (the full-text index is updated in the same transaction)
+    db.session.add_all(ReportSection(analysis_id=new_analysis.id, stage=k, content=v) for k, v in results.items())
+    db.session.commit()
+    idea_index.add(new_analysis.id, idea, industry, region, new_analysis.timestamp)
+
+    for fmt in export.parse_formats(formats):
+        export.submit_stored(sections_key, idea, fmt)
+    return new_analysis
+
+def artifact_path(analysis, fmt):
+    if fmt == "pdf":
+        return analysis.pdf_path
+    if fmt == "pptx":
+        return analysis.ppt_path
+    return export.artifact_path(analysis.md_path, fmt)
+
+CONTENT_TYPES = {
+    "md": "text/markdown; charset=utf-8",
+    "pdf": "application/pdf",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "html": "text/html; charset=utf-8",
+}
+
+def load_artifact(analysis_id, fmt):
+    """
+    A report's markdown or PDF/PPTX/HTML for download, rendering it first if needed
+    (blocks until done): {'blob', 'encoding', 'key', 'content_type', 'filename', 'max_age'}.
+    Returns None for an unknown report/format or a failed render.
+    """
+    analysis = db.session.get(Analysis, analysis_id)
+    fmt = "md" if fmt == "md" else (export.parse_formats([fmt]) or [None])[0]
+    if analysis is None or fmt is None:
+        return None
+    if analysis.report_key:
+        if fmt == "md":
+            key = analysis.report_key
+        else:
+            key = export.ensure_stored(analysis.sections_key, analysis.idea, fmt)
+        found = artifacts.get_store().get(key) if key else None
+        if found is None:
+            return None
+        blob, encoding = found
+    else:
+        # Saved as files before the artifact store existed
+        path = analysis.md_path if fmt == "md" else export.ensure(analysis.md_path, analysis.idea, fmt,
+                                                                 artifact_path(analysis, fmt))
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            blob, encoding = f.read(), "identity"
+        key = artifacts.content_key(blob)
+    return {
+        "blob": blob,
+        "encoding": encoding,
+        "key": key,
+        "content_type": CONTENT_TYPES[fmt],
+        "filename": f"{re.sub(r'[^A-Za-z0-9]+', '_', analysis.idea).strip('_') or 'report'}_{analysis.id}.{fmt}",
+        "max_age": ARTIFACT_MAX_AGE if fmt == "md" else ARTIFACT_RENDER_MAX_AGE,
+    }
+
+def artifact_response_parts(artifact, request_headers):
+    """
+    (status, headers, body) for serving `artifact` (see load_artifact) to a request with these headers.
+    """
+    status, headers, body = artifacts.http_response(artifact["blob"], artifact["encoding"], artifact["key"],
+                                                    request_headers, artifact["max_age"])
+    headers["Content-Type"] = artifact["content_type"]
+    headers["Content-Disposition"] = f'attachment; filename="{artifact["filename"]}"'
+    return status, headers, body
+
+def encode_cursor(analysis):
+    raw = f"{analysis.timestamp.isoformat()}|{analysis.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
     try:
-        prs = Presentation()
-        title_slide = prs.slides.add_slide(prs.slide_layouts[0])
-        title_slide.shapes.title.text = "Business Strategy Report"
-        title_slide.placeholders[1].text = idea
-        
-        for section, content in data.items():
-            slide = prs.slides.add_slide(prs.slide_layouts[1])
-            slide.shapes.title.text = section
-            tf = slide.placeholders[1].text_frame
-            tf.text = content[:1000] + "..." if len(content) > 1000 else content
-            
-        prs.save(filename)
-        return filename
-    except: return None
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, analysis_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(analysis_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+def history_page(args):
+    """
+    One page of past analyses, newest first, for the query parameters in `args`:
+    limit, cursor (from the previous page's next_cursor), industry, region, since, until (ISO dates).
+    Keyset pagination on (timestamp, id), so a page costs the same however long the history is.
+    Returns (payload, etag); raises ValueError for bad parameters.
+    """
+    try:
+        limit = int(args.get('limit') or HISTORY_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("Invalid limit")
+    limit = max(1, min(limit, HISTORY_MAX_PAGE))
+
+    query = Analysis.query
+    if args.get('industry'):
+        query = query.filter(Analysis.industry == args['industry'])
+    if args.get('region'):
+        query = query.filter(Analysis.region == args['region'])
+    for key, op in (('since', '__ge__'), ('until', '__lt__')):
+        if args.get(key):
+            try:
+                bound = datetime.fromisoformat(args[key])
+            except ValueError:
+                raise ValueError(f"Invalid {key} date")
+            query = query.filter(getattr(Analysis.timestamp, op)(bound))
+    if args.get('cursor'):
+        timestamp, analysis_id = decode_cursor(args['cursor'])
+        query = query.filter(db.or_(Analysis.timestamp < timestamp,
+                                    db.and_(Analysis.timestamp == timestamp, Analysis.id < analysis_id)))
+
+    rows = query.order_by(Analysis.timestamp.desc(), Analysis.id.desc()).limit(limit + 1).all()
+    page = rows[:limit]
+    payload = {
+        "items": [r.to_dict() for r in page],
+        "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None,
+    }
+    # Reports are never edited, so the rows on the page identify its content
+    etag = hashlib.sha1(json.dumps([sorted(args.items()), [(r.id, r.timestamp.isoformat()) for r in rows]])
+                        .encode()).hexdigest()
+    return payload, etag
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+def _like_snippet(content, terms, width=80):
+    """
+    Snippet around the first matching term, for databases without a full-text index.
+    """
+    pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+    match = pattern.search(content)
+    start = max(0, match.start() - width) if match else 0
+    snippet = content[start:start + 2 * width]
+    snippet = pattern.sub(lambda m: MARK_START + m.group(0) + MARK_END, snippet)
+    return ("…" if start else "") + snippet + ("…" if start + 2 * width < len(content) else "")
+
+def search_reports(q, limit=20, industry=None, region=None):
+    """
+    Report sections matching the words of `q`, best first, each with its report's
+    details, the section name, an HTML snippet (matches in <mark>) and a score.
+    """
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return []
+    limit = max(1, min(limit, HISTORY_MAX_PAGE))
+    filters, params = "", {"limit": limit}
+    for column, value in (("industry", industry), ("region", region)):
+        if value:
+            filters += f" AND a.{column} = :{column}"
+            params[column] = value
+
+    backend = search_backend()
+    if backend == "fts5":
+        # Every word must appear; quoting keeps FTS5 operators in user input literal
+        params["match"] = " ".join('"' + t + '"' for t in terms)
+        rows = db.session.execute(db.text(
+            "SELECT s.analysis_id, s.stage, "
+            "snippet(report_section_fts, 0, char(2), char(3), '…', 16), -bm25(report_section_fts) AS score "
+            "FROM report_section_fts JOIN report_section s ON s.id = report_section_fts.rowid "
+            "JOIN analysis a ON a.id = s.analysis_id "
+            f"WHERE report_section_fts MATCH :match{filters} ORDER BY score DESC LIMIT :limit"), params).all()
+    elif backend == "postgres":
+        params["q"] = q
+        params["options"] = f"StartSel={MARK_START}, StopSel={MARK_END}, MaxFragments=2, MaxWords=24, MinWords=8"
+        rows = db.session.execute(db.text(
+            "SELECT s.analysis_id, s.stage, ts_headline('english', s.content, query, :options), "
+            "ts_rank(to_tsvector('english', s.content), query) AS score "
+            "FROM report_section s JOIN analysis a ON a.id = s.analysis_id, "
+            "websearch_to_tsquery('english', :q) query "
+            f"WHERE to_tsvector('english', s.content) @@ query{filters} ORDER BY score DESC LIMIT :limit"), params).all()
+    else:
+        query = ReportSection.query.join(Analysis, Analysis.id == ReportSection.analysis_id)
+        for t in terms:
+            query = query.filter(ReportSection.content.ilike(f"%{t}%"))
+        if industry:
+            query = query.filter(Analysis.industry == industry)
+        if region:
+            query = query.filter(Analysis.region == region)
+        rows = [(r.analysis_id, r.stage, _like_snippet(r.content, terms), len(terms))
+                for r in query.order_by(ReportSection.analysis_id.desc()).limit(limit)]
+
+    analyses = {a.id: a for a in Analysis.query.filter(Analysis.id.in_({r[0] for r in rows}))}
+    return [dict(analyses[analysis_id].to_dict(), section=stage, snippet=_highlight(snippet), score=round(score, 3))
+            for analysis_id, stage, snippet, score in rows]
+
+# Past ideas for near-duplicate detection; each process catches up with new rows on lookup
+idea_index = IdeaIndex()
+
+def analysis_sections(analysis_id):
+    """
+    A saved report's sections as {stage: content}.
+    """
+    rows = ReportSection.query.filter_by(analysis_id=analysis_id).order_by(ReportSection.id).all()
+    return {r.stage: r.content for r in rows}
+
+def analysis_timings(analysis_id):
+    """
+    The timing breakdown stored with an analysis ({} for runs saved without one), or None if unknown.
+    """
+    analysis = db.session.get(Analysis, analysis_id)
+    if analysis is None:
+        return None
+    return json.loads(analysis.timings) if analysis.timings else {}
+
+def find_similar(idea, industry, region):
+    """
+    Closest earlier analysis of a near-identical idea in the same industry and region,
+    at most IDEA_MATCH_MAX_AGE old, as (Analysis, similarity), or None.
+    """
+    new_rows = (db.session.query(Analysis.id, Analysis.idea, Analysis.industry, Analysis.region, Analysis.timestamp)
+                .filter(Analysis.id > idea_index.last_id).order_by(Analysis.id).all())
+    for row in new_rows:
+        idea_index.add(*row)
+    if new_rows:
+        # Only a full read of the table moves the watermark (save_analysis indexes its own rows)
+        idea_index.advance(new_rows[-1].id)
+    since = datetime.utcnow() - timedelta(seconds=IDEA_MATCH_MAX_AGE) if IDEA_MATCH_MAX_AGE else None
+    hit = idea_index.match(idea, industry, region, since=since)
+    if hit is None:
+        return None
+    return db.session.get(Analysis, hit[0]), hit[1]
+
+def reuse_plan(idea, industry, region, mode=None):
+    """
+    What a new analysis can take from a near-duplicate earlier one (IDEA_MATCH, or `mode`):
+    {'mode': 'seed' or 'serve', 'analysis': {...}, 'similarity', 'sections': {...}}, or None.
+    """
+    mode = mode if mode in IDEA_MATCH_MODES else IDEA_MATCH
+    if mode == "off":
+        return None
+    hit = find_similar(idea, industry, region)
+    if hit is None:
+        return None
+    analysis, similarity = hit
+    sections = analysis_sections(analysis.id)
+    if not sections:
+        return None
+    print(f"🔁 '{idea}' matches analysis #{analysis.id} '{analysis.idea}' (similarity {similarity}): {mode}")
+    return {"mode": mode, "analysis": analysis.to_dict(), "similarity": similarity, "sections": sections}
+
+def plan_match(plan):
+    """
+    The earlier analysis a reuse plan draws on, as reported to clients.
+    """
+    return {"analysis_id": plan["analysis"]["id"], "idea": plan["analysis"]["idea"],
+            "similarity": plan["similarity"]}
+
+def complete_event(files, match=None, seeded=()):
+    """
+    The stream's last event. When stages were seeded from a near-duplicate analysis
+    (`match`, see plan_match), it names them under 'seeded' so the reuse is never silent.
+    """
+    event = {'step': 8, 'name': 'Complete', 'status': 'complete', 'files': files}
+    if match and seeded:
+        event['seeded'] = dict(match, stages=list(seeded))
+    return event
+
+def seeded_stages(event, seeded):
+    """
+    Adds the stage of a pipeline event to `seeded` if it was restored from a seed; returns the event.
+    """
+    if event.get('restored') == 'seed':
+        seeded.append(event['name'])
+    return event
+
+def served_events(plan):
+    """
+    Stream for a request answered with an earlier report: every stage 'done' with its
+    content, then 'complete' with the earlier report's files.
+    """
+    match = plan_match(plan)
+    from utils.pipeline import STAGES
+    events = [dict({'step': 0, 'name': 'Similar Analysis', 'status': 'reused'}, **match)]
+    for stage in sorted(STAGES, key=lambda s: s.step):
+        events.append({'step': stage.step, 'name': stage.name, 'status': 'done',
+                       'content': plan["sections"].get(stage.name, ""), 'restored': 'serve'})
+    events.append({'step': 8, 'name': 'Complete', 'status': 'complete', 'files': plan["analysis"]["files"],
+                   'reused': match})
+    return events
+
+def input_error(idea, industry, region):
+    """
+    Message explaining why an analysis can't start, or None.
+    """
+    if not idea or not industry or not region:
+        return 'Error: Missing fields'
+    from utils.llm import GROQ_API_KEY, GEMINI_API_KEY
+    if not GROQ_API_KEY and not GEMINI_API_KEY:
+        return 'Error: Server Missing API Keys. Please configure Vercel Envs.'
+    return None
+
+def workers_available():
+    """
+    Whether any worker process has sent a heartbeat recently enough to pick up a job.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    return JobWorker.query.filter(JobWorker.heartbeat >= cutoff).first() is not None
+
+def submit_job(idea, industry, region, formats=None, reuse=None):
+    """
+    Queues an analysis. A near-duplicate of an earlier one (see reuse_plan) is either
+    finished on the spot with the earlier report ('serve') or queued to reuse its research ('seed').
+    """
+    job = Job(idea=idea, industry=industry, region=region, formats=",".join(export.parse_formats(formats)))
+    plan = reuse_plan(idea, industry, region, reuse)
+    if plan and plan["mode"] == "serve":
+        now = datetime.utcnow()
+        job.status, job.analysis_id, job.started_at, job.finished_at = "done", plan["analysis"]["id"], now, now
+        db.session.add(job)
+        db.session.flush()
+        db.session.add_all(JobEvent(job_id=job.id, data=json.dumps(e)) for e in served_events(plan))
+    elif plan:
+        job.seed_from = plan["analysis"]["id"]
+        db.session.add(job)
+    else:
+        db.session.add(job)
+    db.session.commit()
+    return job
+
+def get_job(job_id):
+    return db.session.get(Job, job_id)
+
+def job_details(job_id):
+    """
+    Job as a dict including its per-stage checkpoints (without their content), or None.
+    """
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return None
+    stages = StageCheckpoint.query.filter_by(job_id=job_id).order_by(StageCheckpoint.started_at).all()
+    return dict(job.to_dict(), stages=[s.to_dict() for s in stages])
+
+def resume_job(job_id):
+    """
+    Puts a failed job back in the queue. Its worker restores every
+    checkpointed stage and only re-runs the missing or failed ones.
+    Returns the job, or None when it is unknown or not failed. A finished job
+    already has its analysis; re-running it would store a duplicate.
+    """
+    job = db.session.get(Job, job_id)
+    if job is None or job.status != 'failed':
+        return None
+    job.status, job.attempts, job.error, job.worker, job.finished_at = 'queued', 0, None, None, None
+    # Subscribers replaying the stream drop what the previous run showed
+    db.session.add(JobEvent(job_id=job_id, data=json.dumps({'step': 0, 'name': 'Job', 'status': 'restarted'})))
+    db.session.commit()
+    return job
+
+class JobCheckpoint:
+    """
+    Checkpoint store for one job, in the form run_pipeline(checkpoint=...) expects.
+    Safe to call from any thread: each call uses its own app context.
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def load(self):
+        with app.app_context():
+            rows = StageCheckpoint.query.filter_by(job_id=self.job_id, status='done').all()
+            return {r.stage: {"content": r.content, "input_hash": r.input_hash} for r in rows}
+
+    def save(self, stage, input_hash, content, provider, started, finished, error=None):
+        with app.app_context():
+            row = StageCheckpoint.query.filter_by(job_id=self.job_id, stage=stage).first()
+            if row is None:
+                row = StageCheckpoint(job_id=self.job_id, stage=stage)
+                db.session.add(row)
+            row.status = 'failed' if error else 'done'
+            row.input_hash = input_hash
+            row.provider = provider
+            row.content = content
+            row.error = error
+            row.started_at = datetime.utcfromtimestamp(started)
+            row.finished_at = datetime.utcfromtimestamp(finished)
+            row.duration = finished - started
+            db.session.commit()
+
+def job_events_after(job_id, last_id):
+    """
+    Returns (job status, [(event id, json data)]) for events newer than `last_id`.
+    The status is read first, so a finished status means the list is complete.
+    """
+    job = db.session.get(Job, job_id)
+    status = job.status if job else None
+    rows = (JobEvent.query.with_entities(JobEvent.id, JobEvent.data)
+            .filter(JobEvent.job_id == job_id, JobEvent.id > last_id)
+            .order_by(JobEvent.id).all())
+    # End the read transaction so the next poll sees the workers' new commits
+    db.session.rollback()
+    return status, [tuple(r) for r in rows]
+
+def last_event_id(headers, args):
+    # EventSource sends Last-Event-ID on reconnect; ?last_event_id= lets a reloaded page resume
+    value = headers.get('Last-Event-ID') or args.get('last_event_id') or 0
+    try:
+        return int(value)
+    except ValueError:
+        return 0
 
 @app.route('/')
 def home():
@@ -104,14 +702,47 @@ def home():
 
 @app.route('/api/history')
 def get_history():
-    reports = Analysis.query.order_by(Analysis.timestamp.desc()).all()
-    return jsonify([r.to_dict() for r in reports])
+    try:
+        payload, etag = history_page(request.args.to_dict())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # Browsers revalidate every time and get a 304 while nothing changed
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/search')
+def search():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Missing q'}), 400
+    limit = request.args.get('limit', type=int) or HISTORY_PAGE_SIZE
+    hits = search_reports(q, limit, request.args.get('industry'), request.args.get('region'))
+    return jsonify({'query': q, 'hits': hits})
+
+@app.route('/api/reports/<int:analysis_id>/timings')
+def report_timings(analysis_id):
+    timings = analysis_timings(analysis_id)
+    if timings is None:
+        abort(404)
+    return jsonify(timings)
+
+@app.route('/api/reports/<int:analysis_id>/<fmt>')
+def download_report(analysis_id, fmt):
+    artifact = load_artifact(analysis_id, fmt)
+    if artifact is None:
+        abort(404)
+    status, headers, body = artifact_response_parts(artifact, request.headers)
+    return Response(body, status=status, headers=headers)
 
 @app.route('/stream_analysis')
 def stream_analysis():
     idea = request.args.get('idea')
     industry = request.args.get('industry')
     region = request.args.get('region')
+    formats = request.args.get('formats')
+    reuse = request.args.get('reuse')
     
     # Validation
     if not idea or not industry or not region:
@@ -122,93 +753,116 @@ def stream_analysis():
     if not GROQ_API_KEY and not GEMINI_API_KEY:
          return Response("data: " + json.dumps({'name': 'Error', 'status': 'Error: Server Missing API Keys. Please configure Vercel Envs.'}) + "\n\n", mimetype='text/event-stream')
 
+    from utils.pipeline import run_pipeline
+
     def generate():
         try:
-            results = {}
-            
-            # 1. Market Research
-            yield f"data: {json.dumps({'step': 1, 'name': 'Market Research', 'status': 'running'})}\n\n"
-            market_res = market_research.run(idea, industry, region)
-            results['Market Research'] = market_res
-            yield f"data: {json.dumps({'step': 1, 'name': 'Market Research', 'status': 'done', 'content': market_res})}\n\n"
-            
-            # 2. Competitor
-            yield f"data: {json.dumps({'step': 2, 'name': 'Competitor Analysis', 'status': 'running'})}\n\n"
-            comp_res = competitor_analysis.run(idea, industry)
-            results['Competitor Analysis'] = comp_res
-            yield f"data: {json.dumps({'step': 2, 'name': 'Competitor Analysis', 'status': 'done', 'content': comp_res})}\n\n"
-
-            # 3. Customer
-            yield f"data: {json.dumps({'step': 3, 'name': 'Customer Insights', 'status': 'running'})}\n\n"
-            cust_res = customer_insight.run(idea, industry)
-            results['Customer Insights'] = cust_res
-            yield f"data: {json.dumps({'step': 3, 'name': 'Customer Insights', 'status': 'done', 'content': cust_res})}\n\n"
-
-            # 4. SWOT
-            yield f"data: {json.dumps({'step': 4, 'name': 'SWOT Analysis', 'status': 'running'})}\n\n"
-            swot_res = swot_analysis.run(idea, market_res, comp_res, cust_res)
-            results['SWOT Analysis'] = swot_res
-            yield f"data: {json.dumps({'step': 4, 'name': 'SWOT Analysis', 'status': 'done', 'content': swot_res})}\n\n"
-
-            # 5. Financial
-            yield f"data: {json.dumps({'step': 5, 'name': 'Financial Estimation', 'status': 'running'})}\n\n"
-            fin_res = financial_estimation.run(idea, industry, region)
-            results['Financial Estimation'] = fin_res
-            yield f"data: {json.dumps({'step': 5, 'name': 'Financial Estimation', 'status': 'done', 'content': fin_res})}\n\n"
-
-            # 6. Risk
-            yield f"data: {json.dumps({'step': 6, 'name': 'Risk Assessment', 'status': 'running'})}\n\n"
-            risk_res = risk_feasibility.run(idea, industry, region)
-            results['Risk Assessment'] = risk_res
-            yield f"data: {json.dumps({'step': 6, 'name': 'Risk Assessment', 'status': 'done', 'content': risk_res})}\n\n"
-
-            # 7. Final Strategy
-            yield f"data: {json.dumps({'step': 7, 'name': 'Final Strategy', 'status': 'running'})}\n\n"
-            final_res = final_strategy.run(idea, market_res, comp_res, cust_res, swot_res, fin_res, risk_res)
-            results['Final Strategy'] = final_res
-            yield f"data: {json.dumps({'step': 7, 'name': 'Final Strategy', 'status': 'done', 'content': final_res})}\n\n"
+            plan = reuse_plan(idea, industry, region, reuse)
+            if plan and plan["mode"] == "serve":
+                for event in served_events(plan):
+                    yield f"data: {json.dumps(event)}\n\n"
+                return
+            seed = plan["sections"] if plan else None
+            results, seeded = {}, []
+            timings = metrics.RunTimings()
+
+            # Independent agents run concurrently; SWOT & Final Strategy wait on their inputs
+            for event in run_pipeline(idea, industry, region, results=results, stream=True, seed=seed,
+                                      timings=timings):
+                yield f"data: {json.dumps(seeded_stages(event, seeded))}\n\n"
 
             # Generate Files & Save to DB
             yield f"data: {json.dumps({'step': 8, 'name': 'Generating Files', 'status': 'running'})}\n\n"
             
-            # Create a dedicated directory for reports if needed, but static/reports is fine
-            report_dir = "static/reports"
-            if not os.path.exists(report_dir):
-                os.makedirs(report_dir)
-
-            timestamp = int(time.time())
-            base_name = f"{idea.replace(' ', '_')}_{timestamp}"
-            
-            md_path = f"{report_dir}/{base_name}.md"
-            pdf_path = f"{report_dir}/{base_name}.pdf"
-            ppt_path = f"{report_dir}/{base_name}.pptx"
-            
-            full_text = f"# Business Strategy: {idea}\n\n" + "\n\n".join([f"## {k}\n{v}" for k,v in results.items()])
-            
-            with open(md_path, "w") as f: f.write(full_text)
-            create_pdf(pdf_path, full_text)
-            create_ppt(ppt_path, idea, results)
-            
-            # Save to Database
-            new_analysis = Analysis(
-                idea=idea,
-                industry=industry,
-                region=region,
-                md_path=md_path,
-                pdf_path=pdf_path,
-                ppt_path=ppt_path
-            )
-            db.session.add(new_analysis)
-            db.session.commit()
-            
+            analysis = save_analysis(idea, industry, region, results, formats, timings.to_dict())
+            complete = complete_event(analysis.to_dict()['files'], plan and plan_match(plan), seeded)
+            yield f"data: {json.dumps(complete)}\n\n"
 
         except Exception as e:
             yield f"data: {json.dumps({'step': 0, 'name': 'Error', 'status': f'Critical Error: {str(e)}'})}\n\n"
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus scrape target: this process's stage, LLM and search metrics
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# --- Job API: analyses run on worker.py processes, browsers subscribe per job ---
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    params = request.get_json(silent=True) or request.form
+    idea = params.get('idea')
+    industry = params.get('industry')
+    region = params.get('region')
+
+    error = input_error(idea, industry, region)
+    if error:
+        return jsonify({'error': error}), 400
+    if not workers_available():
+        # Nothing would ever claim the job (serverless or gunicorn without worker.py)
+        return jsonify({'error': 'No job workers are running', 'fallback': '/stream_analysis'}), 503
+
+    job = submit_job(idea, industry, region, params.get('formats'), params.get('reuse'))
+    return jsonify(dict(job.to_dict(), events=f"/api/jobs/{job.id}/events")), 202
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_details(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def job_resume(job_id):
+    job = resume_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job is unknown or has not failed'}), 409
+    return jsonify(dict(job.to_dict(), events=f"/api/jobs/{job.id}/events")), 202
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    if get_job(job_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    last_id = last_event_id(request.headers, request.args)
+    status, events = job_events_after(job_id, last_id)
+    if status in ('done', 'failed') and not events:
+        # Nothing left to send: 204 tells EventSource to stop reconnecting
+        return Response(status=204)
+
+    def generate():
+        nonlocal last_id
+        yield "retry: 2000\n\n"
+        idle = 0.0
+        while True:
+            status, events = job_events_after(job_id, last_id)
+            for event_id, data in events:
+                last_id = event_id
+                yield f"id: {event_id}\ndata: {data}\n\n"
+            if status in ('done', 'failed', None):
+                return
+            if events:
+                idle = 0.0
+            else:
+                idle += JOB_POLL_INTERVAL
+                if idle >= 15:
+                    # Comment line keeps proxies from closing a quiet stream
+                    yield ": keep-alive\n\n"
+                    idle = 0.0
+            time.sleep(JOB_POLL_INTERVAL)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
 if __name__ == '__main__':
+    if "--init-db" in sys.argv:
+        init_db()
+        print("✅ Database schema and search index are up to date")
+        sys.exit(0)
     # Ensure static exists for reports
     if not os.path.exists('static'):
         os.makedirs('static')
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if JOB_INPROCESS_WORKERS and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from worker import start_workers
+        start_workers(JOB_INPROCESS_WORKERS)
     app.run(debug=True, port=3000)
@@ -24,19 +24,62 @@ function openTab(evt, tabName) {
 }
 
 // Load history on startup
-document.addEventListener('DOMContentLoaded', loadHistory);
+document.addEventListener('DOMContentLoaded', () => {
+    loadHistory();
+    resumeActiveJob();
 
-function loadHistory() {
-    fetch('/api/history')
+    // Full-text search over past reports; an empty box shows the plain history again
+    let searchTimer = null;
+    document.getElementById('historySearch').addEventListener('input', event => {
+        clearTimeout(searchTimer);
+        const q = event.target.value.trim();
+        searchTimer = setTimeout(() => q ? searchHistory(q) : loadHistory(), 250);
+    });
+});
+
+function searchHistory(q) {
+    fetch(`/api/search?q=${encodeURIComponent(q)}`)
         .then(response => response.json())
         .then(data => {
             const list = document.getElementById('historyList');
             list.innerHTML = '';
-            if (data.length === 0) {
+            if (!data.hits || data.hits.length === 0) {
+                list.innerHTML = '<div class="placeholder-text">No matching reports.</div>';
+                return;
+            }
+            data.hits.forEach(hit => {
+                const item = document.createElement('div');
+                item.className = 'history-item';
+                // The snippet comes HTML-escaped from the server, with matches in <mark>
+                item.innerHTML = `
+                    <div class="history-info">
+                        <strong>${hit.idea}</strong>
+                        <span>${hit.section} · ${hit.date}</span>
+                        <span>${hit.snippet}</span>
+                    </div>
+                    <i class="fas fa-chevron-right"></i>
+                `;
+                item.onclick = () => loadPastReport(hit);
+                list.appendChild(item);
+            });
+        });
+}
+
+function loadHistory(cursor) {
+    // One page at a time (newest first); "Load more" fetches the next page by cursor
+    const url = cursor ? `/api/history?cursor=${encodeURIComponent(cursor)}` : '/api/history';
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            const list = document.getElementById('historyList');
+            const more = document.getElementById('historyMore');
+            if (more) more.remove();
+            if (!cursor) list.innerHTML = '';
+            if (!cursor && data.items.length === 0) {
                 list.innerHTML = '<div class="placeholder-text">No reports yet.</div>';
                 return;
             }
-            data.forEach(report => {
+            data.items.forEach(report => {
                 const item = document.createElement('div');
                 item.className = 'history-item';
                 item.innerHTML = `
@@ -49,6 +92,14 @@ function loadHistory() {
                 item.onclick = () => loadPastReport(report);
                 list.appendChild(item);
             });
+            if (data.next_cursor) {
+                const button = document.createElement('div');
+                button.id = 'historyMore';
+                button.className = 'history-item';
+                button.innerHTML = '<div class="history-info"><span>Load more</span></div>';
+                button.onclick = () => loadHistory(data.next_cursor);
+                list.appendChild(button);
+            }
         });
 }
 
@@ -65,6 +116,7 @@ function loadPastReport(report) {
     document.getElementById("dl-md").href = `/${report.files.md}`;
     document.getElementById("dl-pdf").href = `/${report.files.pdf}`;
     document.getElementById("dl-ppt").href = `/${report.files.ppt}`;
+    document.getElementById("dl-html").href = `/${report.files.html}`;
 
     // 3. Fetch MD and parse into tabs
     fetch(`/${report.files.md}`)
@@ -127,6 +179,17 @@ function parseMarkdownToTabs(md) {
     openTab(null, 'Market');
 }
 
+function tabForStep(name) {
+    if (name.includes("Market")) return "Market";
+    if (name.includes("Competitor")) return "Competitor";
+    if (name.includes("Customer")) return "Customer";
+    if (name.includes("SWOT")) return "SWOT";
+    if (name.includes("Financial")) return "Financial";
+    if (name.includes("Risk")) return "Risk";
+    if (name.includes("Strategy")) return "Strategy";
+    return "";
+}
+
 function startAnalysis() {
     const idea = document.getElementById("idea").value;
     const industry = document.getElementById("industry").value;
@@ -153,40 +216,123 @@ function startAnalysis() {
             </div>`;
     }
 
-    const evtSource = new EventSource(`/stream_analysis?idea=${encodeURIComponent(idea)}&industry=${encodeURIComponent(industry)}&region=${encodeURIComponent(region)}`);
+    fetch('/api/jobs', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ idea, industry, region })
+    })
+        .then(r => r.json().then(body => ({ ok: r.ok, body })))
+        .then(({ ok, body }) => {
+            if (!ok && body.fallback) {
+                // No job workers behind this deployment: run the analysis inside the request
+                const params = new URLSearchParams({ idea, industry, region });
+                subscribe(`${body.fallback}?${params}`, null);
+                return;
+            }
+            if (!ok) {
+                document.getElementById("statusText").innerText = body.error;
+                document.getElementById("runBtn").disabled = false;
+                return;
+            }
+            // Remember the job so a reloaded page can pick the stream back up
+            localStorage.setItem('activeJob', body.id);
+            subscribe(`/api/jobs/${body.id}/events`, body.id);
+        })
+        .catch(() => {
+            document.getElementById("statusText").innerText = "Could not start the analysis.";
+            document.getElementById("runBtn").disabled = false;
+        });
+}
+
+function resumeActiveJob() {
+    const jobId = localStorage.getItem('activeJob');
+    if (!jobId) return;
+    document.getElementById("runBtn").disabled = true;
+    // A fresh page has nothing rendered, so replay the job's events from the start
+    subscribe(`/api/jobs/${jobId}/events`, jobId);
+}
+
+function subscribe(url, jobId) {
+    // Stages finish out of order (independent agents run in parallel), so track completions
+    const finishedSteps = new Set();
+
+    // A job runs on a worker; if this connection drops, EventSource reconnects with
+    // Last-Event-ID and the server replays whatever was missed. Without a job (jobId
+    // null) the analysis runs inside this request and can't be resumed.
+    const evtSource = new EventSource(url);
+
+    // Streamed text per tab; rendering is batched to one markdown parse per animation frame
+    const streamed = {};
+    const dirtyTabs = new Set();
+    let renderScheduled = false;
+
+    function scheduleRender(tabId) {
+        dirtyTabs.add(tabId);
+        if (renderScheduled) return;
+        renderScheduled = true;
+        requestAnimationFrame(() => {
+            renderScheduled = false;
+            for (let id of dirtyTabs) {
+                document.getElementById(id).innerHTML = marked.parse(streamed[id]);
+            }
+            dirtyTabs.clear();
+        });
+    }
+
+    function finish() {
+        evtSource.close();
+        if (jobId) localStorage.removeItem('activeJob');
+        document.getElementById("runBtn").disabled = false;
+    }
 
     evtSource.onmessage = function (event) {
         const data = JSON.parse(event.data);
+        const tabId = tabForStep(data.name);
+
+        if (data.status === 'delta') {
+            if (tabId) {
+                streamed[tabId] = (streamed[tabId] || "") + data.delta;
+                scheduleRender(tabId);
+            }
+            return;
+        }
+        if (data.status === 'reset' || (data.status === 'running' && tabId)) {
+            // Provider failover (or a retried job) restarted this answer
+            if (tabId) streamed[tabId] = "";
+            if (data.status === 'reset') return;
+        }
+        if (data.status === 'restarted') {
+            // The worker running this job died; another one started it over
+            finishedSteps.clear();
+            for (let id of Object.keys(streamed)) streamed[id] = "";
+        }
 
         document.getElementById("statusText").innerText = `${data.name} (${data.status})`;
-        const progress = (data.step / 8) * 100;
+        if (data.status === 'done' && data.step > 0) finishedSteps.add(data.step);
+        const progress = (finishedSteps.size / 8) * 100;
         document.getElementById("progressFill").style.width = `${progress}%`;
 
-        if (data.status === 'done' && data.content) {
-            let tabId = "";
-            if (data.name.includes("Market")) tabId = "Market";
-            else if (data.name.includes("Competitor")) tabId = "Competitor";
-            else if (data.name.includes("Customer")) tabId = "Customer";
-            else if (data.name.includes("SWOT")) tabId = "SWOT";
-            else if (data.name.includes("Financial")) tabId = "Financial";
-            else if (data.name.includes("Risk")) tabId = "Risk";
-            else if (data.name.includes("Strategy")) tabId = "Strategy";
-
-            if (tabId) {
-                document.getElementById(tabId).innerHTML = marked.parse(data.content);
-                // Auto switch to this tab? No, might be annoying. Maybe just unlock it.
-            }
+        if (data.status === 'done' && data.content && tabId) {
+            // Final assembled text replaces the streamed preview
+            streamed[tabId] = data.content;
+            dirtyTabs.delete(tabId);
+            document.getElementById(tabId).innerHTML = marked.parse(data.content);
         }
 
         if (data.status === 'complete') {
-            evtSource.close();
-            document.getElementById("runBtn").disabled = false;
-            document.getElementById("statusText").innerText = "Completed!";
+            finish();
+            document.getElementById("statusText").innerText = data.reused
+                ? `Completed (earlier report for "${data.reused.idea}")`
+                : data.seeded
+                    ? `Completed (${data.seeded.stages.join(", ")} reused from "${data.seeded.idea}")`
+                    : "Completed!";
+            document.getElementById("progressFill").style.width = "100%";
 
             document.getElementById("downloads").classList.remove("hidden");
             document.getElementById("dl-md").href = `/${data.files.md}`;
             document.getElementById("dl-pdf").href = `/${data.files.pdf}`;
             document.getElementById("dl-ppt").href = `/${data.files.ppt}`;
+            document.getElementById("dl-html").href = `/${data.files.html}`;
 
             // Reload history to show the new item
             loadHistory();
@@ -194,8 +340,12 @@ function startAnalysis() {
     };
 
     evtSource.onerror = function () {
-        console.error("EventSource failed.");
-        evtSource.close();
-        document.getElementById("runBtn").disabled = false;
+        // CONNECTING means the browser is already retrying; the server ends a finished
+        // job's stream with a 204, which closes it for good. A direct stream is never
+        // retried: reconnecting would start the analysis over
+        if (!jobId || evtSource.readyState === EventSource.CLOSED) {
+            console.error("EventSource failed.");
+            finish();
+        }
     };
 }
@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+# server.py reads its configuration on import: point it at a throwaway database and
+# artifact store, with no in-process job workers and the offline LLM stand-ins
+_workdir = tempfile.mkdtemp(prefix="tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_workdir, 'reports.db')}",
+    "ARTIFACT_DIR": os.path.join(_workdir, "artifacts"),
+    "SEARCH_CACHE_PATH": os.path.join(_workdir, "search.db"),
+    "STAGE_MEMO_PATH": os.path.join(_workdir, "stages.db"),
+    "SCHEMA_SETUP": "startup",
+    "JOB_INPROCESS_WORKERS": "0",
+    "LLM_BACKEND": "offline",
+    "WEB_SEARCH_BACKEND": "offline",
+})
@@ -0,0 +1,17 @@
+from server import app, db, Job, submit_job, resume_job
+
+
+def test_only_failed_jobs_resume():
+    with app.app_context():
+        job = submit_job("Meal kits for campers", "Jobs", "Global")
+        assert resume_job(job.id) is None  # still queued
+
+        job.status = "done"
+        db.session.commit()
+        assert resume_job(job.id) is None  # its analysis exists already
+
+        job.status, job.error = "failed", "LLM timeout"
+        db.session.commit()
+        resumed = resume_job(job.id)
+        assert resumed is not None and resumed.status == "queued" and resumed.error is None
+        assert db.session.get(Job, job.id).status == "queued"
@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils.pipeline import Stage, run_pipeline, arun_pipeline
+
+
+class StageFailure(ValueError):
+    pass
+
+
+def _agent(fail=False):
+    def run(*args, **kwargs):
+        if fail:
+            raise StageFailure("market data unavailable")
+        return "report"
+
+    async def arun(*args, **kwargs):
+        return run(*args, **kwargs)
+
+    return SimpleNamespace(run=run, arun=arun, get_queries=lambda *args: [])
+
+
+def _stages():
+    # A failing root stage with dependents, like Market Research under SWOT and Final Strategy
+    return [
+        Stage(1, "Market Research", _agent(fail=True), ("idea",)),
+        Stage(2, "Competitor Analysis", _agent(), ("idea",)),
+        Stage(3, "SWOT Analysis", _agent(), ("idea",), deps=["Market Research", "Competitor Analysis"]),
+        Stage(4, "Final Strategy", _agent(), ("idea",), deps=["SWOT Analysis"]),
+    ]
+
+
+def test_run_pipeline_reraises_stage_error():
+    with pytest.raises(StageFailure, match="market data unavailable"):
+        for _ in run_pipeline("idea", "industry", "region", stages=_stages(), use_memo=False):
+            pass
+
+
+def test_arun_pipeline_reraises_stage_error():
+    async def consume():
+        events = []
+        async for event in arun_pipeline("idea", "industry", "region", stages=_stages(), use_memo=False):
+            events.append(event)
+        return events
+
+    with pytest.raises(StageFailure, match="market data unavailable"):
+        asyncio.run(consume())
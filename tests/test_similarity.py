@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import server
+from server import app, db, Analysis, save_analysis, find_similar
+
+
+def _store_from_other_process(idea, industry, region, timestamp=None):
+    # A worker in another process: the row lands in the table without touching this process's index
+    row = Analysis(idea=idea, industry=industry, region=region, timestamp=timestamp or datetime.utcnow())
+    db.session.add(row)
+    db.session.commit()
+    return row.id
+
+
+def test_interleaved_writers_are_all_indexed():
+    with app.app_context():
+        find_similar("warm-up", "Writers", "Global")  # index caught up with the table
+        other_id = _store_from_other_process("AI tutoring app for kids", "Writers", "Global")
+        local = save_analysis("Solar panel cleaning robots", "Writers", "Global", {"Market Research": "..."})
+        assert local.id > other_id
+
+        hit = find_similar("AI tutoring app for kids", "Writers", "Global")
+        assert hit is not None and hit[0].id == other_id
+        hit = find_similar("Solar panel cleaning robots", "Writers", "Global")
+        assert hit is not None and hit[0].id == local.id
+        assert server.idea_index.last_id >= local.id
+
+
+def test_stale_analyses_are_not_reused():
+    with app.app_context():
+        old = datetime.utcnow() - timedelta(seconds=server.IDEA_MATCH_MAX_AGE + 60)
+        _store_from_other_process("Drone delivery for pharmacies", "Ageing", "Global", old)
+        assert find_similar("Drone delivery for pharmacies", "Ageing", "Global") is None
+
+
+def test_complete_event_names_seeded_stages():
+    match = {"analysis_id": 7, "idea": "AI tutoring app", "similarity": 0.9}
+    assert "seeded" not in server.complete_event({}, match, [])
+    event = server.complete_event({}, match, ["Market Research"])
+    assert event["seeded"] == dict(match, stages=["Market Research"])
@@ -0,0 +1,215 @@
+import os
+import gzip
+import hashlib
+import importlib
+import threading
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+# Report artifacts (markdown, section data, rendered PDF/PPTX/HTML) live in a
+# content-addressed store: a blob's key is the SHA-256 of its content, so an identical
+# artifact is only stored once. Text is stored compressed and served as-is to clients
+# that accept the encoding.
+#   ARTIFACT_STORE=local (default, files under ARTIFACT_DIR) or "package.module:Class"
+ARTIFACT_STORE = os.getenv("ARTIFACT_STORE", "local")
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+# gzip or zstd (needs the zstandard package; falls back to gzip)
+ARTIFACT_COMPRESSION = os.getenv("ARTIFACT_COMPRESSION", "gzip")
+
+_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", "identity": ""}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0: the same content always compresses to the same bytes
+        return gzip.compress(data, mtime=0)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def decompress(data, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def default_encoding():
+    if ARTIFACT_COMPRESSION == "zstd" and zstandard is None:
+        print("⚠️ ARTIFACT_COMPRESSION=zstd but zstandard isn't installed; using gzip")
+        return "gzip"
+    return ARTIFACT_COMPRESSION if ARTIFACT_COMPRESSION in _EXTENSIONS else "gzip"
+
+
+class ArtifactStore:
+    """
+    Interface for artifact backends. A backend stores opaque blobs under a key along
+    with their content-encoding; implement _write() and get() (and optionally exists()).
+    Keys are content hashes unless the caller supplies its own (see put()).
+    """
+    def _write(self, key, blob, encoding):
+        raise NotImplementedError
+
+    def get(self, key):
+        """
+        Returns (blob, encoding) as stored, or None if the key is unknown.
+        """
+        raise NotImplementedError
+
+    def exists(self, key):
+        return self.get(key) is not None
+
+    def put(self, data, key=None, compress_data=True):
+        """
+        Stores `data` (bytes) unless its key is already present. Returns the key.
+        Already-compressed formats (PDF, PPTX) should pass compress_data=False.
+        """
+        key = key or content_key(data)
+        if not self.exists(key):
+            encoding = default_encoding() if compress_data else "identity"
+            self._write(key, compress(data, encoding), encoding)
+        return key
+
+    def read(self, key):
+        """
+        The original (decompressed) bytes of `key`, or None.
+        """
+        found = self.get(key)
+        return decompress(*found) if found else None
+
+
+class LocalArtifactStore(ArtifactStore):
+    """
+    Blobs as files under `root`, fanned out by the first two characters of the key;
+    the extension records the encoding (.gz, .zst or none).
+    """
+    def __init__(self, root=None):
+        self.root = root or ARTIFACT_DIR
+
+    def _path(self, key, encoding):
+        return os.path.join(self.root, key[:2], key + _EXTENSIONS[encoding])
+
+    def _find(self, key):
+        for encoding in _EXTENSIONS:
+            path = self._path(key, encoding)
+            if os.path.exists(path):
+                return path, encoding
+        return None
+
+    def _write(self, key, blob, encoding):
+        path = self._path(key, encoding)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Temp file + rename: concurrent writers of the same key never expose a partial blob
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+    def exists(self, key):
+        return self._find(key) is not None
+
+    def get(self, key):
+        found = self._find(key)
+        if found is None:
+            return None
+        with open(found[0], "rb") as f:
+            return f.read(), found[1]
+
+
+BACKENDS = {"local": LocalArtifactStore}
+
+
+def get_store():
+    """
+    The configured store (one per process). Other backends are named as "package.module:Class".
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if ARTIFACT_STORE in BACKENDS:
+                _store = BACKENDS[ARTIFACT_STORE]()
+            else:
+                module, _, name = ARTIFACT_STORE.partition(":")
+                _store = getattr(importlib.import_module(module), name)()
+        return _store
+
+
+def _accepts(accept_encoding, encoding):
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _parse_range(value, size):
+    """
+    (start, end) of a single "bytes=" range, "unsatisfiable", or None to ignore the header
+    (malformed or multiple ranges; the full body is sent instead).
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def http_response(blob, encoding, key, request_headers, max_age):
+    """
+    Status, headers and body for serving a stored blob, independent of the web framework:
+    the blob goes out still compressed when the client accepts its encoding, with a
+    strong ETag per representation, If-None-Match (304), single byte ranges (206/416,
+    honouring If-Range) and `max_age` caching. `request_headers` is case-insensitive.
+    """
+    headers = {"Cache-Control": f"public, max-age={max_age}" + (", immutable" if max_age >= 31536000 else ""),
+               "Accept-Ranges": "bytes", "Vary": "Accept-Encoding"}
+    if encoding != "identity" and _accepts(request_headers.get("Accept-Encoding"), encoding):
+        headers["Content-Encoding"] = encoding
+        etag = f'"{key}-{encoding}"'
+    else:
+        blob = decompress(blob, encoding)
+        etag = f'"{key}"'
+    headers["ETag"] = etag
+
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return 304, headers, b""
+
+    range_header = request_headers.get("Range")
+    if_range = request_headers.get("If-Range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        span = _parse_range(range_header, len(blob))
+        if span == "unsatisfiable":
+            headers["Content-Range"] = f"bytes */{len(blob)}"
+            return 416, headers, b""
+        if span is not None:
+            start, end = span
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(blob)}"
+            return 206, headers, blob[start:end + 1]
+    return 200, headers, blob
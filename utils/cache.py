@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class DiskCache:
+    """
+    Small persistent key/value store on SQLite.
+    Values are JSON-serialisable; entries carry their write time so callers can
+    apply their own freshness rules. The least recently read entries are evicted
+    once `max_entries` is exceeded.
+    A cache that can't be opened or written (e.g. read-only filesystem) only logs
+    and behaves as empty, so callers always fall through to the live source.
+    """
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            # WAL lets several worker processes share the same cache file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """
+        Returns (value, age_in_seconds) or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                row = db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+                    db.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Cache error ({self.path}): {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), now - row[1]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                count = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                if count > self.max_entries:
+                    db.execute(
+                        "DELETE FROM entries WHERE key IN "
+                        "(SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+                db.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Cache error ({self.path}): {e}")
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                db.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Cache error ({self.path}): {e}")
+
+    def stats(self):
+        with self._lock:
+            try:
+                size = self._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            except (sqlite3.Error, OSError):
+                size = 0
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+class MemoryCache:
+    """
+    Bounded in-process LRU with a per-entry TTL (seconds).
+    """
+    def __init__(self, max_items=256, ttl=3600):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.time() - item[1] >= self.ttl:
+                self._items.pop(key, None)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._items)}
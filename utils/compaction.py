@@ -0,0 +1,78 @@
+import os
+import re
+
+from utils.llm import call_llm, acall_llm, SYSTEM_ERROR
+from utils.tokens import estimate_tokens
+
+# How upstream reports are shrunk before going into SWOT / Final Strategy prompts:
+# "extractive" (headings, figures, bullets), "llm" (cheap summary call) or "off"
+COMPACT_MODE = os.getenv("COMPACT_MODE", "extractive")
+# Token budget per upstream report
+COMPACT_SWOT_TOKENS = int(os.getenv("COMPACT_SWOT_TOKENS", "900"))
+COMPACT_FINAL_TOKENS = int(os.getenv("COMPACT_FINAL_TOKENS", "600"))
+
+_FIGURE = re.compile(r"\d|[$€£₹%]")
+_BULLET = re.compile(r"^\s*([-*+]|\d+[.)])\s+")
+
+
+def _line_priority(line):
+    stripped = line.strip()
+    if stripped.startswith("#"):
+        return 3
+    if _FIGURE.search(stripped):
+        # Market sizes, prices, percentages, scores: what the synthesis actually quotes
+        return 2
+    if _BULLET.match(line) or stripped.startswith("|"):
+        return 1
+    return 0
+
+
+def extractive_digest(report, budget):
+    """
+    Keeps the highest-value lines of a markdown report (headings, then lines with
+    figures, then bullets/table rows, then prose) until `budget` tokens are used.
+    Lines stay in their original order.
+    """
+    lines = [l for l in report.splitlines() if l.strip() and not set(l.strip()) <= set("-|: ")]
+    ranked = sorted(range(len(lines)), key=lambda i: (-_line_priority(lines[i]), i))
+    keep, used = set(), 0
+    for i in ranked:
+        cost = estimate_tokens(lines[i])
+        if used + cost > budget:
+            continue
+        keep.add(i)
+        used += cost
+    return "\n".join(lines[i] for i in sorted(keep))
+
+
+def _summary_prompt(report, budget):
+    return f"""
+    Condense the following report into at most {int(budget * 0.75)} words of Markdown bullets.
+    Keep every number, name and verdict; drop explanations and filler.
+
+    {report}
+    """
+
+
+def compact(report, budget, mode=None):
+    """
+    Token-budgeted digest of an upstream report; reports already within budget pass through.
+    """
+    mode = mode or COMPACT_MODE
+    if mode == "off" or estimate_tokens(report) <= budget:
+        return report
+    if mode == "llm":
+        summary = call_llm(_summary_prompt(report, budget))
+        if summary != SYSTEM_ERROR:
+            return summary
+    return extractive_digest(report, budget)
+
+
+async def acompact(report, budget, mode=None):
+    mode = mode or COMPACT_MODE
+    if mode == "llm" and estimate_tokens(report) > budget:
+        summary = await acall_llm(_summary_prompt(report, budget))
+        if summary != SYSTEM_ERROR:
+            return summary
+        mode = "extractive"
+    return compact(report, budget, mode)
@@ -0,0 +1,104 @@
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from utils.tokens import estimate_tokens
+
+# Token budget for the search data in one agent prompt (0 = no limit)
+SEARCH_CONTEXT_TOKENS = int(os.getenv("SEARCH_CONTEXT_TOKENS", "1500"))
+# Snippets whose word shingles overlap at least this much are treated as duplicates
+SEARCH_NEAR_DUP_THRESHOLD = float(os.getenv("SEARCH_NEAR_DUP_THRESHOLD", "0.6"))
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|msclkid|ref|ref_src|mc_cid|mc_eid)$")
+_WORD = re.compile(r"[a-z0-9$%]+")
+# Words that say nothing about relevance to the idea
+_STOPWORDS = {
+    "a", "an", "and", "the", "for", "in", "of", "to", "with", "on", "what", "is", "are",
+    "by", "or", "at", "as", "from", "that", "this", "it", "be", "its", "your", "our",
+}
+
+
+def canonical_url(url):
+    """
+    Form of a URL used for dedupe: lowercase host without "www.", no fragment,
+    no tracking parameters and no trailing slash. http and https are the same page.
+    """
+    parts = urlsplit((url or "").strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)))
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+
+def terms(text):
+    return {w for w in _WORD.findall((text or "").lower()) if w not in _STOPWORDS}
+
+
+def shingles(text, k=3):
+    words = _WORD.findall((text or "").lower())
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def _similar(a, b):
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= SEARCH_NEAR_DUP_THRESHOLD
+
+
+def format_result(r):
+    return f"Title: {r['title']}\nLink: {r['href']}\nSnippet: {r['body']}\n\n"
+
+
+def build_context(result_lists, focus="", budget=None):
+    """
+    Packs search results from several queries into one prompt section.
+    Drops repeated URLs and near-duplicate snippets, ranks the rest by term
+    overlap with `focus` (the idea and industry) and keeps the best ones that
+    fit in `budget` tokens. Returns (text, stats).
+    """
+    budget = SEARCH_CONTEXT_TOKENS if budget is None else budget
+    focus_terms = terms(focus)
+
+    candidates, seen_urls, seen_shingles = [], set(), []
+    stats = {"results": 0, "duplicate_urls": 0, "near_duplicates": 0, "over_budget": 0}
+    for q_index, results in enumerate(result_lists):
+        for rank, r in enumerate(results or []):
+            stats["results"] += 1
+            url = canonical_url(r.get("href"))
+            if url and url in seen_urls:
+                stats["duplicate_urls"] += 1
+                continue
+            sh = shingles(f"{r.get('title', '')} {r.get('body', '')}")
+            if any(_similar(sh, other) for other in seen_shingles):
+                stats["near_duplicates"] += 1
+                continue
+            seen_urls.add(url)
+            seen_shingles.append(sh)
+            overlap = len(focus_terms & terms(f"{r.get('title', '')} {r.get('body', '')}"))
+            # Ties keep the search engine's own ranking, then query order
+            candidates.append(((-overlap, rank, q_index), r))
+
+    candidates.sort(key=lambda c: c[0])
+    text, used, kept = "", 0, 0
+    for _, r in candidates:
+        entry = format_result(r)
+        cost = estimate_tokens(entry)
+        if budget and used + cost > budget:
+            stats["over_budget"] += 1
+            continue
+        text += entry
+        used += cost
+        kept += 1
+
+    stats["kept"] = kept
+    stats["tokens"] = used
+    return text, stats
+
+
+def describe(stats):
+    return (f"kept {stats['kept']}/{stats['results']} snippets, {stats['tokens']} tokens "
+            f"(dropped {stats['duplicate_urls']} duplicate URLs, {stats['near_duplicates']} near-duplicates, "
+            f"{stats['over_budget']} over budget)")
@@ -0,0 +1,634 @@
+import os
+import io
+import re
+import html
+import json
+import zlib
+import threading
+import hashlib
+import tempfile
+import multiprocessing
+from urllib.parse import urlsplit
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from utils import artifacts
+
+# python-pptx and reportlab are imported on first use: the web server imports this
+# module for the markdown and the artifact keys, and shouldn't pay for them at startup
+
+# One export engine for every entry point (server, Streamlit app, CLI): the report
+# markdown is parsed into blocks once and each format is rendered from those blocks.
+
+# PDF/PPTX rendering is CPU-bound (and holds the GIL), so the server runs it in separate processes.
+EXPORT_PROCESSES = int(os.getenv("EXPORT_PROCESSES", "2"))
+# Formats rendered right after an analysis when the request doesn't choose;
+# anything else is rendered on its first download
+EXPORT_FORMATS = os.getenv("EXPORT_FORMATS", "")
+# Slide deck template (.pptx); python-pptx's default when unset
+PPTX_TEMPLATE = os.getenv("PPTX_TEMPLATE")
+# Estimated text lines per content slide before a section continues on the next slide
+PPTX_SLIDE_LINES = int(os.getenv("PPTX_SLIDE_LINES", "14"))
+# Content slides per section (0 = no limit). python-pptx scans every slide relationship
+# when it adds a slide, so export time grows quadratically with the deck; past this many
+# slides a section ends with a pointer to the full report instead
+PPTX_MAX_SECTION_SLIDES = int(os.getenv("PPTX_MAX_SECTION_SLIDES", "10"))
+
+FORMATS = ("pdf", "pptx", "html")
+_ALIASES = {"ppt": "pptx", "htm": "html"}
+# Part of every stored render's key: bump when output changes so old renders aren't reused
+EXPORT_VERSION = "2"
+
+_pool = None
+_pending = {}
+_lock = threading.Lock()
+# (template identity, bytes) of the last template read; see _presentation()
+_template = None
+
+
+# --- Markdown -> blocks ---
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_ITEM = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEP = re.compile(r"^\s*\|?[\s:|-]+\|?\s*$")
+
+
+def parse_blocks(text):
+    """
+    Yields the blocks of a markdown text, one at a time:
+    ("heading", level, text), ("para", text), ("item", depth, marker, text),
+    ("table", [[cell, ...], ...]), ("code", text) and ("rule",).
+    Inline markup is left in the text; see plain() and inline_html().
+    """
+    para, table, code = [], [], None
+    for line in text.split("\n"):
+        if code is not None:
+            if line.strip().startswith("```"):
+                yield ("code", "\n".join(code))
+                code = None
+            else:
+                code.append(line)
+            continue
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            if para:
+                yield ("para", " ".join(para))
+                para = []
+            if not _TABLE_SEP.match(stripped):
+                table.append([c.strip() for c in stripped.strip("|").split("|")])
+            continue
+        if table:
+            yield ("table", table)
+            table = []
+        heading = _HEADING.match(stripped)
+        item = _ITEM.match(line)
+        rule = _RULE.match(line)
+        if para and (not stripped or stripped.startswith("```") or heading or item or rule):
+            yield ("para", " ".join(para))
+            para = []
+        if not stripped:
+            continue
+        if stripped.startswith("```"):
+            code = []
+        elif heading:
+            yield ("heading", len(heading.group(1)), heading.group(2).strip().rstrip("#").strip())
+        elif rule:
+            yield ("rule",)
+        elif item:
+            yield ("item", len(item.group(1).expandtabs(4)) // 2, item.group(2), item.group(3))
+        else:
+            para.append(stripped)
+    if para:
+        yield ("para", " ".join(para))
+    if table:
+        yield ("table", table)
+    if code is not None:
+        yield ("code", "\n".join(code))
+
+
+# The target may contain balanced parentheses, e.g. Wikipedia URLs
+_LINK = re.compile(r"\[([^\]]+)\]\(((?:[^()\s]|\([^()\s]*\))+)\)")
+_BOLD = re.compile(r"(\*\*|__)(.+?)\1")
+_ITALIC = re.compile(r"(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1(?![\w*])")
+_CODE = re.compile(r"`([^`]+)`")
+_HELD = re.compile("\x00(\\d+)\x00")
+_LINK_SCHEMES = ("http", "https", "mailto")
+
+
+def plain(text):
+    """
+    Inline markdown stripped to readable text (for PDF and slides).
+    """
+    text = _LINK.sub(r"\1", text)
+    text = _BOLD.sub(r"\2", text)
+    text = _ITALIC.sub(r"\2", text)
+    return _CODE.sub(r"\1", text)
+
+
+def _emphasis(text):
+    text = html.escape(text, quote=False)
+    text = _BOLD.sub(r"<strong>\2</strong>", text)
+    return _ITALIC.sub(r"<em>\2</em>", text)
+
+
+def inline_html(text):
+    """
+    Inline markdown as HTML. Code spans and links are taken out before the text is
+    escaped (once), so neither is escaped twice; links keep only http(s) and mailto
+    targets (the report text comes from an LLM), anything else renders as its label.
+    """
+    spans = []
+
+    def hold(markup):
+        spans.append(markup)
+        return f"\x00{len(spans) - 1}\x00"
+
+    def link(m):
+        if urlsplit(m.group(2)).scheme.lower() not in _LINK_SCHEMES:
+            return hold(_emphasis(m.group(1)))
+        return hold(f'<a href="{html.escape(m.group(2))}">{_emphasis(m.group(1))}</a>')
+
+    text = text.replace("\x00", "")
+    text = _CODE.sub(lambda m: hold(f"<code>{html.escape(m.group(1), quote=False)}</code>"), text)
+    text = _LINK.sub(link, text)
+    return _HELD.sub(lambda m: spans[int(m.group(1))], _emphasis(text))
+
+
+# --- Markdown / HTML ---
+
+def report_title(idea):
+    return f"Business Strategy: {idea}"
+
+
+def render_markdown(idea, sections):
+    """
+    The full report as markdown: a title, then one `## ` section per stage.
+    """
+    return f"# {report_title(idea)}\n\n" + "\n\n".join([f"## {k}\n{v}" for k, v in sections.items()])
+
+
+def render_html(idea, sections, out):
+    """
+    Writes a standalone HTML page to the text stream `out`, block by block.
+    """
+    title = html.escape(report_title(idea))
+    out.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+              f"<title>{title}</title>"
+              "<style>body{font-family:sans-serif;max-width:52rem;margin:2rem auto;line-height:1.5;padding:0 1rem}"
+              "table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:.3rem .6rem}"
+              "pre{background:#f4f4f4;padding:.8rem;overflow:auto}</style></head><body>\n")
+    out.write(f"<h1>{title}</h1>\n")
+    for section, body in sections.items():
+        out.write(f"<section>\n<h2>{html.escape(section)}</h2>\n")
+        depth = -1
+        for block in parse_blocks(body):
+            kind = block[0]
+            # Open/close nested lists as item depth changes
+            target = block[1] if kind == "item" else -1
+            while depth < target:
+                out.write("<ul>\n")
+                depth += 1
+            while depth > target:
+                out.write("</ul>\n")
+                depth -= 1
+            if kind == "item":
+                out.write(f"<li>{inline_html(block[3])}</li>\n")
+            elif kind == "heading":
+                level = min(block[1] + 2, 6)
+                out.write(f"<h{level}>{inline_html(block[2])}</h{level}>\n")
+            elif kind == "para":
+                out.write(f"<p>{inline_html(block[1])}</p>\n")
+            elif kind == "table":
+                head, *rows = block[1]
+                out.write("<table><tr>" + "".join(f"<th>{inline_html(c)}</th>" for c in head) + "</tr>\n")
+                for row in rows:
+                    out.write("<tr>" + "".join(f"<td>{inline_html(c)}</td>" for c in row) + "</tr>\n")
+                out.write("</table>\n")
+            elif kind == "code":
+                out.write(f"<pre><code>{html.escape(block[1])}</code></pre>\n")
+            elif kind == "rule":
+                out.write("<hr>\n")
+        out.write("</ul>\n" * (depth + 1))
+        out.write("</section>\n")
+    out.write("</body></html>\n")
+
+
+# --- PDF ---
+
+_PAGE_W, _PAGE_H, _MARGIN = 612, 792, 40
+_FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Courier"}
+
+
+class PdfStream:
+    """
+    Minimal text-only PDF writer that streams each page to the file as soon as it is
+    full, so memory stays at one page no matter how long the report is. Uses the
+    standard Type 1 fonts (no embedding); characters outside WinAnsi become '?'.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.pos = 0
+        self.offsets = {}
+        self.pages = []
+        self.next_id = 3 + len(_FONTS)  # 1 catalog, 2 page tree, then the fonts
+        self.ops = []
+        self.y = _PAGE_H - _MARGIN
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for i, name in enumerate(_FONTS.values()):
+            self._object(3 + i, f"<< /Type /Font /Subtype /Type1 /BaseFont /{name} "
+                                f"/Encoding /WinAnsiEncoding >>".encode())
+
+    def _write(self, data):
+        self.f.write(data)
+        self.pos += len(data)
+
+    def _object(self, num, body):
+        self.offsets[num] = self.pos
+        self._write(f"{num} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _flush_page(self):
+        content = zlib.compress("\n".join(self.ops).encode("cp1252", "replace"))
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode()
+                     + content + b"\nendstream")
+        fonts = " ".join(f"/{key} {3 + i} 0 R" for i, key in enumerate(_FONTS))
+        self._object(page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_PAGE_W} {_PAGE_H}] "
+                              f"/Contents {content_id} 0 R /Resources << /Font << {fonts} >> >> >>".encode())
+        self.pages.append(page_id)
+        self.ops = []
+        self.y = _PAGE_H - _MARGIN
+
+    def space(self, height):
+        self.y -= height
+
+    def line(self, text, font="F1", size=10, indent=0):
+        leading = size * 1.35
+        if self.y - leading < _MARGIN:
+            self._flush_page()
+        self.y -= leading
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        self.ops.append(f"BT /{font} {size} Tf {_MARGIN + indent} {self.y:.2f} Td ({escaped}) Tj ET")
+
+    def paragraph(self, text, font="F1", size=10, indent=0):
+        """
+        Word-wraps `text` to the page width (measured with the font's real metrics).
+        """
+        width = _PAGE_W - 2 * _MARGIN - indent
+        for line in _wrap(text, _FONTS[font], size, width):
+            self.line(line, font, size, indent)
+
+    def close(self):
+        if self.ops or not self.pages:
+            self._flush_page()
+        kids = " ".join(f"{p} 0 R" for p in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.pos
+        entries = ["0000000000 65535 f "] + [f"{self.offsets[n]:010d} 00000 n " for n in range(1, self.next_id)]
+        self._write(f"xref\n0 {self.next_id}\n".encode() + "\n".join(entries).encode() + b"\n")
+        self._write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def _wrap(text, font_name, size, width):
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if stringWidth(candidate, font_name, size) <= width:
+            line = candidate
+            continue
+        if line:
+            yield line
+        # A single word wider than the page is cut
+        while stringWidth(word, font_name, size) > width:
+            cut = max(1, int(len(word) * width / stringWidth(word, font_name, size)))
+            yield word[:cut]
+            word = word[cut:]
+        line = word
+    if line:
+        yield line
+
+
+def render_pdf(idea, sections, f):
+    """
+    Writes the report as PDF to the binary stream `f`.
+    """
+    pdf = PdfStream(f)
+    pdf.paragraph(report_title(idea), "F2", 16)
+    for section, body in sections.items():
+        pdf.space(10)
+        pdf.paragraph(section, "F2", 14)
+        pdf.space(4)
+        for block in parse_blocks(body):
+            kind = block[0]
+            if kind == "heading":
+                pdf.space(4)
+                pdf.paragraph(plain(block[2]), "F2", 12 if block[1] <= 2 else 11)
+            elif kind == "para":
+                pdf.paragraph(plain(block[1]))
+                pdf.space(3)
+            elif kind == "item":
+                marker = "•" if block[2] in "-*+" else block[2]
+                pdf.paragraph(f"{marker} {plain(block[3])}", indent=12 + 14 * block[1])
+            elif kind == "table":
+                for row in block[1]:
+                    pdf.paragraph(" | ".join(plain(c) for c in row), size=9)
+                pdf.space(3)
+            elif kind == "code":
+                for line in block[1].split("\n"):
+                    pdf.paragraph(line or " ", "F3", 9)
+            elif kind == "rule":
+                pdf.space(6)
+    pdf.close()
+
+
+# --- PPTX ---
+
+def template_path():
+    import pptx
+    return PPTX_TEMPLATE or os.path.join(os.path.dirname(pptx.__file__), "templates", "default.pptx")
+
+
+def template_identity():
+    """
+    What a PPTX render depends on besides the report: the template's path, size and
+    mtime ("default" for python-pptx's own, which changes only with EXPORT_VERSION).
+    """
+    if not PPTX_TEMPLATE:
+        return "default"
+    try:
+        st = os.stat(PPTX_TEMPLATE)
+    except OSError:
+        return PPTX_TEMPLATE
+    return f"{os.path.abspath(PPTX_TEMPLATE)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _presentation():
+    """
+    New deck from the template, which is read from disk once per process (again
+    only after it changes).
+    """
+    from pptx import Presentation
+    global _template
+    identity = template_identity()
+    if _template is None or _template[0] != identity:
+        with open(template_path(), "rb") as f:
+            _template = (identity, f.read())
+    return Presentation(io.BytesIO(_template[1]))
+
+
+def _slide_lines(body):
+    """
+    A section as (text, indent level, bold) paragraphs for slides.
+    """
+    for block in parse_blocks(body):
+        kind = block[0]
+        if kind == "heading":
+            yield plain(block[2]), 0, True
+        elif kind == "para":
+            yield plain(block[1]), 0, False
+        elif kind == "item":
+            yield plain(block[3]), min(block[1] + 1, 4), False
+        elif kind == "table":
+            for row in block[1]:
+                yield " | ".join(plain(c) for c in row), 0, False
+        elif kind == "code":
+            for line in block[1].split("\n"):
+                yield line, 0, False
+
+
+def _paginate(lines, per_slide):
+    # ~90 characters fit on one line of a content slide at 14pt
+    page, used = [], 0
+    for line in lines:
+        cost = max(1, -(-len(line[0]) // 90))
+        if page and used + cost > per_slide:
+            yield page
+            page, used = [], 0
+        page.append(line)
+        used += cost
+    if page:
+        yield page
+
+
+def render_pptx(idea, sections, f):
+    """
+    Writes the report as a slide deck to the binary stream `f`. Long sections
+    continue over further slides, up to PPTX_MAX_SECTION_SLIDES each.
+    """
+    from pptx.util import Pt
+    prs = _presentation()
+    title_slide = prs.slides.add_slide(prs.slide_layouts[0])
+    title_slide.shapes.title.text = "Business Strategy Report"
+    title_slide.placeholders[1].text = idea
+
+    for section, content in sections.items():
+        for i, page in enumerate(_paginate(_slide_lines(content), PPTX_SLIDE_LINES)):
+            if PPTX_MAX_SECTION_SLIDES and i == PPTX_MAX_SECTION_SLIDES:
+                # The rest of the section isn't even parsed
+                run = tf.add_paragraph().add_run()
+                run.text = "… continued in the full report (PDF, HTML or Markdown)"
+                run.font.size = Pt(14)
+                run.font.italic = True
+                break
+            slide = prs.slides.add_slide(prs.slide_layouts[1])
+            slide.shapes.title.text = section if i == 0 else f"{section} (cont.)"
+            tf = slide.placeholders[1].text_frame
+            for j, (text, level, bold) in enumerate(page):
+                p = tf.paragraphs[0] if j == 0 else tf.add_paragraph()
+                p.level = level
+                run = p.add_run()
+                run.text = text
+                run.font.size = Pt(14)
+                run.font.bold = bold
+    prs.save(f)
+
+
+# --- Files ---
+
+_RENDERERS = {"pdf": (render_pdf, "wb"), "pptx": (render_pptx, "wb"), "html": (render_html, "w")}
+
+
+def write(idea, sections, fmt, out_path):
+    """
+    Renders one format to `out_path` via a temp file and a rename, so readers never
+    see a half-written file. Returns the path, or None if rendering failed.
+    """
+    renderer, mode = _RENDERERS[fmt]
+    tmp = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            renderer(idea, sections, f)
+        os.replace(tmp, out_path)
+        return out_path
+    except Exception as e:
+        print(f"Export error ({fmt}): {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+
+
+def write_all(idea, sections, md_path, formats=FORMATS):
+    """
+    Writes the markdown report plus `formats` next to it (same name, other extension).
+    Returns {format: path or None}, including "md".
+    """
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write(render_markdown(idea, sections))
+    paths = {"md": md_path}
+    for fmt in formats:
+        paths[fmt] = write(idea, sections, fmt, artifact_path(md_path, fmt))
+    return paths
+
+
+def artifact_path(md_path, fmt):
+    return md_path[:-len(".md")] + "." + fmt
+
+
+def parse_formats(value):
+    """
+    Normalizes a format list ("pdf,pptx", ["ppt"], None -> EXPORT_FORMATS) to known formats.
+    """
+    if value is None:
+        value = EXPORT_FORMATS
+    if isinstance(value, str):
+        value = value.split(",")
+    formats = []
+    for f in value:
+        f = _ALIASES.get(f.strip().lower(), f.strip().lower())
+        if f in FORMATS and f not in formats:
+            formats.append(f)
+    return formats
+
+
+def sections_path(md_path):
+    return md_path[:-len(".md")] + ".json"
+
+
+def load_sections(md_path):
+    """
+    Report sections as saved next to the markdown; older reports are split on their `## ` headings.
+    """
+    path = sections_path(md_path)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(md_path, encoding="utf-8") as f:
+        md = f.read()
+    sections, current = {}, None
+    for line in md.split("\n"):
+        if line.startswith("## "):
+            current = line[3:].strip()
+            sections[current] = ""
+        elif current:
+            sections[current] += line + "\n"
+    return sections
+
+
+def render(md_path, idea, fmt, out_path):
+    """
+    Renders one artifact of a report saved as files. Runs in a pool process.
+    """
+    return write(idea, load_sections(md_path), fmt, out_path)
+
+
+def render_key(sections_key, idea, fmt):
+    """
+    Store key of a rendered format. Renders are deterministic in everything hashed
+    here: the sections, the idea (it is the report's title), the PPTX template and
+    EXPORT_VERSION. Reports agreeing on all of them share their renders.
+    """
+    template = template_identity() if fmt == "pptx" else ""
+    payload = json.dumps([fmt, EXPORT_VERSION, sections_key, idea, template])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_stored(sections_key, idea, fmt, key):
+    """
+    Renders one format of a report kept in the artifact store and stores the result
+    under `key` (its render_key). Runs in a pool process. Returns the key, or None on failure.
+    """
+    store = artifacts.get_store()
+    sections = json.loads(store.read(sections_key))
+    fd, tmp = tempfile.mkstemp(suffix="." + fmt)
+    os.close(fd)
+    try:
+        if write(idea, sections, fmt, tmp) is None:
+            return None
+        with open(tmp, "rb") as f:
+            # PDF and PPTX are compressed already
+            return store.put(f.read(), key=key, compress_data=fmt == "html")
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# --- Process pool (server) ---
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn: workers start clean instead of forking a threaded web server
+            _pool = ProcessPoolExecutor(max_workers=EXPORT_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _submit(token, existing, fn, *args):
+    """
+    Runs fn(*args) in the pool unless `existing` (already rendered) is set or a render
+    of `token` is already in flight in this process; returns a Future either way.
+    """
+    if existing is not None:
+        future = Future()
+        future.set_result(existing)
+        return future
+    pool = _get_pool()
+    with _lock:
+        future = _pending.get(token)
+        created = future is None
+        if created:
+            future = _pending[token] = pool.submit(fn, *args)
+    if created:
+        # Outside the lock: the callback runs at once if the render already finished
+        future.add_done_callback(lambda f: _forget(token))
+    return future
+
+
+def submit(md_path, idea, fmt, out_path):
+    """
+    Schedules rendering of `out_path` for a report saved as files.
+    Returns a concurrent.futures.Future with the path (or None on failure).
+    """
+    return _submit(out_path, out_path if os.path.exists(out_path) else None, render, md_path, idea, fmt, out_path)
+
+
+def submit_stored(sections_key, idea, fmt):
+    """
+    Schedules rendering of a stored report's format into the artifact store.
+    Returns a concurrent.futures.Future with the render's key (or None on failure).
+    """
+    key = render_key(sections_key, idea, fmt)
+    existing = key if artifacts.get_store().exists(key) else None
+    return _submit(key, existing, render_stored, sections_key, idea, fmt, key)
+
+
+def _forget(token):
+    with _lock:
+        _pending.pop(token, None)
+
+
+def ensure(md_path, idea, fmt, out_path):
+    """
+    Blocking: renders `out_path` if needed and returns its path (None if rendering failed).
+    """
+    return submit(md_path, idea, fmt, out_path).result()
+
+
+def ensure_stored(sections_key, idea, fmt):
+    """
+    Blocking: renders the format into the store if needed and returns its key (None if rendering failed).
+    """
+    return submit_stored(sections_key, idea, fmt).result()
@@ -1,8 +1,20 @@
 import os
 import time
+import asyncio
+import hashlib
+import json
+import threading
+import contextvars
+import httpx
 from dotenv import load_dotenv
 import google.generativeai as genai
-from groq import Groq
+from google.api_core import exceptions as google_exceptions
+from groq import Groq, AsyncGroq, APIStatusError
+from utils.cache import DiskCache, MemoryCache
+from utils.router import Router, ROUTER_RETRY_BACKOFF
+from utils.ratelimit import RateGovernor, RATE_LIMIT_DB, RATE_LIMIT_DEFAULT_BACKOFF
+from utils.tokens import estimate_tokens
+from utils import metrics, offline
 # import cohere  <-- Commented out to save space
 # from huggingface_hub import InferenceClient <-- Commented out to save space
 
@@ -12,55 +24,558 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 # HF_TOKEN = os.getenv("HF_TOKEN")
+if offline.LLM_BACKEND == "offline":
+    # Local stand-in providers (utils/offline.py) need no keys
+    GROQ_API_KEY = GROQ_API_KEY or "offline"
+    GEMINI_API_KEY = GEMINI_API_KEY or "offline"
 
-def call_llm(prompt, system_instruction=None, model_type="groq"):
+GROQ_MODEL = "llama-3.3-70b-versatile"
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+MODELS = {"groq": GROQ_MODEL, "gemini": GEMINI_MODEL}
+
+# Yielded by stream_llm when a provider fails mid-answer: discard what was streamed so far
+STREAM_RESET = object()
+
+# Provider behind the latest answer in the current thread / asyncio task
+# ("groq", "gemini", "cache", or None after a failure); read by pipeline checkpoints
+last_provider = contextvars.ContextVar("last_provider", default=None)
+
+SYSTEM_ERROR = "❌ **System Error**: All AI agents are currently unavailable. Please check your API keys or try again later."
+
+# Response cache: identical prompts within LLM_CACHE_TTL seconds are answered locally.
+# The memory tier is per process; set LLM_CACHE_PATH to add a shared on-disk tier.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+response_cache = MemoryCache(
+    max_items=int(os.getenv("LLM_CACHE_MAX_ITEMS", "256")),
+    ttl=LLM_CACHE_TTL,
+)
+response_disk_cache = DiskCache(os.getenv("LLM_CACHE_PATH")) if os.getenv("LLM_CACHE_PATH") else None
+
+
+# Connection pool limits for the shared provider clients
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30"))
+# Set a 8-second timeout to ensure we fail over quickly if it hangs
+GROQ_TIMEOUT = 8.0
+
+
+# Per-provider quotas (0 disables a limit). The defaults are the free-tier limits of
+# GROQ_MODEL and GEMINI_MODEL; raise them to your account's tier. Calls wait for
+# capacity instead of tripping 429s, and the router prefers a provider that has
+# capacity now. Each call reserves the prompt plus an expected answer size, and the
+# reservation is settled against the reported usage once the call is done.
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "12000"))
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1024"))
+governors = {
+    "groq": RateGovernor("groq", GROQ_RPM, GROQ_TPM, RATE_LIMIT_DB),
+    "gemini": RateGovernor("gemini", GEMINI_RPM, GEMINI_TPM, RATE_LIMIT_DB),
+}
+
+
+# --- Provider Registry ---
+# One client per provider per process, shared by every thread. Both SDK clients
+# are thread-safe and keep their connections alive between calls.
+
+def _build_groq():
+    http_client = httpx.Client(
+        timeout=GROQ_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+        ),
+    )
+    # Retries (and 429 backoff) are handled by the router and rate governor, not the SDK
+    return Groq(api_key=GROQ_API_KEY, timeout=GROQ_TIMEOUT, max_retries=0, http_client=http_client)
+
+def _build_groq_async():
+    http_client = httpx.AsyncClient(
+        timeout=GROQ_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+        ),
+    )
+    return AsyncGroq(api_key=GROQ_API_KEY, timeout=GROQ_TIMEOUT, max_retries=0, http_client=http_client)
+
+def _build_gemini():
+    # The gRPC channel created here is multiplexed across threads;
+    # generate_content_async on the same model uses its own aio channel
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+# "groq_async" is meant for a single event loop (the ASGI app's)
+_BUILDERS = {"groq": _build_groq, "groq_async": _build_groq_async, "gemini": _build_gemini}
+if offline.LLM_BACKEND == "offline":
+    _BUILDERS = dict(offline.BUILDERS)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider):
     """
-    Calls various LLMs with a robust fallback mechanism & retries.
-    Order: Groq -> Gemini
+    Returns the shared client for `provider` ("groq", "groq_async" or "gemini"), creating it on first use.
+    """
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = _clients[provider] = _BUILDERS[provider]()
+    return client
+
+
+def reset_client(provider):
     """
+    Drops the shared client so the next call builds a fresh one.
+    """
+    with _clients_lock:
+        client = _clients.pop(provider, None)
+    # AsyncGroq.close() is a coroutine; its pool is simply dropped with the client
+    if client is not None and not isinstance(client, AsyncGroq) and hasattr(client, "close"):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+def is_fatal_error(e):
+    """
+    HTTP-level errors (429, 5xx, bad request) leave the connection pool healthy.
+    Anything else (connection resets, TLS or transport failures) gets a fresh client.
+    """
+    return not isinstance(e, (APIStatusError, google_exceptions.GoogleAPICallError))
+
+
+def retry_after(e):
+    """
+    Seconds to hold off after a rate-limit error, or None if `e` isn't one.
+    """
+    if isinstance(e, APIStatusError) and e.status_code == 429:
+        try:
+            return float(e.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return RATE_LIMIT_DEFAULT_BACKOFF
+    if isinstance(e, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)):
+        return RATE_LIMIT_DEFAULT_BACKOFF
+    return None
+
+
+def _on_provider_error(provider, e):
+    delay = retry_after(e)
+    if delay is not None: governors[provider].backoff(delay)
+    if is_fatal_error(e): reset_client(provider)
+
+
+def _on_async_provider_error(provider, e):
+    delay = retry_after(e)
+    if delay is not None: governors[provider].backoff(delay)
+    if is_fatal_error(e): reset_client("groq_async" if provider == "groq" else provider)
+
+
+# Health-aware provider selection (circuit breakers, optional hedging), shared process-wide
+router = Router(["groq", "gemini"])
+
+
+def cache_key(prompt, system_instruction, provider, model):
+    payload = json.dumps([system_instruction, prompt, provider, model])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_response(key):
+    res = response_cache.get(key)
+    if res is None and response_disk_cache is not None:
+        cached = response_disk_cache.get(key)
+        if cached is not None and cached[1] < LLM_CACHE_TTL:
+            res = cached[0]
+            response_cache.set(key, res)
+    return res
+
+
+def store_response(key, res):
+    response_cache.set(key, res)
+    if response_disk_cache is not None:
+        response_disk_cache.set(key, res)
+
+
+def _cache_keys(prompt, system_instruction):
+    return (
+        cache_key(prompt, system_instruction, "groq", GROQ_MODEL),
+        cache_key(prompt, system_instruction, "gemini", GEMINI_MODEL),
+    )
+
+
+def _cached_answer(*keys):
+    # An answer from either provider in the chain is acceptable, preferred one first
+    for key in keys:
+        res = get_cached_response(key)
+        if res is not None:
+            return res
+    return None
+
+
+def _full_prompt(prompt, system_instruction):
     context = ""
     if system_instruction:
         context = f"System Instruction: {system_instruction}\n\n"
-    
-    full_prompt = context + prompt
+    return context + prompt
+
+
+def _usage(response):
+    """
+    (prompt, completion) tokens as reported by a Groq or Gemini response, or None.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return usage.prompt_tokens, usage.completion_tokens or 0
+    meta = getattr(response, "usage_metadata", None)
+    if meta is not None and getattr(meta, "prompt_token_count", None):
+        return meta.prompt_token_count, meta.candidates_token_count or 0
+    return None
+
+
+def _record_attempt(call, provider, start, res, usage, prompt_tokens):
+    if usage is None:
+        usage = (prompt_tokens, estimate_tokens(res)) if res else (0, 0)
+    call.attempt(provider, MODELS[provider], time.perf_counter() - start, "ok" if res else "empty", *usage)
+
+
+def _settle(provider, reserved, prompt_tokens, res=None, usage=None):
+    """
+    Trues up the provider's token bucket after a call that reserved `reserved` tokens:
+    the reported usage, else the prompt plus the estimated answer (only the prompt
+    after a failure).
+    """
+    if usage is None:
+        usage = (prompt_tokens, estimate_tokens(res) if res else 0)
+    governors[provider].settle(reserved, sum(usage))
+
+
+def _measured(call, provider, fn, prompt_tokens, reserved):
+    """
+    Wraps a provider attempt returning (text, usage) into the text-returning call the
+    router expects, recording its duration, outcome and tokens on `call` and settling
+    the `reserved` tokens against the provider's rate governor.
+    """
+    def attempt():
+        start = time.perf_counter()
+        try:
+            res, usage = fn()
+        except Exception:
+            call.attempt(provider, MODELS[provider], time.perf_counter() - start, "error")
+            _settle(provider, reserved, prompt_tokens)
+            raise
+        _record_attempt(call, provider, start, res, usage, prompt_tokens)
+        _settle(provider, reserved, prompt_tokens, res, usage)
+        return res
+    return attempt
+
+
+def _ameasured(call, provider, fn, prompt_tokens, reserved):
+    async def attempt():
+        start = time.perf_counter()
+        try:
+            res, usage = await fn()
+        except Exception:
+            call.attempt(provider, MODELS[provider], time.perf_counter() - start, "error")
+            _settle(provider, reserved, prompt_tokens)
+            raise
+        _record_attempt(call, provider, start, res, usage, prompt_tokens)
+        _settle(provider, reserved, prompt_tokens, res, usage)
+        return res
+    return attempt
+
+
+def _capacity_wait(tokens):
+    """
+    For the router: seconds each provider's rate governor would hold a call of `tokens` back.
+    """
+    return lambda provider: governors[provider].wait_time(tokens)
+
+
+def call_llm(prompt, system_instruction=None, model_type="groq", use_cache=True, on_delta=None):
+    """
+    Calls various LLMs with a robust fallback mechanism & retries.
+    Order: Groq -> Gemini, adjusted per call by the provider router
+    Successful answers are cached per (system_instruction, prompt, provider, model);
+    pass use_cache=False to always hit the provider.
+    With `on_delta`, the answer is streamed: on_delta(chunk) is called per text chunk
+    (or with STREAM_RESET) and the assembled text is returned at the end.
+    """
+    if on_delta is not None:
+        parts = []
+        for chunk in stream_llm(prompt, system_instruction, use_cache=use_cache):
+            if chunk is STREAM_RESET:
+                parts = []
+            else:
+                parts.append(chunk)
+            on_delta(chunk)
+        return "".join(parts)
+
+    full_prompt = _full_prompt(prompt, system_instruction)
+    call = metrics.LLMCall()
+
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    groq_key, gemini_key = _cache_keys(prompt, system_instruction)
+    if use_cache:
+        res = _cached_answer(groq_key, gemini_key)
+        if res is not None:
+            last_provider.set("cache")
+            call.finish("cache")
+            return res
+
+    prompt_tokens = estimate_tokens(full_prompt)
+    request_tokens = prompt_tokens + LLM_EXPECTED_COMPLETION_TOKENS
 
     def attempt_groq():
-        if not GROQ_API_KEY: return None
-        # Set a 8-second timeout to ensure we fail over quickly if it hangs
-        client = Groq(api_key=GROQ_API_KEY, timeout=8.0)
-        chat_completion = client.chat.completions.create(
+        governors["groq"].acquire(request_tokens)
+        chat_completion = get_client("groq").chat.completions.create(
             messages=[{"role": "user", "content": full_prompt}],
-            model="llama-3.3-70b-versatile",
+            model=GROQ_MODEL,
         )
-        return chat_completion.choices[0].message.content
+        return chat_completion.choices[0].message.content, _usage(chat_completion)
 
     def attempt_gemini():
-        if not GEMINI_API_KEY: return None
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp') 
+        governors["gemini"].acquire(request_tokens)
         # Gemini doesn't have a simple timeout param in generate_content, but it's usually fast
-        response = model.generate_content(full_prompt)
-        return response.text
+        response = get_client("gemini").generate_content(full_prompt)
+        return response.text, _usage(response)
 
-    # 1. FAST Try Groq (Max 1 Retry with short sleep)
-    # We prioritize switching over retrying endlessly
-    for i in range(2): 
-        try:
-            res = attempt_groq()
-            if res: return res
-        except Exception as e:
-            print(f"⚠️ Groq Attempt {i+1} Failed: {e}")
-            if i == 0: time.sleep(0.5) # Short pause before 1 single retry
+    # Groq first for speed, Gemini for reliability; the router skips a provider
+    # whose circuit is open and can hedge a slow call onto the other one
+    calls = {}
+    if GROQ_API_KEY: calls["groq"] = _measured(call, "groq", attempt_groq, prompt_tokens, request_tokens)
+    if GEMINI_API_KEY: calls["gemini"] = _measured(call, "gemini", attempt_gemini, prompt_tokens, request_tokens)
 
-    print("🔻 Groq unavailable. Switching to Gemini immediately...")
+    provider, res = router.call(calls, on_error=_on_provider_error, wait=_capacity_wait(request_tokens))
+    last_provider.set(provider)
+    call.finish(provider if res else None, use_cache)
+    if res:
+        if use_cache: store_response(groq_key if provider == "groq" else gemini_key, res)
+        if offline.OFFLINE_RECORD: offline.record("llm", offline.llm_key(full_prompt), res)
+        return res
 
-    # 2. Fallback to Gemini (Reliability Focus)
-    for i in range(2):
-        try:
-            res = attempt_gemini()
-            if res: return res
-        except Exception as e:
-            print(f"⚠️ Gemini Attempt {i+1} Failed: {e}")
-            time.sleep(1)
+    # Never cached, so the next identical call tries the providers again
+    return SYSTEM_ERROR
+
+
+def stream_llm(prompt, system_instruction=None, use_cache=True):
+    """
+    Streaming variant of call_llm: a generator of text chunks, same Groq -> Gemini fallback.
+    If a provider dies after it started answering, STREAM_RESET is yielded before the
+    next provider starts over. Cached answers come back as a single chunk.
+    """
+    full_prompt = _full_prompt(prompt, system_instruction)
+    call = metrics.LLMCall()
+
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    groq_key, gemini_key = _cache_keys(prompt, system_instruction)
+    if use_cache:
+        res = _cached_answer(groq_key, gemini_key)
+        if res is not None:
+            last_provider.set("cache")
+            call.finish("cache")
+            yield res
+            return
+
+    prompt_tokens = estimate_tokens(full_prompt)
+    request_tokens = prompt_tokens + LLM_EXPECTED_COMPLETION_TOKENS
+
+    def stream_groq():
+        governors["groq"].acquire(request_tokens)
+        stream = get_client("groq").chat.completions.create(
+            messages=[{"role": "user", "content": full_prompt}],
+            model=GROQ_MODEL,
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def stream_gemini():
+        governors["gemini"].acquire(request_tokens)
+        for chunk in get_client("gemini").generate_content(full_prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+    streams = {}
+    if GROQ_API_KEY: streams["groq"] = (groq_key, stream_groq)
+    if GEMINI_API_KEY: streams["gemini"] = (gemini_key, stream_gemini)
+
+    for attempt in range(2):
+        if attempt: time.sleep(ROUTER_RETRY_BACKOFF)
+        for provider in router.order(list(streams), wait=_capacity_wait(request_tokens)):
+            key, stream = streams[provider]
+            parts = []
+            start = time.time()
+            attempt_start = time.perf_counter()
+            try:
+                for text in stream():
+                    parts.append(text)
+                    yield text
+            except Exception as e:
+                call.attempt(provider, MODELS[provider], time.perf_counter() - attempt_start, "error")
+                _settle(provider, request_tokens, prompt_tokens, "".join(parts))
+                router.health[provider].record(False, time.time() - start)
+                print(f"⚠️ {provider.title()} Stream Failed: {e}")
+                _on_provider_error(provider, e)
+                if parts:
+                    yield STREAM_RESET
+                continue
+            router.health[provider].record(bool(parts), time.time() - start)
+            _record_attempt(call, provider, attempt_start, "".join(parts), None, prompt_tokens)
+            _settle(provider, request_tokens, prompt_tokens, "".join(parts))
+            if parts:
+                last_provider.set(provider)
+                call.finish(provider, use_cache)
+                if use_cache: store_response(key, "".join(parts))
+                if offline.OFFLINE_RECORD: offline.record("llm", offline.llm_key(full_prompt), "".join(parts))
+                return
+
+    last_provider.set(None)
+    call.finish(None, use_cache)
+    yield SYSTEM_ERROR
+
+
+# --- Async counterparts (used by asgi.py) ---
+
+async def acall_llm(prompt, system_instruction=None, model_type="groq", use_cache=True, on_delta=None):
+    """
+    Async version of call_llm: same Groq -> Gemini fallback, cache and on_delta hook,
+    without blocking the event loop.
+    """
+    if on_delta is not None:
+        parts = []
+        async for chunk in astream_llm(prompt, system_instruction, use_cache=use_cache):
+            if chunk is STREAM_RESET:
+                parts = []
+            else:
+                parts.append(chunk)
+            on_delta(chunk)
+        return "".join(parts)
+
+    full_prompt = _full_prompt(prompt, system_instruction)
+    call = metrics.LLMCall()
+
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    groq_key, gemini_key = _cache_keys(prompt, system_instruction)
+    if use_cache:
+        res = _cached_answer(groq_key, gemini_key)
+        if res is not None:
+            last_provider.set("cache")
+            call.finish("cache")
+            return res
+
+    prompt_tokens = estimate_tokens(full_prompt)
+    request_tokens = prompt_tokens + LLM_EXPECTED_COMPLETION_TOKENS
+
+    async def attempt_groq():
+        await governors["groq"].aacquire(request_tokens)
+        chat_completion = await get_client("groq_async").chat.completions.create(
+            messages=[{"role": "user", "content": full_prompt}],
+            model=GROQ_MODEL,
+        )
+        return chat_completion.choices[0].message.content, _usage(chat_completion)
+
+    async def attempt_gemini():
+        await governors["gemini"].aacquire(request_tokens)
+        response = await get_client("gemini").generate_content_async(full_prompt)
+        return response.text, _usage(response)
+
+    calls = {}
+    if GROQ_API_KEY: calls["groq"] = _ameasured(call, "groq", attempt_groq, prompt_tokens, request_tokens)
+    if GEMINI_API_KEY: calls["gemini"] = _ameasured(call, "gemini", attempt_gemini, prompt_tokens, request_tokens)
+
+    provider, res = await router.acall(calls, on_error=_on_async_provider_error,
+                                       wait=_capacity_wait(request_tokens))
+    last_provider.set(provider)
+    call.finish(provider if res else None, use_cache)
+    if res:
+        if use_cache: store_response(groq_key if provider == "groq" else gemini_key, res)
+        if offline.OFFLINE_RECORD: offline.record("llm", offline.llm_key(full_prompt), res)
+        return res
+
+    return SYSTEM_ERROR
+
+
+async def astream_llm(prompt, system_instruction=None, use_cache=True):
+    """
+    Async generator version of stream_llm.
+    """
+    full_prompt = _full_prompt(prompt, system_instruction)
+    call = metrics.LLMCall()
+
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    groq_key, gemini_key = _cache_keys(prompt, system_instruction)
+    if use_cache:
+        res = _cached_answer(groq_key, gemini_key)
+        if res is not None:
+            last_provider.set("cache")
+            call.finish("cache")
+            yield res
+            return
+
+    prompt_tokens = estimate_tokens(full_prompt)
+    request_tokens = prompt_tokens + LLM_EXPECTED_COMPLETION_TOKENS
+
+    async def stream_groq():
+        await governors["groq"].aacquire(request_tokens)
+        stream = await get_client("groq_async").chat.completions.create(
+            messages=[{"role": "user", "content": full_prompt}],
+            model=GROQ_MODEL,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def stream_gemini():
+        await governors["gemini"].aacquire(request_tokens)
+        response = await get_client("gemini").generate_content_async(full_prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    streams = {}
+    if GROQ_API_KEY: streams["groq"] = (groq_key, stream_groq)
+    if GEMINI_API_KEY: streams["gemini"] = (gemini_key, stream_gemini)
+
+    for attempt in range(2):
+        if attempt: await asyncio.sleep(ROUTER_RETRY_BACKOFF)
+        for provider in router.order(list(streams), wait=_capacity_wait(request_tokens)):
+            key, stream = streams[provider]
+            parts = []
+            start = time.time()
+            attempt_start = time.perf_counter()
+            try:
+                async for text in stream():
+                    parts.append(text)
+                    yield text
+            except Exception as e:
+                call.attempt(provider, MODELS[provider], time.perf_counter() - attempt_start, "error")
+                _settle(provider, request_tokens, prompt_tokens, "".join(parts))
+                router.health[provider].record(False, time.time() - start)
+                print(f"⚠️ {provider.title()} Stream Failed: {e}")
+                _on_async_provider_error(provider, e)
+                if parts:
+                    yield STREAM_RESET
+                continue
+            router.health[provider].record(bool(parts), time.time() - start)
+            _record_attempt(call, provider, attempt_start, "".join(parts), None, prompt_tokens)
+            _settle(provider, request_tokens, prompt_tokens, "".join(parts))
+            if parts:
+                last_provider.set(provider)
+                call.finish(provider, use_cache)
+                if use_cache: store_response(key, "".join(parts))
+                if offline.OFFLINE_RECORD: offline.record("llm", offline.llm_key(full_prompt), "".join(parts))
+                return
 
-    return "❌ **System Error**: All AI agents are currently unavailable. Please check your API keys or try again later."
+    last_provider.set(None)
+    call.finish(None, use_cache)
+    yield SYSTEM_ERROR
@@ -0,0 +1,296 @@
+import os
+import time
+import threading
+import contextvars
+
+# Process-wide counters and histograms in the Prometheus text format, served on
+# /metrics by server.py and asgi.py (worker.py processes serve their own on METRICS_PORT).
+# No client library: the handful of series here don't need one.
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+# Histogram buckets (seconds) for stages, LLM calls and searches
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Timing record of the pipeline stage running in this thread / asyncio task (see
+# RunTimings.stage); LLM calls made while it is set are added to it
+current_stage = contextvars.ContextVar("current_stage", default=None)
+# Timing breakdown of the run in this thread / asyncio task; search_web reports to it
+current_run = contextvars.ContextVar("current_run", default=None)
+# Guards the RunTimings records, which LLM attempts on hedge threads update too
+_timings_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A monotonically increasing value per label combination.
+    """
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram:
+    """
+    Observations (seconds) counted into cumulative buckets per label combination.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels):
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', _number(bound))])} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+STAGE_SECONDS = _register(Histogram(
+    "pipeline_stage_duration_seconds", "Wall time of pipeline stages that ran (not restored)", ("stage", "provider")))
+STAGES = _register(Counter(
+    "pipeline_stages_total", "Pipeline stages by how their output was produced", ("stage", "source", "outcome")))
+LLM_CALL_SECONDS = _register(Histogram(
+    "llm_call_duration_seconds", "call_llm wall time including retries and fallbacks", ("provider",)))
+LLM_ATTEMPT_SECONDS = _register(Histogram(
+    "llm_attempt_duration_seconds", "Duration of single provider requests", ("provider", "model")))
+LLM_ATTEMPTS = _register(Counter(
+    "llm_attempts_total", "Provider requests by outcome (ok, empty, error)", ("provider", "model", "outcome")))
+LLM_TOKENS = _register(Counter(
+    "llm_tokens_total", "Prompt and completion tokens (provider-reported, else estimated)",
+    ("provider", "model", "type")))
+LLM_RETRIES = _register(Counter(
+    "llm_retries_total", "Provider requests beyond the first within one call", ("provider",)))
+LLM_FALLBACKS = _register(Counter(
+    "llm_fallbacks_total", "Calls answered by a provider other than the first one tried", ("provider",)))
+LLM_CACHE = _register(Counter(
+    "llm_cache_lookups_total", "LLM response cache lookups", ("result",)))
+SEARCH_SECONDS = _register(Histogram(
+    "search_duration_seconds", "search_web wall time by where the results came from", ("source",)))
+SEARCHES = _register(Counter(
+    "search_requests_total", "search_web calls by source (cache, stale, live, error)", ("source",)))
+
+
+def render():
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def _add(record, **amounts):
+    with _timings_lock:
+        for k, v in amounts.items():
+            record[k] += v
+
+
+class RunTimings:
+    """
+    Timing breakdown of one pipeline run, stored with its Analysis: the search
+    prefetch and, per stage, its wall time, where the output came from and the
+    LLM calls behind it (attempts, retries, fallbacks, cache hits, tokens).
+    Pass one to run_pipeline(timings=...) and save to_dict() afterwards.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.search = {"seconds": 0.0, "queries": 0, "sources": {}}
+        self.stages = {}
+
+    def stage(self, name, source="run"):
+        with _timings_lock:
+            record = self.stages.get(name)
+            if record is None:
+                record = self.stages[name] = {
+                    "source": source, "seconds": 0.0, "provider": None, "llm_calls": 0, "llm_attempts": 0,
+                    "llm_seconds": 0.0, "retries": 0, "fallbacks": 0, "cache_hits": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0, "error": None,
+                }
+            return record
+
+    def update(self, name, **values):
+        record = self.stage(name)
+        with _timings_lock:
+            record.update(values)
+
+    def searched(self, seconds, queries):
+        with _timings_lock:
+            self.search["seconds"] += seconds
+            self.search["queries"] += queries
+
+    def add_search(self, source):
+        with _timings_lock:
+            self.search["sources"][source] = self.search["sources"].get(source, 0) + 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def to_dict(self):
+        with _timings_lock:
+            stages = {name: dict(r, seconds=round(r["seconds"], 3), llm_seconds=round(r["llm_seconds"], 3))
+                      for name, r in self.stages.items()}
+            search = dict(self.search, seconds=round(self.search["seconds"], 3), sources=dict(self.search["sources"]))
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        return {"total_seconds": round(total, 3), "search": search, "stages": stages}
+
+
+class LLMCall:
+    """
+    One call_llm (or stream/async variant): its attempts are recorded as they
+    happen, finish() records the call itself. Captures the current stage on
+    creation, since attempts may run on other threads (hedging).
+    """
+    def __init__(self):
+        self.stage = current_stage.get()
+        self.started = time.perf_counter()
+        self.attempts = []
+        self._lock = threading.Lock()
+
+    def attempt(self, provider, model, seconds, outcome, prompt_tokens=0, completion_tokens=0):
+        LLM_ATTEMPT_SECONDS.observe(seconds, provider, model)
+        LLM_ATTEMPTS.inc(provider, model, outcome)
+        if prompt_tokens: LLM_TOKENS.inc(provider, model, "prompt", amount=prompt_tokens)
+        if completion_tokens: LLM_TOKENS.inc(provider, model, "completion", amount=completion_tokens)
+        with self._lock:
+            self.attempts.append(provider)
+        if self.stage is not None:
+            _add(self.stage, llm_attempts=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def finish(self, provider, cached=True):
+        """
+        `provider` answered the call: "cache" for a cache hit, None if every provider
+        failed. `cached`: whether the response cache was consulted.
+        """
+        seconds = time.perf_counter() - self.started
+        LLM_CALL_SECONDS.observe(seconds, provider or "none")
+        if cached: LLM_CACHE.inc("hit" if provider == "cache" else "miss")
+        with self._lock:
+            attempts = list(self.attempts)
+        retries = max(0, len(attempts) - 1)
+        fallback = bool(provider and provider != "cache" and attempts and attempts[0] != provider)
+        if retries: LLM_RETRIES.inc(provider or "none", amount=retries)
+        if fallback: LLM_FALLBACKS.inc(provider)
+        if self.stage is not None:
+            _add(self.stage, llm_calls=1, llm_seconds=seconds, retries=retries,
+                 fallbacks=int(fallback), cache_hits=int(provider == "cache"))
+
+
+def observe_search(source, seconds):
+    SEARCH_SECONDS.observe(seconds, source)
+    SEARCHES.inc(source)
+    run = current_run.get()
+    if run is not None:
+        run.add_search(source)
+
+
+def observe_stage(name, source, outcome="ok", seconds=None, provider=None):
+    STAGES.inc(name, source, outcome)
+    if seconds is not None:
+        STAGE_SECONDS.observe(seconds, name, provider or "none")
+
+
+def serve(port, host="0.0.0.0"):
+    """
+    Serves /metrics on `port` from a daemon thread, for processes without a web app (worker.py).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return server
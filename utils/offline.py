@@ -0,0 +1,311 @@
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from types import SimpleNamespace
+
+# Local stand-ins for the LLM providers and the web search, for benchmarks and load
+# tests that must not spend provider quota or depend on the network:
+#   LLM_BACKEND=offline          Groq/Gemini clients replaced by OfflineGroq/OfflineGemini
+#   WEB_SEARCH_BACKEND=offline   DDGS replaced by offline_search()
+# Answers come from OFFLINE_FIXTURES (recorded with OFFLINE_RECORD) when present, and
+# are otherwise generated deterministically from the prompt or query.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "live")
+WEB_SEARCH_BACKEND = os.getenv("WEB_SEARCH_BACKEND", "live")
+OFFLINE_FIXTURES = os.getenv("OFFLINE_FIXTURES")
+# Live answers and search results are appended here (JSONL) to be replayed later
+OFFLINE_RECORD = os.getenv("OFFLINE_RECORD")
+# Latency of a stand-in call: "fixed:S", "uniform:LO,HI", "normal:MEAN,SD" or
+# "lognormal:MEDIAN,SIGMA" (seconds). Draws are seeded by OFFLINE_SEED and the request,
+# so a run sees the same latencies whatever the thread scheduling.
+OFFLINE_LLM_LATENCY = os.getenv("OFFLINE_LLM_LATENCY", "fixed:0")
+OFFLINE_SEARCH_LATENCY = os.getenv("OFFLINE_SEARCH_LATENCY", "fixed:0")
+# Share of calls that fail: one rate for every provider, or per provider ("groq=0.2,gemini=0")
+OFFLINE_LLM_FAILURE_RATE = os.getenv("OFFLINE_LLM_FAILURE_RATE", "0")
+OFFLINE_SEARCH_FAILURE_RATE = float(os.getenv("OFFLINE_SEARCH_FAILURE_RATE", "0"))
+OFFLINE_SEED = int(os.getenv("OFFLINE_SEED", "0"))
+# Size of generated answers and chunks per streamed answer
+OFFLINE_ANSWER_WORDS = int(os.getenv("OFFLINE_ANSWER_WORDS", "400"))
+OFFLINE_STREAM_CHUNKS = int(os.getenv("OFFLINE_STREAM_CHUNKS", "20"))
+
+_WORDS = ("market", "growth", "customers", "pricing", "revenue", "segment", "demand", "competition",
+          "margin", "channel", "adoption", "retention", "regulation", "partners", "costs", "scale")
+
+_fixtures = None
+_fixtures_lock = threading.Lock()
+_draws = {}
+_draws_lock = threading.Lock()
+_record_lock = threading.Lock()
+
+
+class OfflineError(Exception):
+    """
+    An injected provider or search failure.
+    """
+
+
+def llm_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def search_key(query, max_results):
+    from utils.search import normalize_query
+    return f"{normalize_query(query)}|{max_results}"
+
+
+def load_fixtures(path=None):
+    """
+    {("llm", prompt hash) or ("search", query key): recorded answer} from a JSONL fixture file.
+    """
+    path = path or OFFLINE_FIXTURES
+    fixtures = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    fixtures[(entry["kind"], entry["key"])] = entry["value"]
+    return fixtures
+
+
+def fixture(kind, key):
+    global _fixtures
+    with _fixtures_lock:
+        if _fixtures is None:
+            _fixtures = load_fixtures()
+    return _fixtures.get((kind, key))
+
+
+def record(kind, key, value):
+    """
+    Appends a live answer to OFFLINE_RECORD (no-op when unset).
+    """
+    if not OFFLINE_RECORD:
+        return
+    with _record_lock:
+        with open(OFFLINE_RECORD, "a") as f:
+            f.write(json.dumps({"kind": kind, "key": key, "value": value}) + "\n")
+
+
+def _rng(*parts):
+    """
+    Random generator for the n-th call with these parts, independent of call interleaving.
+    """
+    with _draws_lock:
+        n = _draws[parts] = _draws.get(parts, -1) + 1
+    digest = hashlib.sha256(json.dumps([OFFLINE_SEED, n, *parts]).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def parse_latency(spec):
+    """
+    A function drawing one latency (seconds) from a random.Random, for a spec like "lognormal:1.5,0.4".
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] or [0.0]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) if values[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def parse_failure_rates(spec):
+    """
+    {provider: rate} from "0.1" (every provider, key "*") or "groq=0.2,gemini=0".
+    """
+    if "=" not in spec:
+        return {"*": float(spec or 0)}
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+_llm_latency = parse_latency(OFFLINE_LLM_LATENCY)
+_search_latency = parse_latency(OFFLINE_SEARCH_LATENCY)
+_llm_failures = parse_failure_rates(OFFLINE_LLM_FAILURE_RATE)
+
+
+def generate_answer(prompt, words=None):
+    """
+    A deterministic markdown report for `prompt`: same prompt, same answer.
+    """
+    rng = random.Random(llm_key(prompt))
+    words = words or OFFLINE_ANSWER_WORDS
+    lines, count, section = [], 0, 1
+    while count < words:
+        lines.append(f"### Finding {section}")
+        for _ in range(3):
+            sentence = " ".join(rng.choice(_WORDS) for _ in range(12))
+            lines.append(f"- {sentence.capitalize()} ({rng.randint(5, 95)}%).")
+            count += 13
+        lines.append("")
+        section += 1
+    return "\n".join(lines)
+
+
+def llm_answer(provider, prompt):
+    """
+    (answer, latency, fail) for one stand-in provider call; `fail` is None, "before"
+    (no output) or "during" (fails mid-stream).
+    """
+    rng = _rng("llm", provider, llm_key(prompt))
+    latency = _llm_latency(rng)
+    rate = _llm_failures.get(provider, _llm_failures.get("*", 0.0))
+    fail = None
+    if rng.random() < rate:
+        fail = rng.choice(("before", "during"))
+    answer = fixture("llm", llm_key(prompt)) or generate_answer(prompt)
+    return answer, latency, fail
+
+
+def _usage(prompt, answer):
+    from utils.tokens import estimate_tokens
+    return estimate_tokens(prompt), estimate_tokens(answer)
+
+
+def _chunks(answer):
+    size = max(1, math.ceil(len(answer) / OFFLINE_STREAM_CHUNKS))
+    return [answer[i:i + size] for i in range(0, len(answer), size)]
+
+
+def _groq_response(prompt, answer):
+    prompt_tokens, completion_tokens = _usage(prompt, answer)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))],
+                           usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+
+def _groq_chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def _stream(provider, prompt, make_chunk):
+    answer, latency, fail = llm_answer(provider, prompt)
+    chunks = _chunks(answer)
+    if fail == "before":
+        time.sleep(latency / 2)
+        raise OfflineError(f"{provider} (offline): injected failure")
+    for i, text in enumerate(chunks):
+        time.sleep(latency / len(chunks))
+        if fail == "during" and i == len(chunks) // 2:
+            raise OfflineError(f"{provider} (offline): injected failure mid-stream")
+        yield make_chunk(text)
+
+
+async def _astream(provider, prompt, make_chunk):
+    answer, latency, fail = llm_answer(provider, prompt)
+    chunks = _chunks(answer)
+    if fail == "before":
+        await asyncio.sleep(latency / 2)
+        raise OfflineError(f"{provider} (offline): injected failure")
+    for i, text in enumerate(chunks):
+        await asyncio.sleep(latency / len(chunks))
+        if fail == "during" and i == len(chunks) // 2:
+            raise OfflineError(f"{provider} (offline): injected failure mid-stream")
+        yield make_chunk(text)
+
+
+def _complete(provider, prompt):
+    answer, latency, fail = llm_answer(provider, prompt)
+    time.sleep(latency if not fail else latency / 2)
+    if fail:
+        raise OfflineError(f"{provider} (offline): injected failure")
+    return answer
+
+
+async def _acomplete(provider, prompt):
+    answer, latency, fail = llm_answer(provider, prompt)
+    await asyncio.sleep(latency if not fail else latency / 2)
+    if fail:
+        raise OfflineError(f"{provider} (offline): injected failure")
+    return answer
+
+
+class OfflineGroq:
+    """
+    Stand-in for the Groq client: client.chat.completions.create(messages=..., model=..., stream=...).
+    """
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, model=None, stream=False, **kwargs):
+        prompt = messages[-1]["content"]
+        if stream:
+            return _stream("groq", prompt, _groq_chunk)
+        return _groq_response(prompt, _complete("groq", prompt))
+
+
+class OfflineAsyncGroq:
+    """
+    Stand-in for AsyncGroq: `await client.chat.completions.create(...)`.
+    """
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, messages, model=None, stream=False, **kwargs):
+        prompt = messages[-1]["content"]
+        if stream:
+            return _astream("groq", prompt, _groq_chunk)
+        return _groq_response(prompt, await _acomplete("groq", prompt))
+
+
+class OfflineGemini:
+    """
+    Stand-in for genai.GenerativeModel: generate_content() and generate_content_async().
+    """
+    def _response(self, prompt, answer):
+        prompt_tokens, completion_tokens = _usage(prompt, answer)
+        return SimpleNamespace(text=answer, usage_metadata=SimpleNamespace(
+            prompt_token_count=prompt_tokens, candidates_token_count=completion_tokens))
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return _stream("gemini", prompt, lambda text: SimpleNamespace(text=text))
+        return self._response(prompt, _complete("gemini", prompt))
+
+    async def generate_content_async(self, prompt, stream=False):
+        if stream:
+            return _astream("gemini", prompt, lambda text: SimpleNamespace(text=text))
+        return self._response(prompt, await _acomplete("gemini", prompt))
+
+
+BUILDERS = {"groq": OfflineGroq, "groq_async": OfflineAsyncGroq, "gemini": OfflineGemini}
+
+
+def generate_results(query, max_results):
+    """
+    Deterministic search results mentioning the query's terms.
+    """
+    rng = random.Random(hashlib.sha256(query.encode("utf-8")).hexdigest())
+    terms = query.split() or ["result"]
+    results = []
+    for i in range(max_results):
+        site = f"{rng.choice(_WORDS)}-{rng.randint(100, 999)}.example.com"
+        body = " ".join(rng.choice(terms + list(_WORDS)) for _ in range(40))
+        results.append({"title": f"{' '.join(terms[:4]).title()} report {i + 1}",
+                        "href": f"https://{site}/{'-'.join(terms[:3])}", "body": f"{body}. Figure: {rng.randint(1, 900)}M."})
+    return results
+
+
+def offline_search(query, max_results):
+    """
+    Stand-in for the DDGS text search, same result shape ('title', 'href', 'body').
+    """
+    key = search_key(query, max_results)
+    rng = _rng("search", key)
+    time.sleep(_search_latency(rng))
+    if rng.random() < OFFLINE_SEARCH_FAILURE_RATE:
+        raise OfflineError("search (offline): injected failure")
+    results = fixture("search", key)
+    return results if results is not None else generate_results(key.split("|")[0], max_results)
@@ -0,0 +1,472 @@
+import os
+import json
+import time
+import queue
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.llm import STREAM_RESET, SYSTEM_ERROR, last_provider
+from utils.search import prefetch, aprefetch
+from utils.compaction import compact, acompact, COMPACT_SWOT_TOKENS, COMPACT_FINAL_TOKENS
+from utils.tokens import estimate_tokens
+from utils.cache import DiskCache
+from utils import metrics
+from agents import (
+    market_research,
+    competitor_analysis,
+    customer_insight,
+    swot_analysis,
+    financial_estimation,
+    risk_feasibility,
+    final_strategy
+)
+
+# Upper bound on stages running at the same time within one analysis.
+MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "5"))
+
+# Stage outputs memoized across runs under their inputs (set STAGE_MEMO=0 to disable):
+# re-running an idea with another region only recomputes the stages that read it
+STAGE_MEMO_ENABLED = os.getenv("STAGE_MEMO", "1") != "0"
+STAGE_MEMO_TTL = int(os.getenv("STAGE_MEMO_TTL", str(24 * 3600)))
+stage_memo = DiskCache(
+    os.getenv("STAGE_MEMO_PATH", "cache/stages.db"),
+    max_entries=int(os.getenv("STAGE_MEMO_MAX_ENTRIES", "2000")),
+)
+
+
+class Stage:
+    """
+    One node of the analysis DAG, backed by an agent module.
+    `inputs` declares which run parameters (idea/industry/region) the stage reads
+    and `deps` which stage outputs; the agent gets them as positional arguments in
+    that order, and they are all the stage's output may depend on (see
+    stage_input_hash). Search-backed stages (`searches=True`)
+    declare their queries through the agent's get_queries() so they can be fetched
+    before any stage starts, and receive the prefetched results as `search`.
+    With `compact_budget`, each upstream report is reduced to a digest of at most
+    that many tokens before it reaches the prompt. `seedable` stages research the
+    market rather than the idea's wording, so a near-duplicate idea's output can
+    stand in for them (run_pipeline(seed=...)).
+    """
+    def __init__(self, step, name, agent, inputs, deps=(), searches=False, compact_budget=None, seedable=False):
+        self.step = step
+        self.name = name
+        self.agent = agent
+        self.inputs = tuple(inputs)
+        self.deps = tuple(deps)
+        self.searches = searches
+        self.compact_budget = compact_budget
+        self.seedable = seedable
+
+    def args(self, ctx):
+        return tuple(ctx[k] for k in self.inputs + self.deps)
+
+    def queries(self, ctx):
+        return self.agent.get_queries(*self.args(ctx)) if self.searches else []
+
+    def _kwargs(self, ctx):
+        kwargs = {"on_delta": ctx["on_delta"]}
+        if self.searches:
+            kwargs["search"] = ctx["search"]
+        return kwargs
+
+    def fn(self, ctx):
+        return self.agent.run(*self.args(ctx), **self._kwargs(ctx))
+
+    def afn(self, ctx):
+        return self.agent.arun(*self.args(ctx), **self._kwargs(ctx))
+
+
+STAGES = [
+    Stage(1, "Market Research", market_research, ("idea", "industry", "region"), searches=True, seedable=True),
+    # Competitors and customer segments are researched region-independently
+    Stage(2, "Competitor Analysis", competitor_analysis, ("idea", "industry"), searches=True, seedable=True),
+    Stage(3, "Customer Insights", customer_insight, ("idea", "industry"), searches=True, seedable=True),
+    Stage(4, "SWOT Analysis", swot_analysis, ("idea",),
+          deps=["Market Research", "Competitor Analysis", "Customer Insights"],
+          compact_budget=COMPACT_SWOT_TOKENS),
+    Stage(5, "Financial Estimation", financial_estimation, ("idea", "industry", "region"), searches=True,
+          seedable=True),
+    Stage(6, "Risk Assessment", risk_feasibility, ("idea", "industry", "region"), searches=True, seedable=True),
+    Stage(7, "Final Strategy", final_strategy, ("idea",),
+          deps=["Market Research", "Competitor Analysis", "Customer Insights",
+                "SWOT Analysis", "Financial Estimation", "Risk Assessment"],
+          compact_budget=COMPACT_FINAL_TOKENS),
+]
+
+
+def stage_input_hash(stage, ctx):
+    """
+    Fingerprint of a stage's declared inputs and upstream outputs (the full reports,
+    before compaction). Stages with equal hashes produce interchangeable outputs.
+    """
+    payload = json.dumps([stage.name, {k: ctx[k] for k in stage.inputs}, {d: ctx[d] for d in stage.deps}])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _lookup(saved, memo, seed=None):
+    """
+    Finder for reusable outputs: the run's own checkpoints first, then the memo,
+    then (for seedable stages) a near-duplicate run's outputs.
+    """
+    def find(stage, input_hash):
+        cp = saved.get(stage.name)
+        if cp is not None and cp["input_hash"] == input_hash:
+            return cp["content"], "checkpoint"
+        if memo is not None:
+            hit = memo.get(input_hash)
+            if hit is not None and hit[1] < STAGE_MEMO_TTL:
+                return hit[0], "memo"
+        if seed and stage.seedable and seed.get(stage.name):
+            return seed[stage.name], "seed"
+        return None
+    return find
+
+
+def _restore(stages, ctx, find):
+    """
+    Puts reusable outputs into `ctx`, following dependencies: a stage is only looked
+    up once its inputs are known, so a changed upstream report invalidates everything
+    downstream of it. Returns [(stage, source, input_hash)].
+    """
+    restored = []
+    changed = True
+    while changed:
+        changed = False
+        for stage in stages:
+            if stage.name in ctx or not all(d in ctx for d in stage.deps):
+                continue
+            input_hash = stage_input_hash(stage, ctx)
+            hit = find(stage, input_hash)
+            if hit is not None:
+                ctx[stage.name] = hit[0]
+                restored.append((stage, hit[1], input_hash))
+                changed = True
+    return restored
+
+
+def _record(checkpoint, memo, stage, input_hash, started, content=None, provider=None, error=None):
+    """
+    Saves a finished stage to the run's checkpoint and (if it succeeded) the memo.
+    """
+    if error is None and content == SYSTEM_ERROR:
+        error = "All LLM providers failed"
+    if memo is not None and error is None:
+        memo.set(input_hash, content)
+    if checkpoint is None:
+        return
+    try:
+        checkpoint.save(stage.name, input_hash, content, provider, started, time.time(), error)
+    except Exception as e:
+        # A lost checkpoint only costs a re-run later; never fail the analysis for it
+        print(f"Checkpoint error for {stage.name}: {e}")
+
+
+def _observe(timings, stage, started, content=None, provider=None, error=None):
+    """
+    Records a stage that ran in the metrics and, with `timings`, the run's breakdown.
+    """
+    if error is None and content == SYSTEM_ERROR:
+        error = "All LLM providers failed"
+    seconds = time.time() - started
+    metrics.observe_stage(stage.name, "run", "error" if error else "ok", seconds, provider)
+    if timings is not None:
+        timings.update(stage.name, seconds=seconds, provider=provider, error=error)
+
+
+def _restored_events(restored, ctx, checkpoint, timings=None):
+    for stage, source, input_hash in restored:
+        metrics.observe_stage(stage.name, source)
+        if timings is not None:
+            timings.stage(stage.name, source)
+        if source == "seed":
+            print(f"♻️ {stage.name}: reusing output from a near-duplicate idea")
+        else:
+            print(f"♻️ {stage.name}: reusing output from {source} (inputs unchanged)")
+        if source in ("memo", "seed"):
+            # Keep the run's checkpoint complete so a resume doesn't depend on the memo or seed
+            _record(checkpoint, None, stage, input_hash, time.time(), ctx[stage.name], source)
+        yield {'step': stage.step, 'name': stage.name, 'status': 'done', 'content': ctx[stage.name],
+               'restored': source}
+
+
+def _compacted_event(stage, before, after):
+    print(f"🗜️ {stage.name}: upstream reports {before} -> {after} tokens")
+    return {'step': stage.step, 'name': stage.name, 'status': 'compacted',
+            'tokens_before': before, 'tokens_after': after}
+
+
+def _add_event(batch, msg):
+    # Consecutive text deltas of the same stage are merged into one message
+    if batch:
+        last = batch[-1]
+        if msg[0] == "delta" and last[0] == "delta" and msg[1] is last[1] \
+                and msg[2] is not STREAM_RESET and last[2] is not STREAM_RESET:
+            batch[-1] = ("delta", last[1], last[2] + msg[2])
+            return
+    batch.append(msg)
+
+
+def _stage_events(events):
+    """
+    Blocks for the next scheduler message, then drains whatever else is queued.
+    """
+    batch = []
+    _add_event(batch, events.get())
+    while True:
+        try:
+            _add_event(batch, events.get_nowait())
+        except queue.Empty:
+            return batch
+
+
+async def _astage_events(events):
+    batch = []
+    _add_event(batch, await events.get())
+    while True:
+        try:
+            _add_event(batch, events.get_nowait())
+        except asyncio.QueueEmpty:
+            return batch
+
+
+def run_pipeline(idea, industry, region, results=None, stages=STAGES, max_workers=None, stream=False,
+                 checkpoint=None, use_memo=True, seed=None, timings=None):
+    """
+    Runs the agent DAG, starting every stage as soon as its dependencies are done.
+    All web searches are fetched first (deduped, concurrently) as step 0.
+    Yields the per-step events ({'step', 'name', 'status'[, 'content']}) as stages
+    start and finish. Stage outputs are written into `results` in step order.
+    With stream=True, stages also emit 'delta' events ({'delta': text}) while the
+    LLM is answering, and 'reset' if a provider failover restarts the answer.
+
+    With `checkpoint` (an object with load() -> {name: {'content', 'input_hash'}} and
+    save(name, input_hash, content, provider, started, finished, error)), every stage
+    is saved as it finishes and stages already saved with the same inputs are not
+    re-run. Likewise, with `use_memo`, stages whose inputs match an earlier run's
+    (within STAGE_MEMO_TTL) reuse its output, skipping their searches and LLM call.
+    `seed` ({name: content}, from an earlier run of a near-duplicate idea in the same
+    industry and region) fills in seedable stages that have no exact match.
+    Reused stages are reported as 'done' with 'restored': 'checkpoint', 'memo' or 'seed'.
+    Stage, LLM and search timings go to utils.metrics; pass `timings` (a
+    metrics.RunTimings) to also get this run's breakdown.
+    A stage that raises is reported as 'error'; the stages not depending on it
+    still finish (and are saved) before the exception is re-raised.
+    """
+    if results is None:
+        results = {}
+    ctx = {"idea": idea, "industry": industry, "region": region, "on_delta": None}
+    memo = stage_memo if use_memo and STAGE_MEMO_ENABLED else None
+
+    saved = checkpoint.load() if checkpoint else {}
+    yield from _restored_events(_restore(stages, ctx, _lookup(saved, memo, seed)), ctx, checkpoint, timings)
+    todo = [s for s in stages if s.name not in ctx]
+
+    # 0. Search prefetch shared by every search-backed agent
+    yield {'step': 0, 'name': 'Web Search', 'status': 'running'}
+    queries = [q for s in todo for q in s.queries(ctx)]
+    search_started = time.time()
+    token = metrics.current_run.set(timings)
+    try:
+        ctx["search"] = prefetch(queries)
+    finally:
+        metrics.current_run.reset(token)
+    if timings is not None:
+        timings.searched(time.time() - search_started, len(queries))
+    yield {'step': 0, 'name': 'Web Search', 'status': 'done'}
+
+    pending = {s.name: s for s in todo}
+    running = 0
+    started, hashes = {}, {}
+    error = None
+    # Worker threads report deltas and completions here; only this generator yields
+    events = queue.Queue()
+
+    def run_stage(stage, stage_ctx):
+        last_provider.set(None)
+        # LLM calls made from this thread (compaction included) are added to the stage's timings
+        metrics.current_stage.set(timings.stage(stage.name) if timings is not None else None)
+        if stage.compact_budget:
+            before = after = 0
+            for d in stage.deps:
+                before += estimate_tokens(stage_ctx[d])
+                stage_ctx[d] = compact(stage_ctx[d], stage.compact_budget)
+                after += estimate_tokens(stage_ctx[d])
+            events.put(("compacted", stage, (before, after)))
+        content = stage.fn(stage_ctx)
+        return content, last_provider.get()
+
+    def submit(stage):
+        stage_ctx = dict(ctx)
+        started[stage.name] = time.time()
+        hashes[stage.name] = stage_input_hash(stage, stage_ctx)
+        if stream:
+            stage_ctx["on_delta"] = lambda chunk: events.put(("delta", stage, chunk))
+        future = executor.submit(run_stage, stage, stage_ctx)
+        future.add_done_callback(lambda f: events.put(("done", stage, f)))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or MAX_WORKERS)
+    try:
+        while pending or running:
+            # Launch everything whose inputs are available
+            for name, stage in list(pending.items()):
+                if all(d in ctx for d in stage.deps):
+                    del pending[name]
+                    running += 1
+                    submit(stage)
+                    yield {'step': stage.step, 'name': stage.name, 'status': 'running'}
+
+            if not running:
+                if error is not None:
+                    raise error
+                raise RuntimeError(f"Unresolvable stage dependencies: {', '.join(pending)}")
+
+            for kind, stage, payload in _stage_events(events):
+                if kind == "compacted":
+                    yield _compacted_event(stage, *payload)
+                    continue
+                if kind == "delta":
+                    if payload is STREAM_RESET:
+                        yield {'step': stage.step, 'name': stage.name, 'status': 'reset'}
+                    else:
+                        yield {'step': stage.step, 'name': stage.name, 'status': 'delta', 'delta': payload}
+                    continue
+                running -= 1
+                try:
+                    content, provider = payload.result()
+                except Exception as e:
+                    error = error or e
+                    _observe(timings, stage, started[stage.name], error=str(e))
+                    _record(checkpoint, memo, stage, hashes[stage.name], started[stage.name], error=str(e))
+                    yield {'step': stage.step, 'name': stage.name, 'status': 'error', 'error': str(e)}
+                    continue
+                ctx[stage.name] = content
+                _observe(timings, stage, started[stage.name], content, provider)
+                _record(checkpoint, memo, stage, hashes[stage.name], started[stage.name], content, provider)
+                yield {'step': stage.step, 'name': stage.name, 'status': 'done', 'content': content}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if error is not None:
+        raise error
+
+    if timings is not None:
+        timings.finish()
+    for stage in sorted(stages, key=lambda s: s.step):
+        results[stage.name] = ctx[stage.name]
+    return results
+
+
+async def arun_pipeline(idea, industry, region, results=None, stages=STAGES, max_workers=None, stream=False,
+                        checkpoint=None, use_memo=True, seed=None, timings=None):
+    """
+    asyncio version of run_pipeline: every stage runs as a task on the current event
+    loop (at most `max_workers` at once) and the same events are yielded.
+    Checkpoint and memo reads/writes run on a thread.
+    """
+    if results is None:
+        results = {}
+    ctx = {"idea": idea, "industry": industry, "region": region, "on_delta": None}
+    memo = stage_memo if use_memo and STAGE_MEMO_ENABLED else None
+
+    saved = await asyncio.to_thread(checkpoint.load) if checkpoint else {}
+    restored = await asyncio.to_thread(_restore, stages, ctx, _lookup(saved, memo, seed))
+    for event in await asyncio.to_thread(lambda: list(_restored_events(restored, ctx, checkpoint, timings))):
+        yield event
+    todo = [s for s in stages if s.name not in ctx]
+
+    yield {'step': 0, 'name': 'Web Search', 'status': 'running'}
+    queries = [q for s in todo for q in s.queries(ctx)]
+    search_started = time.time()
+    token = metrics.current_run.set(timings)
+    try:
+        ctx["search"] = await aprefetch(queries)
+    finally:
+        metrics.current_run.reset(token)
+    if timings is not None:
+        timings.searched(time.time() - search_started, len(queries))
+    yield {'step': 0, 'name': 'Web Search', 'status': 'done'}
+
+    pending = {s.name: s for s in todo}
+    running = 0
+    started, hashes = {}, {}
+    error = None
+    events = asyncio.Queue()
+    limit = asyncio.Semaphore(max_workers or MAX_WORKERS)
+    tasks = set()
+
+    async def run_stage(stage, stage_ctx):
+        async with limit:
+            last_provider.set(None)
+            metrics.current_stage.set(timings.stage(stage.name) if timings is not None else None)
+            if stage.compact_budget:
+                before = after = 0
+                for d in stage.deps:
+                    before += estimate_tokens(stage_ctx[d])
+                    stage_ctx[d] = await acompact(stage_ctx[d], stage.compact_budget)
+                    after += estimate_tokens(stage_ctx[d])
+                events.put_nowait(("compacted", stage, (before, after)))
+            content = await stage.afn(stage_ctx)
+            return content, last_provider.get()
+
+    def submit(stage):
+        stage_ctx = dict(ctx)
+        started[stage.name] = time.time()
+        hashes[stage.name] = stage_input_hash(stage, stage_ctx)
+        if stream:
+            stage_ctx["on_delta"] = lambda chunk: events.put_nowait(("delta", stage, chunk))
+        task = asyncio.create_task(run_stage(stage, stage_ctx))
+        task.add_done_callback(lambda t: events.put_nowait(("done", stage, t)))
+        tasks.add(task)
+
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(d in ctx for d in stage.deps):
+                    del pending[name]
+                    running += 1
+                    submit(stage)
+                    yield {'step': stage.step, 'name': stage.name, 'status': 'running'}
+
+            if not running:
+                if error is not None:
+                    raise error
+                raise RuntimeError(f"Unresolvable stage dependencies: {', '.join(pending)}")
+
+            for kind, stage, payload in await _astage_events(events):
+                if kind == "compacted":
+                    yield _compacted_event(stage, *payload)
+                    continue
+                if kind == "delta":
+                    if payload is STREAM_RESET:
+                        yield {'step': stage.step, 'name': stage.name, 'status': 'reset'}
+                    else:
+                        yield {'step': stage.step, 'name': stage.name, 'status': 'delta', 'delta': payload}
+                    continue
+                running -= 1
+                try:
+                    content, provider = payload.result()
+                except Exception as e:
+                    error = error or e
+                    _observe(timings, stage, started[stage.name], error=str(e))
+                    await asyncio.to_thread(_record, checkpoint, memo, stage, hashes[stage.name],
+                                            started[stage.name], error=str(e))
+                    yield {'step': stage.step, 'name': stage.name, 'status': 'error', 'error': str(e)}
+                    continue
+                ctx[stage.name] = content
+                _observe(timings, stage, started[stage.name], content, provider)
+                await asyncio.to_thread(_record, checkpoint, memo, stage, hashes[stage.name],
+                                        started[stage.name], content, provider)
+                yield {'step': stage.step, 'name': stage.name, 'status': 'done', 'content': content}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if error is not None:
+        raise error
+
+    if timings is not None:
+        timings.finish()
+    for stage in sorted(stages, key=lambda s: s.step):
+        results[stage.name] = ctx[stage.name]
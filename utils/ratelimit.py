@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+
+# Set RATE_LIMIT_DB to a SQLite file to share the buckets between worker processes
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB")
+# Backoff applied after a 429 that carries no Retry-After header
+RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF", "10"))
+
+
+class RateGovernor:
+    """
+    Token-bucket limiter for one provider covering requests/min and tokens/min.
+    Callers wait (queue) for capacity instead of failing; a 429 pauses the whole
+    provider until its Retry-After has passed. A limit of 0 disables that bucket.
+    Token reservations are estimates; settle() trues them up against the provider's
+    reported usage once a call is done.
+    With `path`, bucket state lives in SQLite and is shared across processes.
+    """
+    def __init__(self, name, rpm, tpm, path=None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.path = path
+        self._lock = threading.Lock()
+        # Local state: (requests left, tokens left, last refill, blocked until)
+        self._state = (float(rpm), float(tpm), time.time(), 0.0)
+
+    def _db(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "name TEXT PRIMARY KEY, requests REAL, tokens REAL, updated REAL, blocked_until REAL)"
+        )
+        return conn
+
+    def _refill(self, state, now):
+        requests, tokens, updated, blocked_until = state
+        elapsed = max(0.0, now - updated)
+        if self.rpm:
+            requests = min(self.rpm, requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            tokens = min(self.tpm, tokens + elapsed * self.tpm / 60.0)
+        return requests, tokens, now, blocked_until
+
+    def _take(self, state, tokens, now):
+        """
+        Returns (new_state, seconds_to_wait); the wait is 0 when capacity was taken.
+        """
+        requests, available, updated, blocked_until = self._refill(state, now)
+        if blocked_until > now:
+            return (requests, available, updated, blocked_until), blocked_until - now
+        # A single call bigger than the whole bucket is let through once it is full
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        waits = [0.0]
+        if self.rpm and requests < 1:
+            waits.append((1 - requests) * 60.0 / self.rpm)
+        if self.tpm and available < tokens:
+            waits.append((tokens - available) * 60.0 / self.tpm)
+        wait = max(waits)
+        if wait > 0:
+            return (requests, available, updated, blocked_until), wait
+        if self.rpm:
+            requests -= 1
+        if self.tpm:
+            available -= tokens
+        return (requests, available, updated, blocked_until), 0.0
+
+    def _load(self, conn, now):
+        row = conn.execute(
+            "SELECT requests, tokens, updated, blocked_until FROM rate_buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        return row or (float(self.rpm), float(self.tpm), now, 0.0)
+
+    def _update(self, fn):
+        """
+        Applies fn(state, now) -> (new_state, result) to the bucket atomically and returns result.
+        """
+        now = time.time()
+        if self.path is None:
+            with self._lock:
+                self._state, result = fn(self._state, now)
+            return result
+
+        conn = self._db()
+        try:
+            # BEGIN IMMEDIATE takes the file's write lock: one process updates the bucket at a time
+            conn.execute("BEGIN IMMEDIATE")
+            state, result = fn(self._load(conn, now), now)
+            conn.execute("INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?, ?, ?)", (self.name,) + state)
+            conn.execute("COMMIT")
+            return result
+        finally:
+            conn.close()
+
+    def _try_acquire(self, tokens):
+        return self._update(lambda state, now: self._take(state, tokens, now))
+
+    def wait_time(self, tokens=0):
+        """
+        Seconds a call of `tokens` would have to wait right now, without taking anything.
+        """
+        if not self.rpm and not self.tpm:
+            return 0.0
+        now = time.time()
+        if self.path is None:
+            with self._lock:
+                state = self._state
+        else:
+            conn = self._db()
+            try:
+                state = self._load(conn, now)
+            finally:
+                conn.close()
+        return self._take(state, tokens, now)[1]
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until one request and `tokens` tokens are available. Returns seconds waited.
+        """
+        if not self.rpm and not self.tpm:
+            return 0.0
+        start = time.time()
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return time.time() - start
+            time.sleep(min(wait, 5.0))
+
+    async def aacquire(self, tokens=0):
+        if not self.rpm and not self.tpm:
+            return 0.0
+        start = time.time()
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, tokens) if self.path else self._try_acquire(tokens)
+            if wait <= 0:
+                return time.time() - start
+            await asyncio.sleep(min(wait, 5.0))
+
+    def backoff(self, seconds=None):
+        """
+        Pauses the provider for `seconds` (a 429's Retry-After) across all callers.
+        """
+        until = time.time() + (seconds if seconds is not None else RATE_LIMIT_DEFAULT_BACKOFF)
+        print(f"🚦 {self.name} rate limited, pausing for {until - time.time():.1f}s")
+
+        def block(state, now):
+            requests, tokens, updated, blocked_until = state
+            return (requests, tokens, updated, max(blocked_until, until)), None
+        self._update(block)
+
+    def settle(self, reserved, used):
+        """
+        Corrects the bucket once a call's real token count is known: acquire() took
+        `reserved` (prompt plus expected answer), the provider reported `used`.
+        Unused tokens go back to the bucket, an overrun is taken from it.
+        """
+        if not self.tpm or reserved == used:
+            return
+
+        def correct(state, now):
+            requests, tokens, updated, blocked_until = self._refill(state, now)
+            # Only what acquire() actually took can come back (big calls are capped at the bucket size)
+            taken = min(reserved, self.tpm)
+            tokens = min(self.tpm, tokens + taken - used)
+            return (requests, tokens, updated, blocked_until), None
+        self._update(correct)
@@ -0,0 +1,241 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Rolling window of recent calls per provider
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "50"))
+# Circuit opens when the window's error rate reaches this (after ROUTER_MIN_SAMPLES calls)
+# or after ROUTER_MAX_CONSECUTIVE_FAILURES failures in a row
+ROUTER_ERROR_THRESHOLD = float(os.getenv("ROUTER_ERROR_THRESHOLD", "0.5"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+ROUTER_MAX_CONSECUTIVE_FAILURES = int(os.getenv("ROUTER_MAX_CONSECUTIVE_FAILURES", "3"))
+# Seconds an open circuit stays open before a single probe call is let through
+ROUTER_COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", "30"))
+# Pause before the second pass over the providers when every one of them failed
+ROUTER_RETRY_BACKOFF = float(os.getenv("ROUTER_RETRY_BACKOFF", "0.5"))
+# Hedged requests: fire the next provider when the primary is slower than its p95
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2.0"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ProviderHealth:
+    """
+    Latency/error window and circuit breaker state for one provider.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self._probing = False
+        self._probe_at = 0.0
+        self._window = deque(maxlen=ROUTER_WINDOW)
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a call may go to this provider now. After the cooldown an open
+        circuit lets one probe through (half-open); a probe that never reports back
+        frees its slot after another cooldown.
+        """
+        now = time.time()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now - self.opened_at >= ROUTER_COOLDOWN:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and (not self._probing or now - self._probe_at >= ROUTER_COOLDOWN):
+                self._probing = True
+                self._probe_at = now
+                return True
+            return False
+
+    def record(self, ok, latency):
+        with self._lock:
+            self._window.append((ok, latency))
+            if ok:
+                self.consecutive_failures = 0
+                if self.state != CLOSED:
+                    print(f"✅ {self.name} recovered, closing circuit")
+                self.state = CLOSED
+                return
+            self.consecutive_failures += 1
+            errors = sum(1 for s in self._window if not s[0])
+            tripped = (
+                self.state == HALF_OPEN
+                or self.consecutive_failures >= ROUTER_MAX_CONSECUTIVE_FAILURES
+                or (len(self._window) >= ROUTER_MIN_SAMPLES and errors / len(self._window) >= ROUTER_ERROR_THRESHOLD)
+            )
+            if tripped:
+                if self.state != OPEN:
+                    print(f"🔌 {self.name} circuit open for {ROUTER_COOLDOWN:.0f}s")
+                self.state = OPEN
+                self.opened_at = time.time()
+            self._probing = False
+
+    def p95(self):
+        """
+        95th percentile latency of recent successful calls, or None without data.
+        """
+        with self._lock:
+            latencies = sorted(s[1] for s in self._window if s[0])
+        if len(latencies) < ROUTER_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def snapshot(self):
+        with self._lock:
+            total = len(self._window)
+            errors = sum(1 for s in self._window if not s[0])
+            state = self.state
+        return {"state": state, "calls": total, "error_rate": errors / total if total else 0.0, "p95": self.p95()}
+
+
+class Router:
+    """
+    Picks the provider order per call from live health instead of a fixed chain.
+    Providers with an open circuit are skipped; if every circuit is open they are
+    all tried anyway rather than failing without a single request. With `wait`
+    (provider -> seconds its rate limit would hold the call back), providers that
+    can answer now go before those that would make the caller wait.
+    """
+    def __init__(self, providers):
+        self.health = {p: ProviderHealth(p) for p in providers}
+        self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+    def order(self, providers, wait=None):
+        allowed = [p for p in providers if self.health[p].allow()] or list(providers)
+        if wait is not None and len(allowed) > 1:
+            waits = {p: wait(p) for p in allowed}
+            # Stable: providers with capacity keep their preference order, the rest follow by shortest wait
+            allowed.sort(key=waits.get)
+        return allowed
+
+    def hedge_delay(self, provider):
+        p95 = self.health[provider].p95()
+        return max(LLM_HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+    def _attempt(self, provider, fn, on_error):
+        start = time.time()
+        try:
+            res = fn()
+        except Exception as e:
+            self.health[provider].record(False, time.time() - start)
+            print(f"⚠️ {provider.title()} Attempt Failed: {e}")
+            if on_error: on_error(provider, e)
+            return None
+        # An empty answer (or a missing key) counts as a failure for routing
+        self.health[provider].record(bool(res), time.time() - start)
+        return res
+
+    def _hedged(self, primary, secondary, calls, on_error, delay):
+        first = self._hedge_pool.submit(self._attempt, primary, calls[primary], on_error)
+        done, _ = wait([first], timeout=delay)
+        if done and first.result():
+            return primary, first.result()
+        print(f"⏱️ {primary.title()} slower than {delay:.1f}s, hedging with {secondary.title()}")
+        futures = {first: primary, self._hedge_pool.submit(self._attempt, secondary, calls[secondary], on_error): secondary}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for f in done:
+                provider = futures.pop(f)
+                if f.result():
+                    # The loser keeps running on the pool; its outcome still feeds the health window
+                    return provider, f.result()
+        return None, None
+
+    def call(self, calls, on_error=None, hedge=None, wait=None):
+        """
+        Runs `calls` ({provider: fn}, in preference order) until one returns an answer.
+        Returns (provider, answer) or (None, None) when every provider failed twice.
+        `wait` reorders providers by rate-limit headroom (see order()).
+        """
+        hedge = LLM_HEDGE if hedge is None else hedge
+        for attempt in range(2):
+            if attempt:
+                time.sleep(ROUTER_RETRY_BACKOFF)
+            providers = self.order(list(calls), wait)
+            tried = set()
+            for i, provider in enumerate(providers):
+                if provider in tried:
+                    continue
+                nxt = providers[i + 1] if i + 1 < len(providers) else None
+                delay = self.hedge_delay(provider) if hedge and nxt else None
+                if delay is not None:
+                    tried.add(nxt)
+                    winner, res = self._hedged(provider, nxt, calls, on_error, delay)
+                    if res:
+                        return winner, res
+                    continue
+                res = self._attempt(provider, calls[provider], on_error)
+                if res:
+                    return provider, res
+        return None, None
+
+    async def _aattempt(self, provider, fn, on_error):
+        start = time.time()
+        try:
+            res = await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.health[provider].record(False, time.time() - start)
+            print(f"⚠️ {provider.title()} Attempt Failed: {e}")
+            if on_error: on_error(provider, e)
+            return None
+        self.health[provider].record(bool(res), time.time() - start)
+        return res
+
+    async def _ahedged(self, primary, secondary, calls, on_error, delay):
+        first = asyncio.ensure_future(self._aattempt(primary, calls[primary], on_error))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done and first.result():
+            return primary, first.result()
+        print(f"⏱️ {primary.title()} slower than {delay:.1f}s, hedging with {secondary.title()}")
+        tasks = {first: primary, asyncio.ensure_future(self._aattempt(secondary, calls[secondary], on_error)): secondary}
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    provider = tasks.pop(t)
+                    if t.result():
+                        return provider, t.result()
+            return None, None
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def acall(self, calls, on_error=None, hedge=None, wait=None):
+        """
+        Async version of call(); `calls` maps providers to coroutine functions.
+        """
+        hedge = LLM_HEDGE if hedge is None else hedge
+        for attempt in range(2):
+            if attempt:
+                await asyncio.sleep(ROUTER_RETRY_BACKOFF)
+            providers = self.order(list(calls), wait)
+            tried = set()
+            for i, provider in enumerate(providers):
+                if provider in tried:
+                    continue
+                nxt = providers[i + 1] if i + 1 < len(providers) else None
+                delay = self.hedge_delay(provider) if hedge and nxt else None
+                if delay is not None:
+                    tried.add(nxt)
+                    winner, res = await self._ahedged(provider, nxt, calls, on_error, delay)
+                    if res:
+                        return winner, res
+                    continue
+                res = await self._aattempt(provider, calls[provider], on_error)
+                if res:
+                    return provider, res
+        return None, None
+
+    def snapshot(self):
+        return {p: h.snapshot() for p, h in self.health.items()}
@@ -1,23 +1,192 @@
+import os
+import re
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from ddgs import DDGS
+from utils.cache import DiskCache
+from utils.context import build_context, describe, format_result
+from utils import metrics, offline
+
+# Max number of DDGS queries in flight during a pipeline prefetch.
+SEARCH_FANOUT = int(os.getenv("SEARCH_FANOUT", "6"))
+
+# Words that don't change what a search engine returns.
+_STOPWORDS = {"a", "an", "and", "the", "for", "in", "of", "to", "with", "on", "what", "is", "are"}
+
+# Persistent result cache (set SEARCH_CACHE=0 to always search live).
+# Entries younger than SEARCH_CACHE_TTL are served as-is; older ones are still served
+# for up to SEARCH_CACHE_STALE seconds while a background refresh replaces them.
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE", "1") != "0"
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+SEARCH_CACHE_STALE = int(os.getenv("SEARCH_CACHE_STALE", str(7 * 24 * 3600)))
+search_cache = DiskCache(
+    os.getenv("SEARCH_CACHE_PATH", "cache/search.db"),
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000")),
+)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _fetch(query, max_results):
+    if offline.WEB_SEARCH_BACKEND == "offline":
+        return offline.offline_search(query, max_results)
+    results = DDGS().text(query, max_results=max_results)
+    if offline.OFFLINE_RECORD and results:
+        offline.record("search", f"{normalize_query(query)}|{max_results}", results)
+    return results
+
+
+def _refresh(key, query, max_results):
+    try:
+        results = _fetch(query, max_results)
+        if results:
+            search_cache.set(key, results)
+    except Exception as e:
+        print(f"Search refresh error: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
 
 def search_web(query, max_results=5):
     """
-    Searches the web using DuckDuckGo (Free).
+    Searches the web using DuckDuckGo (Free), through the persistent cache.
     Returns a list of dictionaries with 'title', 'href', 'body'.
     """
+    started = time.perf_counter()
+    key = f"{normalize_query(query)}|{max_results}"
+    if SEARCH_CACHE_ENABLED:
+        cached = search_cache.get(key)
+        if cached is not None:
+            results, age = cached
+            if age < SEARCH_CACHE_TTL:
+                metrics.observe_search("cache", time.perf_counter() - started)
+                return results
+            if age < SEARCH_CACHE_TTL + SEARCH_CACHE_STALE:
+                # Stale-while-revalidate: answer now, refresh in the background once
+                with _refreshing_lock:
+                    start = key not in _refreshing
+                    _refreshing.add(key)
+                if start:
+                    threading.Thread(target=_refresh, args=(key, query, max_results), daemon=True).start()
+                metrics.observe_search("stale", time.perf_counter() - started)
+                return results
+
     try:
-        results = DDGS().text(query, max_results=max_results)
-        return results
+        results = _fetch(query, max_results)
     except Exception as e:
         print(f"Search error: {e}")
+        metrics.observe_search("error", time.perf_counter() - started)
         return []
+    metrics.observe_search("live", time.perf_counter() - started)
+    # Failures and empty answers are not cached so the next run retries them
+    if SEARCH_CACHE_ENABLED and results:
+        search_cache.set(key, results)
+    return results
 
 def get_search_summary(query):
     """
     Returns a string summary of search results.
     """
-    results = search_web(query)
-    summary = ""
-    for r in results:
-        summary += f"Title: {r['title']}\nLink: {r['href']}\nSnippet: {r['body']}\n\n"
-    return summary
+    return "".join(format_result(r) for r in search_web(query))
+
+
+def normalize_query(query):
+    """
+    Canonical form of a query used for dedupe: lowercase, punctuation and
+    stopwords dropped, remaining terms de-duplicated and sorted.
+    """
+    terms = re.findall(r"[\w&$%.+-]+", query.lower())
+    return " ".join(sorted({t for t in terms if t not in _STOPWORDS}))
+
+
+class SearchResults:
+    """
+    Search results fetched for one pipeline run, looked up by (normalized) query.
+    """
+    def __init__(self, results=None):
+        self._results = results or {}
+
+    def results(self, query):
+        return self._results.get(normalize_query(query), [])
+
+    def get(self, query):
+        return "".join(format_result(r) for r in self.results(query))
+
+    def __contains__(self, query):
+        return normalize_query(query) in self._results
+
+    def __len__(self):
+        return len(self._results)
+
+
+def prefetch(queries, max_workers=None):
+    """
+    Dedupes `queries` and fetches them concurrently.
+    Returns a SearchResults with one result list per distinct query.
+    """
+    unique = {}
+    for q in queries:
+        unique.setdefault(normalize_query(q), q)
+
+    if not unique:
+        return SearchResults()
+
+    print(f"Prefetching {len(unique)} searches ({len(queries) - len(unique)} duplicates skipped)...")
+    # Each search runs in a copy of the caller's context, so it counts towards the caller's run timings
+    contexts = [contextvars.copy_context() for _ in unique]
+    with ThreadPoolExecutor(max_workers=max_workers or SEARCH_FANOUT) as pool:
+        results = pool.map(lambda c, q: c.run(search_web, q), contexts, unique.values())
+        return SearchResults(dict(zip(unique.keys(), results)))
+
+
+def gather_search_data(queries, search=None, focus="", budget=None):
+    """
+    Search data for an agent's queries, deduped and packed into a token budget
+    by utils.context.build_context (ranked by relevance to `focus`).
+    Reads from a prefetched SearchResults when given, otherwise searches live.
+    """
+    result_lists = []
+    for q in queries:
+        if search is not None:
+            result_lists.append(search.results(q))
+        else:
+            print(f"Searching: {q}...")
+            result_lists.append(search_web(q))
+    search_data, stats = build_context(result_lists, focus, budget)
+    print(f"🔎 Search context: {describe(stats)}")
+    return search_data
+
+
+# --- Async counterparts (used by asgi.py) ---
+# DDGS has no async client, so searches run on the default thread pool.
+
+async def asearch_web(query, max_results=5):
+    return await asyncio.to_thread(search_web, query, max_results)
+
+
+async def aprefetch(queries, max_workers=None):
+    """
+    Async version of prefetch: same dedupe, at most SEARCH_FANOUT searches in flight.
+    """
+    unique = {}
+    for q in queries:
+        unique.setdefault(normalize_query(q), q)
+
+    limit = asyncio.Semaphore(max_workers or SEARCH_FANOUT)
+
+    async def fetch(q):
+        async with limit:
+            return await asyncio.to_thread(search_web, q)
+
+    results = await asyncio.gather(*(fetch(q) for q in unique.values()))
+    return SearchResults(dict(zip(unique.keys(), results)))
+
+
+async def agather_search_data(queries, search=None, focus="", budget=None):
+    if search is None:
+        search = await aprefetch(queries)
+    return gather_search_data(queries, search, focus, budget)
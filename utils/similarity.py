@@ -0,0 +1,118 @@
+import os
+import hashlib
+import threading
+from collections import defaultdict
+
+from utils.context import terms
+
+# Near-duplicate idea detection: a local MinHash/LSH index over past analyses' ideas.
+# What a close match to an earlier analysis (same industry and region) is used for:
+#   off   - nothing, always run the full pipeline
+#   seed  - reuse the earlier run's research stages, re-run the idea-specific synthesis
+#   serve - hand back the earlier report as-is
+# Off by default: reuse changes a report's content, so it is opted into (here or per request)
+IDEA_MATCH = os.getenv("IDEA_MATCH", "off")
+IDEA_MATCH_MODES = ("off", "seed", "serve")
+# Jaccard similarity of the two ideas' shingles needed to count as a match
+IDEA_MATCH_THRESHOLD = float(os.getenv("IDEA_MATCH_THRESHOLD", "0.8"))
+# Earlier analyses older than this (seconds) are never reused; 0 = no limit
+IDEA_MATCH_MAX_AGE = int(os.getenv("IDEA_MATCH_MAX_AGE", str(7 * 24 * 3600)))
+
+# 32 bands of 4 rows: ideas at 0.8 similarity share a band with ~99.99% probability,
+# ideas at 0.3 with ~23% (and are then rejected by the exact comparison)
+_BANDS, _ROWS = 32, 4
+_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], "big") % _PRIME or 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], "big") % _PRIME)
+    for i in range(_BANDS * _ROWS)
+]
+
+
+def idea_shingles(idea):
+    """
+    Word-order independent features of an idea: its words (minus stopwords) and their
+    character trigrams, so "tutor" still overlaps "tutoring" and reordering changes nothing.
+    """
+    features = set()
+    for word in terms(idea):
+        features.add(word)
+        padded = f"#{word}#"
+        features.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def minhash(features):
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "big") for f in features]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def scope(industry, region):
+    return (industry or "").strip().lower(), (region or "").strip().lower()
+
+
+class IdeaIndex:
+    """
+    In-memory LSH index of ideas, one scope per (industry, region). Lookups only
+    compare against ideas that share a MinHash band, so they stay fast as the
+    history grows; candidates are confirmed with the exact Jaccard similarity.
+    """
+    def __init__(self):
+        # Highest id up to which every stored item has been read into the index (see advance)
+        self.last_id = 0
+        self._features = {}
+        self._created = {}
+        self._buckets = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _keys(self, key_scope, signature):
+        return [(key_scope, i, tuple(signature[i * _ROWS:(i + 1) * _ROWS])) for i in range(_BANDS)]
+
+    def add(self, item_id, idea, industry, region, created=None):
+        """
+        Indexes one item, created at `created` (a datetime, for match(since=...)). Doesn't move last_id: other writers may have stored items
+        with lower ids that haven't been read yet.
+        """
+        features = idea_shingles(idea)
+        keys = self._keys(scope(industry, region), minhash(features)) if features else []
+        with self._lock:
+            if not features or item_id in self._features:
+                return
+            self._features[item_id] = features
+            self._created[item_id] = created
+            for key in keys:
+                self._buckets[key].add(item_id)
+
+    def advance(self, last_id):
+        """
+        Records that every item up to `last_id` has been read (after a catch-up query).
+        """
+        with self._lock:
+            self.last_id = max(self.last_id, last_id)
+
+    def match(self, idea, industry, region, threshold=None, since=None):
+        """
+        The most similar indexed idea in the same industry and region as (id, similarity),
+        or None if nothing reaches `threshold` (IDEA_MATCH_THRESHOLD). Ties go to the newest.
+        With `since`, only items created at or after it are considered.
+        """
+        threshold = IDEA_MATCH_THRESHOLD if threshold is None else threshold
+        features = idea_shingles(idea)
+        if not features:
+            return None
+        keys = self._keys(scope(industry, region), minhash(features))
+        with self._lock:
+            candidates = set().union(*(self._buckets.get(key, ()) for key in keys))
+            if since is not None:
+                candidates = {c for c in candidates if self._created[c] is not None and self._created[c] >= since}
+            scored = [(jaccard(features, self._features[c]), c) for c in candidates]
+        best = max(scored, default=None)
+        if best is None or best[0] < threshold:
+            return None
+        return best[1], round(best[0], 3)
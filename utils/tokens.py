@@ -0,0 +1,5 @@
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token), close enough for budgeting.
+    """
+    return len(text) // 4 + 1
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from server import (app, db, Analysis, Job, JobEvent, JobWorker, JobCheckpoint, save_analysis,
+                    analysis_sections, complete_event, seeded_stages, JOB_STALE_AFTER)
+from utils.pipeline import run_pipeline
+from utils import metrics
+
+# Runs queued analyses from the Job table. Start as many of these as needed,
+# on any machine that shares DATABASE_URL:  python worker.py --threads 2
+JOB_WORKER_THREADS = int(os.getenv("JOB_WORKER_THREADS", "2"))
+# Seconds an idle worker waits before looking for new jobs again
+JOB_IDLE_POLL = float(os.getenv("JOB_IDLE_POLL", "1.0"))
+# Streamed deltas are written to the event table at most this often
+JOB_EVENT_FLUSH = float(os.getenv("JOB_EVENT_FLUSH", "0.25"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+# Port for this process's Prometheus /metrics (0 = off; jobs run inside the web
+# server are already on its /metrics)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+_active = set()
+_active_lock = threading.Lock()
+
+
+class EventLog:
+    """
+    Buffers a job's pipeline events and appends them to the JobEvent table.
+    Consecutive deltas of a stage are merged; everything else is written at once.
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.buffer = []
+        self.flushed_at = time.time()
+
+    def add(self, event):
+        last = self.buffer[-1] if self.buffer else None
+        if event.get("status") == "delta" and last and last.get("status") == "delta" and last["step"] == event["step"]:
+            self.buffer[-1] = dict(last, delta=last["delta"] + event["delta"])
+        else:
+            self.buffer.append(event)
+        if event.get("status") != "delta" or time.time() - self.flushed_at >= JOB_EVENT_FLUSH:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            db.session.add_all(JobEvent(job_id=self.job_id, data=json.dumps(e)) for e in self.buffer)
+            db.session.commit()
+            self.buffer = []
+        self.flushed_at = time.time()
+
+
+def _finish(job_id, **fields):
+    fields["finished_at"] = datetime.utcnow()
+    Job.query.filter_by(id=job_id).update(fields, synchronize_session=False)
+    db.session.commit()
+
+
+def requeue_stale():
+    """
+    Hands jobs whose worker died back to the queue, or fails them after JOB_MAX_ATTEMPTS.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    stale = Job.query.filter(Job.status == "running", Job.heartbeat < cutoff).all()
+    for job in stale:
+        retry = job.attempts < JOB_MAX_ATTEMPTS
+        # Conditional update: only one worker wins the row if several notice it at once
+        won = Job.query.filter(Job.id == job.id, Job.status == "running", Job.heartbeat < cutoff).update(
+            {"status": "queued" if retry else "failed", "worker": None,
+             "error": None if retry else "Worker lost", "finished_at": None if retry else datetime.utcnow()},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if won and not retry:
+            log = EventLog(job.id)
+            log.add({'step': 0, 'name': 'Error', 'status': 'Critical Error: Worker lost'})
+            log.add({'name': 'Job', 'status': 'failed'})
+        elif won:
+            print(f"♻️ Requeued orphaned job {job.id}")
+
+
+def claim_job(worker_id):
+    """
+    Atomically moves the oldest queued job to running. Returns it, or None.
+    """
+    row = Job.query.with_entities(Job.id).filter_by(status="queued").order_by(Job.created_at).first()
+    if row is None:
+        db.session.rollback()
+        return None
+    now = datetime.utcnow()
+    claimed = Job.query.filter_by(id=row.id, status="queued").update(
+        {"status": "running", "worker": worker_id, "attempts": Job.attempts + 1, "started_at": now, "heartbeat": now},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return db.session.get(Job, row.id) if claimed else None
+
+
+def run_job(job):
+    print(f"🧵 Running job {job.id}: {job.idea}")
+    log = EventLog(job.id)
+    try:
+        if job.attempts > 1:
+            # Subscribers drop what the lost attempt had streamed
+            log.add({'step': 0, 'name': 'Job', 'status': 'restarted'})
+        results, seeded = {}, []
+        timings = metrics.RunTimings()
+        # Research of a near-duplicate earlier analysis, if the job was submitted with one
+        seed = analysis_sections(job.seed_from) if job.seed_from else None
+        # Stages checkpointed by an earlier attempt (same inputs) are restored, not re-run
+        events = run_pipeline(job.idea, job.industry, job.region, results=results, stream=True,
+                              checkpoint=JobCheckpoint(job.id), seed=seed, timings=timings)
+        for event in events:
+            log.add(seeded_stages(event, seeded))
+
+        log.add({'step': 8, 'name': 'Generating Files', 'status': 'running'})
+        analysis = save_analysis(job.idea, job.industry, job.region, results, job.formats, timings.to_dict())
+        source = db.session.get(Analysis, job.seed_from) if job.seed_from else None
+        match = {"analysis_id": source.id, "idea": source.idea} if source else None
+        log.add(complete_event(analysis.to_dict()['files'], match, seeded))
+        _finish(job.id, status="done", analysis_id=analysis.id)
+
+    except Exception as e:
+        print(f"Job {job.id} failed: {e}")
+        db.session.rollback()
+        log.buffer = []
+        log.add({'step': 0, 'name': 'Error', 'status': f'Critical Error: {str(e)}'})
+        log.add({'name': 'Job', 'status': 'failed'})
+        _finish(job.id, status="failed", error=str(e))
+
+
+def work(worker_id, stop):
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                requeue_stale()
+                job = claim_job(worker_id)
+            except Exception as e:
+                print(f"Worker {worker_id} DB error: {e}")
+                db.session.rollback()
+                job = None
+            if job is None:
+                stop.wait(JOB_IDLE_POLL)
+                continue
+            with _active_lock:
+                _active.add(job.id)
+            try:
+                run_job(job)
+            finally:
+                with _active_lock:
+                    _active.discard(job.id)
+                db.session.remove()
+
+
+def process_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def heartbeat(stop, threads):
+    """
+    Marks this process (so the web app knows jobs will be picked up) and its running
+    jobs as alive, independent of how chatty the pipeline is.
+    """
+    with app.app_context():
+        while True:
+            with _active_lock:
+                ids = list(_active)
+            try:
+                now = datetime.utcnow()
+                db.session.merge(JobWorker(id=process_name(), threads=threads, heartbeat=now))
+                if ids:
+                    Job.query.filter(Job.id.in_(ids)).update({"heartbeat": now}, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                print(f"Heartbeat error: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+            if stop.wait(max(1.0, JOB_STALE_AFTER / 4)):
+                return
+
+
+def start_workers(threads=None):
+    """
+    Starts worker threads in this process. Returns the Event that stops them.
+    """
+    threads = threads or JOB_WORKER_THREADS
+    stop = threading.Event()
+    name = process_name()
+    for i in range(threads):
+        threading.Thread(target=work, args=(f"{name}:{i}", stop), daemon=True).start()
+    threading.Thread(target=heartbeat, args=(stop, threads), daemon=True).start()
+    print(f"👷 {threads} job workers started ({name})")
+    return stop
+
+
+def release_active():
+    """
+    Puts this process's running jobs back in the queue and unregisters it (clean shutdown).
+    """
+    with _active_lock:
+        ids = list(_active)
+    with app.app_context():
+        JobWorker.query.filter_by(id=process_name()).delete(synchronize_session=False)
+        if ids:
+            Job.query.filter(Job.id.in_(ids), Job.status == "running").update(
+                {"status": "queued", "worker": None}, synchronize_session=False)
+        db.session.commit()
+    if ids:
+        print(f"Requeued {len(ids)} running jobs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued analyses from the job table.")
+    parser.add_argument("--threads", type=int, default=JOB_WORKER_THREADS, help="concurrent jobs in this process")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="serve /metrics on this port")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    stop = start_workers(args.threads)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        release_active()